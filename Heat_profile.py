@@ -1,105 +1,155 @@
-import matplotlib.pyplot as plt
 import numpy as np
-from datetime import datetime
 from nrlmsis_calculator import get_atmospheric_data as nrlmsis
 
 
 
+SUTTON_GRAVES_K = 1.742e-4  # Sutton-Graves constant for air
+GAMMA = 1.4
+R_AIR = 287
+
+SHAPES = {}
+
+
+def register_shape(name, characteristic_length, reference_area, drag_coefficients, distribution,
+                   free_molecular_cd=2.2):
+    """
+    Make a geometry available to Shape(name, ...).
+
+    Parameters:
+        name (str): Shape name.
+        characteristic_length (callable): volume (m³) -> nose length scale (m).
+        reference_area (callable): volume (m³) -> frontal area (m²).
+        drag_coefficients (tuple): Cd below and above Mach 1.
+        distribution (callable): Normalised profile positions (array, 0 to 1)
+            -> fraction of the nose heat flux at that station.
+        free_molecular_cd (float): Cd in free-molecular flow (high Knudsen
+            number), used by aerodynamics.DragModel.
+    """
+    SHAPES[name] = {
+        "characteristic_length": characteristic_length,
+        "reference_area": reference_area,
+        "drag_coefficients": tuple(drag_coefficients),
+        "distribution": distribution,
+        "free_molecular_cd": free_molecular_cd,
+    }
+
+
+register_shape("sphere",
+               characteristic_length=lambda volume: 2 * (3 * volume / (4 * np.pi)) ** (1 / 3),  # Diameter
+               reference_area=lambda volume: np.pi * (3 * volume / (4 * np.pi)) ** (2 / 3),
+               drag_coefficients=(0.47, 0.92),
+               distribution=lambda profile: np.cos(profile * np.pi / 2) ** 2,
+               free_molecular_cd=2.1)
+register_shape("cube",
+               characteristic_length=lambda volume: volume ** (1 / 3),  # Side length
+               reference_area=lambda volume: volume ** (2 / 3),
+               drag_coefficients=(1.05, 1.5),
+               distribution=lambda profile: 1 - profile,
+               free_molecular_cd=2.2)
+register_shape("double_cone",
+               characteristic_length=lambda volume: 4 * (3 * volume / (2 * np.pi)) ** (1 / 3),  # Total length
+               reference_area=lambda volume: np.pi * (3 * volume / (2 * np.pi)) ** (2 / 3),
+               drag_coefficients=(0.5, 0.8),
+               distribution=lambda profile: np.exp(-2 * profile),
+               free_molecular_cd=2.0)
+
+
 class Shape:
     def __init__(self, name, volume, profile=None):
         """
         Initialize the shape with necessary parameters.
 
+        The geometry is looked up once in SHAPES (see register_shape) and its
+        coefficients are kept, so the methods below are plain array
+        expressions: density, velocity, temperature and profile may be
+        scalars or arrays and broadcast against each other.
+
         Parameters:
-            name (str): The name of the shape ('sphere', 'cube', or 'double_cone').
+            name (str): The name of a registered shape ('sphere', 'cube', 'double_cone', ...).
             volume (float): Volume of the shape in cubic meters.
-            velocity (float): Velocity in m/s.
-            density (float): Air density in kg/m³.
-            profile (float, optional): profile along the body for heat flux calculation (0 to 1).
+            profile (float or array, optional): profile along the body for heat flux calculation (0 to 1).
         """
+        if name not in SHAPES:
+            raise ValueError(f"Unknown shape: {name}")
+        geometry = SHAPES[name]
         self.name = name
         self.volume = volume
         self.profile = profile
-        self.characteristic_length = self._calculate_characteristic_length()
-        self.reference_area = self._calculate_reference_area()
-
-    def _calculate_characteristic_length(self):
-        """Calculate characteristic length based on shape and volume."""
-        if self.name == 'sphere':
-            return 2 * (3 * self.volume / (4 * np.pi)) ** (1 / 3)  # Diameter
-        elif self.name == 'cube':
-            return self.volume ** (1 / 3)  # Side length
-        elif self.name == 'double_cone':
-            radius = (3 * self.volume / (2 * np.pi)) ** (1 / 3)
-            return 4 * radius  # Total length
-        else:
-            raise ValueError(f"Unknown shape: {self.name}")
-
-    def _calculate_reference_area(self):
-        """Calculate reference area based on shape."""
-        if self.name == 'sphere':
-            radius = (3 * self.volume / (4 * np.pi)) ** (1 / 3)
-            return np.pi * radius**2
-        elif self.name == 'cube':
-            side = self.volume ** (1 / 3)
-            return side**2
-        elif self.name == 'double_cone':
-            radius = (3 * self.volume / (2 * np.pi)) ** (1 / 3)
-            return np.pi * radius**2
-        else:
-            raise ValueError(f"Unknown shape: {self.name}")
+        self.characteristic_length = geometry["characteristic_length"](volume)
+        self.reference_area = geometry["reference_area"](volume)
+        self.drag_coefficients = np.array(geometry["drag_coefficients"], dtype=float)
+        self.free_molecular_cd = geometry["free_molecular_cd"]
+        self._distribution = geometry["distribution"]
+        self._flux_factor = SUTTON_GRAVES_K / np.sqrt(self.characteristic_length)
+
+    def drag_coefficient(self, velocity, temperature):
+        """Cd for the Mach number of velocity (m/s) in air at temperature (K)."""
+        mach_number = velocity / np.sqrt(GAMMA * R_AIR * temperature)
+        return self.drag_coefficients[(np.asarray(mach_number) >= 1).astype(int)]
 
     def calculate_drag_force(self, density, velocity, temperature):
         """Calculate drag force based on shape and velocity."""
-        gamma=1.4
-        R = 287
-        mach=np.sqrt(gamma * R * temperature)
-        mach_number=velocity/mach
-        if self.name == 'sphere':
-            c = 0.47 if mach_number < 1 else 0.92
-        elif self.name == 'cube':
-            c = 1.05 if mach_number < 1 else 1.5
-        elif self.name == 'double_cone':
-            c = 0.5 if mach_number < 1 else 0.8
-        else:
-            raise ValueError(f"Unknown shape: {self.name}")
-
-        return 0.5 * density * c * self.reference_area * velocity**2
-
+        return 0.5 * density * self.drag_coefficient(velocity, temperature) * self.reference_area * velocity**2
 
     def calculate_heat_flux_coefficient(self,density,velocity):
         """Calculate heat flux coefficient using Sutton-Graves equation."""
-        k = 1.742e-4  # Sutton-Graves constant
-        return k * np.sqrt(density / self.characteristic_length) * velocity**3
+        return self._flux_factor * np.sqrt(density) * velocity**3
+
+    def heat_flux_distribution(self, profile):
+        """Fraction of the nose heat flux at normalised body stations (0 to 1)."""
+        return self._distribution(np.asarray(profile, dtype=float))
 
-    def calculate_distributed_heat_flux(self, density, velocity):
+    def calculate_distributed_heat_flux(self, density, velocity, profile=None):
         """
         Calculate heat flux distributed along the body.
 
         Parameters:
-            density (float): Air density in kg/m³.
-            velocity (float): Velocity in m/s.
+            density (float or array): Air density in kg/m³.
+            velocity (float or array): Velocity in m/s.
+            profile (float or array, optional): Body stations, defaults to self.profile.
 
         Returns:
-            float: Heat flux at the specified profile.
+            float or array: Heat flux at the specified profile, broadcast
+            elementwise against density and velocity.
         """
-        if self.profile is None:
-            return self.calculate_heat_flux_coefficient(density,velocity)
-
+        profile = self.profile if profile is None else profile
         nose_heat_flux = self.calculate_heat_flux_coefficient(density,velocity)
-        if self.name == 'sphere':
-            theta = self.profile * np.pi
-            return nose_heat_flux * np.cos(theta/2)**2
-        elif self.name == 'cube':
-            return nose_heat_flux * (1 - self.profile)
-        elif self.name == 'double_cone':
-            return nose_heat_flux * np.exp(-2 * self.profile)
-        else:
-            raise ValueError(f"Unknown shape: {self.name}")
+        if profile is None:
+            return nose_heat_flux
+        return nose_heat_flux * self.heat_flux_distribution(profile)
 
+    def heat_flux_grid(self, density, velocity, profile):
+        """
+        Heat map over samples x body stations.
+
+        Parameters:
+            density, velocity (array): Per-sample air density (kg/m³) and speed (m/s).
+            profile (array): Body stations (0 to 1).
+
+        Returns:
+            ndarray: Heat flux (W/m²) of shape density.shape + profile.shape.
+        """
+        nose_heat_flux = np.asarray(self.calculate_heat_flux_coefficient(density, velocity))
+        return np.multiply.outer(nose_heat_flux, self.heat_flux_distribution(profile))
+
+    def drag_grid(self, density, velocity, temperature):
+        """
+        Drag force over samples x (velocity, temperature) combinations.
+
+        Parameters:
+            density (array): Air density (kg/m³) per sample.
+            velocity, temperature (array): Values to tabulate; they broadcast
+                against each other, e.g. velocity[:, None] and temperature[None, :].
+
+        Returns:
+            ndarray: Drag force (N) of shape density.shape + broadcast(velocity, temperature).shape.
+        """
+        return np.multiply.outer(np.asarray(density), self.calculate_drag_force(1.0, velocity, temperature))
 
 
 if __name__ == "__main__":
+    import matplotlib.pyplot as plt
+
     # Example usage
     temp,den=nrlmsis(0, 120, 0, 0)
     print(temp, den)
@@ -124,14 +174,12 @@ if __name__ == "__main__":
     plt.figure(figsize=(10, 6))
 
     # Loop over each shape
+    profiles = np.linspace(0, 1, 100)
     for shape_data in shapes:
-        # Create a Shape instance
-        shape = Shape(**shape_data)
-        
         # Calculate distributed heat flux across normalized profiles
-        profiles = np.linspace(0, 1, 100)
-        heat_flux = [Shape(**shape_data, profile=pos).calculate_distributed_heat_flux(den,velocity) for pos in profiles]
-        
+        shape = Shape(**shape_data)
+        heat_flux = shape.calculate_distributed_heat_flux(den, velocity, profiles)
+
         # Plot the results
         plt.plot(profiles, heat_flux, label=shape.name.capitalize())
 
@@ -0,0 +1,126 @@
+import math
+
+import numpy as np
+
+from Heat_profile import GAMMA, R_AIR, Shape
+
+MOLECULAR_MASS = 4.81e-26  # mean mass of an air molecule [kg]
+MOLECULAR_DIAMETER = 3.7e-10  # effective collision diameter of air [m]
+KN_CONTINUUM = 1e-3  # below: continuum flow
+KN_FREE_MOLECULAR = 10.0  # above: free-molecular flow
+TRANSONIC = (0.8, 1.2)  # Mach range of the subsonic -> supersonic Cd transition
+
+
+def mean_free_path(density):
+    """Mean free path (m) of air molecules at density (kg/m³), hard-sphere model."""
+    return MOLECULAR_MASS / (math.sqrt(2) * math.pi * MOLECULAR_DIAMETER ** 2 * np.asarray(density, dtype=float))
+
+
+def knudsen_number(density, length):
+    """Knudsen number of a body of characteristic length (m) at density (kg/m³)."""
+    with np.errstate(divide="ignore"):
+        return mean_free_path(density) / length
+
+
+def continuum_drag_coefficient(shape, mach):
+    """Continuum Cd of shape, ramping linearly from the subsonic to the supersonic value across TRANSONIC."""
+    return np.interp(mach, TRANSONIC, shape.drag_coefficients)
+
+
+def bridged_drag_coefficient(cd_continuum, cd_free_molecular, knudsen):
+    """
+    Cd across the flow regimes.
+
+    Between KN_CONTINUUM and KN_FREE_MOLECULAR the continuum and
+    free-molecular values are blended with the usual sin² bridging function
+    in log10(Kn); outside that range one of them is used unchanged.
+    """
+    low, high = math.log10(KN_CONTINUUM), math.log10(KN_FREE_MOLECULAR)
+    with np.errstate(divide="ignore"):
+        x = np.clip((np.log10(knudsen) - low) / (high - low), 0.0, 1.0)
+    weight = np.sin(np.pi / 2 * x) ** 2
+    return cd_continuum + (cd_free_molecular - cd_continuum) * weight
+
+
+class DragModel:
+    def __init__(self, shape, mach_max=2.0, mach_step=0.01, log_kn_min=-4.0, log_kn_max=2.0, log_kn_step=0.05):
+        """
+        Drag coefficient of a Shape tabulated over Mach number and log10 of the Knudsen number.
+
+        Cd is computed once per grid node: Mach-dependent in the continuum,
+        the shape's free-molecular value in rarefied flow, bridged in
+        between. A propagation step turns the air-relative speed and the
+        temperature and density of the run's atmosphere at the position into
+        Mach and Knudsen numbers and interpolates the table, so the table
+        holds no atmosphere of its own and follows the time, latitude and
+        longitude of every step. Queries outside the table are clamped, which
+        is exact: the continuum Cd is constant above TRANSONIC and the
+        Knudsen range reaches past both ends of the bridging function.
+
+        Parameters:
+            shape (Shape): Body.
+            mach_max (float): Highest tabulated Mach number.
+            mach_step (float): Mach spacing of the table.
+            log_kn_min (float): Lowest tabulated log10(Kn).
+            log_kn_max (float): Highest tabulated log10(Kn).
+            log_kn_step (float): log10(Kn) spacing of the table.
+        """
+        self.shape = shape
+        self.machs = np.arange(0.0, mach_max + mach_step / 2, mach_step)
+        self.log_knudsen = np.arange(log_kn_min, log_kn_max + log_kn_step / 2, log_kn_step)
+        self.mach_step = float(mach_step)
+        self.log_kn_step = float(log_kn_step)
+        self.log_kn_min = float(log_kn_min)
+        self.table = bridged_drag_coefficient(continuum_drag_coefficient(shape, self.machs)[:, None],
+                                              shape.free_molecular_cd, 10.0 ** self.log_knudsen[None, :])
+        self._rows = self.table.tolist()
+        self._last_m = len(self.machs) - 2
+        self._last_k = len(self.log_knudsen) - 2
+        # Kn = _path_factor / density
+        self._path_factor = MOLECULAR_MASS / (math.sqrt(2) * math.pi * MOLECULAR_DIAMETER ** 2 * shape.characteristic_length)
+
+    def __call__(self, speed, density, temperature):
+        """Cd at one air-relative speed (m/s), air density (kg/m³) and temperature (K)."""
+        if density <= 0.0:
+            return self.shape.free_molecular_cd
+        x = min(speed / math.sqrt(GAMMA * R_AIR * temperature) / self.mach_step, self._last_m + 1.0)
+        i = min(int(x), self._last_m)
+        f = x - i
+        y = (math.log10(self._path_factor / density) - self.log_kn_min) / self.log_kn_step
+        y = min(max(y, 0.0), self._last_k + 1.0)
+        j = min(int(y), self._last_k)
+        g = y - j
+        lo, hi = self._rows[i], self._rows[i + 1]
+        a = lo[j] + g * (lo[j + 1] - lo[j])
+        b = hi[j] + g * (hi[j + 1] - hi[j])
+        return a + f * (b - a)
+
+    def coefficients(self, speed, density, temperature):
+        """Vectorised Cd over arrays of speeds (m/s), densities (kg/m³) and temperatures (K)."""
+        speed, density, temperature = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (speed, density, temperature)))
+        x = np.clip(speed / np.sqrt(GAMMA * R_AIR * temperature) / self.mach_step, 0.0, self._last_m + 1.0)
+        i = np.minimum(x.astype(int), self._last_m)
+        f = x - i
+        with np.errstate(divide="ignore"):
+            y = (np.log10(self._path_factor / density) - self.log_kn_min) / self.log_kn_step
+        y = np.clip(y, 0.0, self._last_k + 1.0)
+        j = np.minimum(y.astype(int), self._last_k)
+        g = y - j
+        table = self.table
+        a = table[i, j] + g * (table[i, j + 1] - table[i, j])
+        b = table[i + 1, j] + g * (table[i + 1, j + 1] - table[i + 1, j])
+        return np.where(density <= 0.0, self.shape.free_molecular_cd, a + f * (b - a))
+
+
+def get_drag_model(drag, **options):
+    """
+    Return a drag coefficient source for the propagators.
+
+    Parameters:
+        drag: None (use the satellite's constant Cd), a Shape (tabulated into a
+            DragModel), a DragModel or any callable (speed, density, temperature) -> Cd.
+        **options: Keyword arguments for DragModel when drag is a Shape.
+    """
+    if isinstance(drag, Shape):
+        return DragModel(drag, **options)
+    return drag
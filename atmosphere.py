@@ -0,0 +1,403 @@
+import hashlib
+import json
+import math
+import os
+
+import numpy as np
+
+import nrlmsis_calculator
+from initial_conditions import EPOCH, G, M_e, r_e
+from nrlmsis_calculator import BatchQuery, get_atmospheric_data
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".atmosphere_cache")
+H_MAX = 1000.0  # top of the tables (km), density above is 0
+LAT_STEP = 10.0  # latitude spacing of run tables (deg)
+LON_STEP = 15.0  # longitude spacing of run tables (deg), one hour of local solar time
+TIME_STEP = 3600.0  # time spacing of run tables (s), in which the diurnal bulge moves one LON_STEP
+TABLE_RTOL = 1e-2  # altitude interpolation error of run tables, about that of the lat/lon spacing
+ALTITUDE_MARGIN = 50.0  # km above the apogee covered by run tables, for the ellipsoid and J2
+GEODETIC_MARGIN = 0.2  # geodetic minus geocentric latitude stays below this (deg)
+
+
+class DirectAtmosphere:
+    def __init__(self, epoch=EPOCH, lat_deg=0.0, lon_deg=0.0, space_weather=None):
+        """
+        Evaluate NRLMSISE-00 on every call. Slow, but exact; used for validation.
+
+        Parameters:
+            epoch (datetime): Date and time (UTC) of simulation time 0.
+            lat_deg (float): Latitude of queries that do not give one, in degrees.
+            lon_deg (float): Longitude of queries that do not give one, in degrees.
+            space_weather: F10.7/Ap source, see nrlmsis_calculator.space_weather_source().
+        """
+        self.epoch = epoch
+        self.lat_deg = lat_deg
+        self.lon_deg = lon_deg
+        self.space_weather = nrlmsis_calculator.space_weather_source(space_weather)
+        self.query = BatchQuery(epoch, space_weather=self.space_weather)
+
+    def cache_info(self):
+        return self.query.cache_info()
+
+    def density(self, t, altitude_km, lat_deg=None, lon_deg=None):
+        """Air density (kg/m³) at simulation time t (s), altitude (km) and geodetic lat/lon (deg)."""
+        lat_deg = self.lat_deg if lat_deg is None else lat_deg
+        lon_deg = self.lon_deg if lon_deg is None else lon_deg
+        return get_atmospheric_data(t, altitude_km, lat_deg, lon_deg, self.epoch, self.space_weather)[1]
+
+    def densities(self, t, altitude_km, lat_deg=None, lon_deg=None):
+        """Vectorised density over arrays of times, altitudes and optionally lat/lon."""
+        lat_deg = self.lat_deg if lat_deg is None else lat_deg
+        lon_deg = self.lon_deg if lon_deg is None else lon_deg
+        return self.query(t, altitude_km, lat_deg, lon_deg)["density"]
+
+    def air_temperature(self, t, altitude_km, lat_deg=None, lon_deg=None):
+        """Air temperature (K) at the point, as density()."""
+        lat_deg = self.lat_deg if lat_deg is None else lat_deg
+        lon_deg = self.lon_deg if lon_deg is None else lon_deg
+        return get_atmospheric_data(t, altitude_km, lat_deg, lon_deg, self.epoch, self.space_weather)[0]
+
+    def air_temperatures(self, t, altitude_km, lat_deg=None, lon_deg=None):
+        """Vectorised air_temperature()."""
+        lat_deg = self.lat_deg if lat_deg is None else lat_deg
+        lon_deg = self.lon_deg if lon_deg is None else lon_deg
+        return self.query(t, altitude_km, lat_deg, lon_deg)["temperature"]
+
+
+def _interpolate(table, axes, h_min, h_max, dh, last, t, altitude_km, lat_deg, lon_deg):
+    """
+    Density from a flat log-density table, as TabulatedAtmosphere.density;
+    with h_max = inf also the temperature from the log-temperature table.
+
+    axes holds origin, step, size and stride of the time, latitude and
+    longitude axes; longitude wraps around. Works on lists of floats and
+    is compiled as it is by kernel.py.
+    """
+    if altitude_km >= h_max:
+        return 0.0
+    x = max(altitude_km - h_min, 0.0) / dh
+    k = min(int(x), last)
+    e = x - k
+    bases = [k]
+    weights = [1.0]
+    values = (float(t), float(lat_deg), float(lon_deg))
+    for n in range(3):
+        size = int(axes[n][2])
+        if size == 1:
+            continue
+        u = (values[n] - axes[n][0]) / axes[n][1]
+        if n == 2:
+            u = ((values[n] - axes[n][0]) % 360.0) / axes[n][1]
+        u = min(max(u, 0.0), size - 1.0)
+        j = min(int(u), size - 2)
+        g = u - j
+        stride = int(axes[n][3])
+        bases = [b + j * stride for b in bases] + [b + (j + 1) * stride for b in bases]
+        weights = [w * (1 - g) for w in weights] + [w * g for w in weights]
+    log_density = 0.0
+    for m in range(len(bases)):
+        b = bases[m]
+        log_density += weights[m] * (table[b] + e * (table[b + 1] - table[b]))
+    return math.exp(log_density)
+
+
+class TabulatedAtmosphere:
+    def __init__(self, epoch=EPOCH, h_min=0.0, h_max=H_MAX, rtol=1e-3, time_span=None, time_step=3600.0,
+                 lat_deg=0.0, lon_deg=0.0, cache_dir=CACHE_DIR, space_weather=None, lat_step=None, lon_step=None,
+                 max_lat=90.0, check_samples=1000):
+        """
+        NRLMSISE-00 density and temperature tabulated over altitude and optionally time, latitude and longitude.
+
+        log(density) and log(temperature) are stored on a (time, latitude,
+        longitude, altitude) grid and interpolated linearly along every axis.
+        The altitude spacing is refined until interpolation reproduces the
+        model density at the cell midpoints of every profile within rtol
+        (max_error). The other axes have a fixed
+        spacing, so after the build the table is compared with the model at
+        check_samples random points of the times, latitudes (up to max_lat)
+        and longitudes it is meant to cover; model_error holds the largest
+        relative error. A table without a latitude or longitude axis stays at
+        lat_deg / lon_deg whatever the position of a query, which model_error
+        then shows. Tables are saved in cache_dir under a key derived from all
+        model inputs, so later runs with the same inputs load them instead of
+        rebuilding. The key includes the F10.7/Ap values over the table's time
+        span, so a table is rebuilt when they change. See table_options() for
+        a table covering given orbits.
+
+        Parameters:
+            epoch (datetime): Date and time (UTC) of simulation time 0.
+            h_min (float): Lowest tabulated altitude in km. Lower queries are clamped.
+            h_max (float): Highest tabulated altitude in km. Density above is 0,
+                temperature that at h_max.
+            rtol (float): Allowed relative interpolation error in altitude.
+            time_span (float, optional): Length of the time axis in s. When None
+                the table is evaluated at the epoch only, with its space weather.
+            time_step (float): Spacing of the time axis in s.
+            lat_deg (float): Latitude of a table without latitude axis, in degrees.
+            lon_deg (float): Longitude of a table without longitude axis, in degrees.
+            cache_dir (str, optional): Directory of the on-disk cache, None disables it.
+            space_weather: F10.7/Ap source, see nrlmsis_calculator.space_weather_source().
+            lat_step (float, optional): Spacing of a latitude axis in degrees,
+                covering -max_lat to max_lat.
+            lon_step (float, optional): Spacing of a longitude axis in degrees,
+                covering all longitudes.
+            max_lat (float): Largest latitude (deg) the table is used at.
+            check_samples (int): Random points of the comparison with the model.
+        """
+        self.epoch = epoch
+        self.space_weather = nrlmsis_calculator.space_weather_source(space_weather)
+        self.h_min = float(h_min)
+        self.h_max = float(h_max)
+        self.rtol = rtol
+        self.lat_deg = lat_deg
+        self.lon_deg = lon_deg
+        self.max_lat = min(float(max_lat), 90.0)
+        if time_span is None:
+            self.times = np.zeros(1)
+        else:
+            self.times = np.arange(0.0, time_span + time_step, time_step)
+        if lat_step is None:
+            self.latitudes = np.array([float(lat_deg)])
+        else:
+            self.latitudes = lat_step * np.arange(-math.ceil(self.max_lat / lat_step), math.ceil(self.max_lat / lat_step) + 1)
+        if lon_step is None:
+            self.longitudes = np.array([float(lon_deg)])
+        else:
+            self.longitudes = -180.0 + lon_step * np.arange(math.ceil(360.0 / lon_step) + 1)
+        self.time_step = float(time_step)
+        self.check_samples = check_samples
+        self.cache_dir = cache_dir
+        self.key = self._cache_key()
+        self.log_density, self.log_temperature, self.max_error, self.model_error = (
+            self._load() if cache_dir else (None, None, None, None))
+        self.loaded_from_cache = self.log_density is not None
+        if self.log_density is None:
+            self.log_density, self.log_temperature, self.max_error = self._build()
+            self._index()
+            self.model_error = self.check(check_samples)
+            if cache_dir:
+                self._save()
+        else:
+            self._index()
+
+    def _index(self):
+        """Flat table and axis layout for the interpolation."""
+        heights = self.log_density.shape[-1]
+        self.dh = (self.h_max - self.h_min) / (heights - 1)
+        self.heights = np.linspace(self.h_min, self.h_max, heights)
+        self._last = heights - 2
+        _, n_lat, n_lon, _ = self.log_density.shape
+        self._axes = [[0.0, self.time_step, len(self.times), n_lat * n_lon * heights],
+                      [float(self.latitudes[0]), float(self.latitudes[-1] - self.latitudes[0]) / max(n_lat - 1, 1), n_lat, n_lon * heights],
+                      [float(self.longitudes[0]), float(self.longitudes[-1] - self.longitudes[0]) / max(n_lon - 1, 1), n_lon, heights]]
+        self._flat = self.log_density.ravel().tolist()
+        self._flat_temperature = self.log_temperature.ravel().tolist()
+
+    def _cache_key(self):
+        inputs = {
+            "epoch": self.epoch.isoformat(),
+            "h_min": self.h_min,
+            "h_max": self.h_max,
+            "rtol": self.rtol,
+            "times": [float(self.times[0]), float(self.times[-1]), len(self.times)],
+            "latitudes": [float(self.latitudes[0]), float(self.latitudes[-1]), len(self.latitudes)],
+            "longitudes": [float(self.longitudes[0]), float(self.longitudes[-1]), len(self.longitudes)],
+            "max_lat": self.max_lat,
+            "check_samples": self.check_samples,
+            **nrlmsis_calculator.model_settings(self.space_weather, self.epoch, self.times[0], self.times[-1]),
+        }
+        return hashlib.sha1(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+    def _path(self):
+        return os.path.join(self.cache_dir, f"density_{self.key}.npz")
+
+    def _load(self):
+        try:
+            with np.load(self._path()) as data:
+                return data["log_density"], data["log_temperature"], float(data["max_error"]), float(data["model_error"])
+        except (OSError, KeyError, ValueError):
+            return None, None, None, None
+
+    def _save(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        np.savez(self._path(), log_density=self.log_density, log_temperature=self.log_temperature, max_error=self.max_error, model_error=self.model_error)
+
+    def _evaluate(self, heights):
+        """
+        log(density) and log(temperature) of the model on the time x latitude x
+        longitude x heights grid, stacked along a first axis of size 2; one time
+        and latitude at a time.
+        """
+        table = np.empty((2, len(self.times), len(self.latitudes), len(self.longitudes), len(heights)))
+        for i, t in enumerate(self.times):
+            for j, lat in enumerate(self.latitudes):
+                result = nrlmsis_calculator.evaluate(t, heights[None, :], lat, self.longitudes[:, None], self.epoch,
+                                                     self.space_weather)
+                table[:, i, j] = np.log(np.moveaxis(result[..., [nrlmsis_calculator.DENSITY, nrlmsis_calculator.TEMPERATURE]], -1, 0))
+        return table
+
+    def _build(self):
+        cells = max(int(math.ceil(self.h_max - self.h_min)), 1)  # start with ~1 km spacing
+        table = self._evaluate(np.linspace(self.h_min, self.h_max, cells + 1))
+        while True:
+            edges = np.linspace(self.h_min, self.h_max, cells + 1)
+            midpoints = self._evaluate((edges[:-1] + edges[1:]) / 2)
+            interpolated = (table[0, ..., :-1] + table[0, ..., 1:]) / 2  # the density sets the spacing
+            error = np.max(np.abs(np.expm1(interpolated - midpoints[0])))
+            refined = np.empty(table.shape[:-1] + (2 * cells + 1,))
+            refined[..., ::2] = table
+            refined[..., 1::2] = midpoints
+            if error <= self.rtol or cells >= 2 ** 20:
+                return refined[0], refined[1], error
+            table, cells = refined, 2 * cells
+
+    def check(self, samples=1000, seed=0):
+        """
+        Largest relative error of the table against the model at random points.
+
+        The points are drawn from the tabulated times and altitudes, latitudes
+        up to max_lat and all longitudes.
+        """
+        rng = np.random.default_rng(seed)
+        t = rng.uniform(0.0, self.times[-1], samples)
+        altitude = rng.uniform(self.h_min, self.h_max, samples)
+        lat = rng.uniform(-self.max_lat, self.max_lat, samples)
+        lon = rng.uniform(-180.0, 180.0, samples)
+        model = nrlmsis_calculator.evaluate(t, altitude, lat, lon, self.epoch, self.space_weather)[..., nrlmsis_calculator.DENSITY]
+        return float(np.max(np.abs(self.densities(t, altitude, lat, lon) / model - 1)))
+
+    def density(self, t, altitude_km, lat_deg=None, lon_deg=None):
+        """
+        Air density (kg/m³) at simulation time t (s), altitude (km) and geodetic lat/lon (deg).
+
+        lat_deg and lon_deg default to the table's location; they are ignored
+        along a missing axis.
+        """
+        return _interpolate(self._flat, self._axes, self.h_min, self.h_max, self.dh, self._last, t, altitude_km,
+                            self.lat_deg if lat_deg is None else lat_deg, self.lon_deg if lon_deg is None else lon_deg)
+
+    def densities(self, t, altitude_km, lat_deg=None, lon_deg=None):
+        """Vectorised density over arrays of times, altitudes and optionally lat/lon."""
+        altitude_km = np.asarray(altitude_km, dtype=float)
+        log_density = self._lookup(self.log_density, t, altitude_km, lat_deg, lon_deg)
+        return np.where(altitude_km >= self.h_max, 0.0, np.exp(log_density))
+
+    def air_temperature(self, t, altitude_km, lat_deg=None, lon_deg=None):
+        """Air temperature (K) at the point, as density(); above h_max the temperature at h_max."""
+        return _interpolate(self._flat_temperature, self._axes, self.h_min, math.inf, self.dh, self._last, t,
+                            min(altitude_km, self.h_max), self.lat_deg if lat_deg is None else lat_deg,
+                            self.lon_deg if lon_deg is None else lon_deg)
+
+    def air_temperatures(self, t, altitude_km, lat_deg=None, lon_deg=None):
+        """Vectorised air_temperature()."""
+        return np.exp(self._lookup(self.log_temperature, t, altitude_km, lat_deg, lon_deg))
+
+    def _lookup(self, table, t, altitude_km, lat_deg=None, lon_deg=None):
+        """Interpolated values of a log table at arrays of points; altitudes are clamped to the table."""
+        lat_deg = self.lat_deg if lat_deg is None else lat_deg
+        lon_deg = self.lon_deg if lon_deg is None else lon_deg
+        t, altitude_km, lat_deg, lon_deg = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (t, altitude_km, lat_deg, lon_deg)))
+        x = np.clip(altitude_km - self.h_min, 0.0, self.h_max - self.h_min) / self.dh
+        k = np.minimum(x.astype(int), self._last)
+        e = x - k
+        bases, weights = [k], [1.0]
+        for n, (value, (origin, step, size, stride)) in enumerate(zip((t, lat_deg, lon_deg), self._axes)):
+            if size == 1:
+                continue
+            u = ((value - origin) % 360.0 if n == 2 else value - origin) / step
+            u = np.clip(u, 0.0, size - 1.0)
+            j = np.minimum(u.astype(int), size - 2)
+            g = u - j
+            bases = [b + j * stride for b in bases] + [b + (j + 1) * stride for b in bases]
+            weights = [w * (1 - g) for w in weights] + [w * g for w in weights]
+        table = table.ravel()
+        return sum(w * (table[b] + e * (table[b + 1] - table[b])) for b, w in zip(bases, weights))
+
+
+def table_options(states, duration, max_orbits=None, lat_step=LAT_STEP, lon_step=LON_STEP, time_step=TIME_STEP,
+                  rtol=TABLE_RTOL):
+    """
+    TabulatedAtmosphere arguments for a table covering the runs from some states.
+
+    The time axis spans the duration, or max_orbits periods of the slowest
+    orbit when that is shorter, so the space weather follows the run. The
+    latitude axis reaches the largest inclination (plus the geodetic
+    correction) and the altitudes the highest apogee plus a margin.
+
+    Parameters:
+        states (sequence): (pos, vel) pairs in m and m/s (ECI).
+        duration (float): Length of the runs in s.
+        max_orbits (int, optional): Orbit limit of the runs.
+        lat_step (float): Latitude spacing in degrees.
+        lon_step (float): Longitude spacing in degrees.
+        time_step (float): Time spacing in s.
+        rtol (float): Altitude interpolation error.
+
+    Returns:
+        dict: time_span, time_step, h_max, max_lat, lat_step, lon_step and rtol.
+    """
+    mu = G * M_e
+    time_span, h_max, max_lat = 0.0, 0.0, 0.0
+    for pos, vel in states:
+        pos, vel = np.asarray(pos, dtype=float), np.asarray(vel, dtype=float)
+        r = np.linalg.norm(pos)
+        h = np.cross(pos, vel)
+        inclination = math.degrees(math.acos(min(max(h[2] / np.linalg.norm(h), -1.0), 1.0)))
+        lat = min(inclination, 180.0 - inclination)
+        max_lat = max(max_lat, lat + GEODETIC_MARGIN if lat > 0 else 0.0)
+        energy = vel @ vel / 2 - mu / r
+        if energy >= 0:  # not bound
+            h_max, time_span = H_MAX, duration
+            continue
+        a = -mu / (2 * energy)
+        e = math.sqrt(max(1 - (h @ h) / (mu * a), 0.0))
+        h_max = max(h_max, (a * (1 + e) - r_e) / 1000 + ALTITUDE_MARGIN)
+        period = 2 * math.pi * math.sqrt(a ** 3 / mu)
+        time_span = max(time_span, duration if max_orbits is None else min(duration, 1.1 * max_orbits * period))
+    return {"time_span": float(time_span), "time_step": time_step, "h_max": min(50.0 * math.ceil(h_max / 50.0), H_MAX),
+            "max_lat": min(max_lat, 90.0), "lat_step": lat_step, "lon_step": lon_step, "rtol": rtol}
+
+
+def _gridded(**options):
+    from drag import GriddedAtmosphere
+    return GriddedAtmosphere(**options)
+
+
+def _surrogate(**options):
+    from drag import SurrogateAtmosphere
+    return SurrogateAtmosphere(**options)
+
+
+ATMOSPHERES = {"direct": DirectAtmosphere, "table": TabulatedAtmosphere, "grid": _gridded, "surrogate": _surrogate}
+
+
+def get_atmosphere(atmosphere="table", **options):
+    """
+    Return an atmosphere density source.
+
+    Parameters:
+        atmosphere (str or object): 'table' (default, TabulatedAtmosphere,
+            see table_options() for the arguments of a run), 'direct', 'grid'
+            (drag.GriddedAtmosphere), 'surrogate' (random forest) or an object
+            with density(t, altitude_km, lat_deg, lon_deg) and
+            densities(t, altitude_km, lat_deg, lon_deg) methods, and
+            air_temperature() / air_temperatures() of the same arguments
+            for runs with a drag model (aerodynamics.py).
+        **options: Keyword arguments for the atmosphere constructor.
+
+    Returns:
+        The atmosphere to query during the run.
+    """
+    if not isinstance(atmosphere, str):
+        return atmosphere
+    constructor = ATMOSPHERES.get(atmosphere)
+    if constructor is None:
+        raise ValueError(f"Unknown atmosphere: {atmosphere}")
+    return constructor(**options)
+
+
+def run_atmosphere(atmosphere, epoch, states, duration, max_orbits=None):
+    """get_atmosphere() for runs from (pos, vel) states; a 'table' covers their range, see table_options()."""
+    if isinstance(atmosphere, str) and atmosphere == "table":
+        return TabulatedAtmosphere(epoch=epoch, **table_options(states, duration, max_orbits))
+    return get_atmosphere(atmosphere, epoch=epoch)
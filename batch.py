@@ -0,0 +1,122 @@
+from initial_conditions import *
+from trajectory import TrajectoryBuffer
+from atmosphere import run_atmosphere
+from geodesy import corotating_velocity, eci_to_geodetic
+from symulation import j2_acceleration
+from aerodynamics import get_drag_model
+
+
+def sym_batch(satellites, step=None, duration=None, atmosphere="table", max_orbits=1, t_max=None, record_every=1,
+              rotating_atmosphere=True, j2=False, drag=None):
+    """
+    Propagate many satellites together as one (N, 3) state array.
+
+    Gravity and drag are evaluated for all objects that are still flying in
+    one vectorised pass per step, using the same semi-implicit Euler update as
+    sym(). Every object stops on its own when it falls below the surface,
+    completes max_orbits orbits (ascending crossing of the x axis) or reaches
+    its time limit; the others keep going.
+
+    Parameters:
+        satellites (sequence): Objects with pos, vel, mass, A and Cd attributes
+            (e.g. Mothership, Pod, copies of them with other parameters, or
+            Scenarios sharing one epoch).
+        step (float, optional): Step size (s). Defaults to dt.
+        duration (float, optional): Longest simulated time (s). Defaults to total_time.
+        atmosphere (str or object): Density source, see atmosphere.run_atmosphere.
+        max_orbits (int or array, optional): Orbits after which an object
+            stops, per object or for all. None never stops on orbits.
+        t_max (float or array, optional): Time limit per object (s).
+        record_every (int): Store only every n-th step (plus the final sample
+            of every object) to limit memory for large batches.
+        rotating_atmosphere (bool): Drag from the velocity relative to the
+            co-rotating atmosphere, as in sym().
+        j2 (bool): Add the J2 oblateness term to gravity.
+        drag (Shape, DragModel or sequence, optional): Tabulated Cd model (see
+            aerodynamics.py) for all objects, or one per object where None
+            keeps that object's constant Cd. The temperature comes from the
+            atmosphere, as in sym().
+
+    Returns:
+        tuple: List of (positions, velocity, time) arrays per satellite and an
+        array with the reason each one stopped ('FALL', 'ORBIT' or 'TIME').
+    """
+    epochs = {getattr(satellite, "epoch", EPOCH) for satellite in satellites}
+    if len(epochs) > 1:
+        raise ValueError("All satellites of a batch must share one epoch")
+    epoch = epochs.pop()
+    h = dt if step is None else step
+    duration = total_time if duration is None else duration
+    atmosphere = run_atmosphere(atmosphere, epoch, [(satellite.pos, satellite.vel) for satellite in satellites], duration,
+                                max_orbits)
+    max_steps = int(np.ceil(duration / h))
+
+    n = len(satellites)
+    pos = np.array([satellite.pos for satellite in satellites], dtype=float)
+    vel = np.array([satellite.vel for satellite in satellites], dtype=float)
+    mass = np.array([satellite.mass for satellite in satellites], dtype=float)
+    area = np.array([satellite.A for satellite in satellites], dtype=float)
+    cd = np.array([getattr(satellite, "Cd", 1.0) for satellite in satellites], dtype=float)
+    ballistic = 0.5 * area / mass
+    models = {}  # one table per distinct model, evaluated for its objects in one call
+    members = {}
+    for k, model in enumerate(drag if isinstance(drag, (list, tuple)) else [drag] * n):
+        if model is not None:
+            if id(model) not in models:
+                models[id(model)] = get_drag_model(model)
+            members.setdefault(id(model), []).append(k)
+    groups = [(models[key], np.isin(np.arange(n), ks)) for key, ks in members.items()]
+
+    orbit_limit = np.full(n, np.inf) if max_orbits is None else np.broadcast_to(np.asarray(max_orbits, dtype=float), (n,))
+    time_limit = np.full(n, float(duration)) if t_max is None else np.minimum(np.broadcast_to(np.asarray(t_max, dtype=float), (n,)), duration)
+    orbits = np.zeros(n, dtype=int)
+    active = np.ones(n, dtype=bool)
+    end = np.zeros(n, dtype=int)
+    status = np.full(n, "TIME", dtype=object)
+
+    trajectory = TrajectoryBuffer(pos.shape, capacity=max_steps // record_every + 2)
+    trajectory.append(pos, vel, 0.0)
+    t = 0.0
+    for i in range(max_steps):
+        idx = np.flatnonzero(active)
+        if not len(idx):
+            break
+        p, v = pos[idx], vel[idx]
+        r = np.linalg.norm(p, axis=1)[:, None]
+        lat, lon, altitude_km = eci_to_geodetic(p, t, epoch)
+        ro = atmosphere.densities(t, altitude_km, lat, lon)
+        v_air = corotating_velocity(p, v) if rotating_atmosphere else v
+        speed = np.linalg.norm(v_air, axis=1)
+        cd_now = cd[idx]
+        if groups:
+            temperature = atmosphere.air_temperatures(t, altitude_km, lat, lon)
+        for model, member in groups:
+            sel = member[idx]
+            cd_now[sel] = model.coefficients(speed[sel], ro[sel], temperature[sel])
+        acc = -G * M_e / r ** 3 * p - (cd_now * ballistic[idx] * ro * speed)[:, None] * v_air
+        if j2:
+            acc += j2_acceleration(r, p)
+
+        v = v + acc * h
+        p_new = p + v * h
+        t += h
+        pos[idx], vel[idx] = p_new, v
+        orbits[idx] += (p[:, 1] < 0) & (0 < p_new[:, 1])
+
+        fell = altitude_km < 0
+        circled = orbits[idx] >= orbit_limit[idx]
+        timeout = t >= time_limit[idx] - 1e-9 * h
+        done = fell | circled | timeout
+        status[idx[timeout]] = "TIME"
+        status[idx[circled]] = "ORBIT"
+        status[idx[fell]] = "FALL"
+
+        if done.any() or (i + 1) % record_every == 0:
+            trajectory.append(pos, vel, t)
+            end[idx] = len(trajectory) - 1
+        active[idx[done]] = False
+
+    positions, velocity, time = trajectory.positions, trajectory.velocity, trajectory.time
+    results = [(positions[:end[k] + 1, k].copy(), velocity[:end[k] + 1, k].copy(), time[:end[k] + 1].copy())
+               for k in range(n)]
+    return results, status
@@ -0,0 +1,311 @@
+import fnmatch
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+BENCHMARKS = {}
+LOWER_IS_BETTER = ("us_per_call", "us_per_point", "seconds", "peak_rss_kb")
+HIGHER_IS_BETTER = ("steps_per_s", "mb_per_s")
+
+
+def benchmark(name):
+    """Register a benchmark function under name; it returns a dict of metrics."""
+    def register(function):
+        BENCHMARKS[name] = function
+        return function
+    return register
+
+
+def _best(function, number=1, repeat=3):
+    """Smallest time (s) of one call of function over repeat runs of number calls."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        times.append((time.perf_counter() - start) / number)
+    return min(times)
+
+
+def peak_rss_kb():
+    """Peak resident set size of this process in KiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak  # bytes on macOS, KiB on Linux
+
+
+def _sym_benchmark(satellite_name, step, kernel=False):
+    def run(quick=False):
+        import initial_conditions
+        from atmosphere import TabulatedAtmosphere
+        from symulation import sym
+
+        satellite = getattr(initial_conditions, satellite_name)
+        atmosphere = TabulatedAtmosphere()
+        duration = 5000.0 if quick else 20000.0
+        if kernel:  # compile (or load the numba cache) outside the timing
+            sym(satellite, step=step, duration=10 * step, atmosphere=atmosphere, max_orbits=None, kernel=True)
+        start = time.perf_counter()
+        _, _, t = sym(satellite, step=step, duration=duration, atmosphere=atmosphere, max_orbits=None, kernel=kernel)
+        elapsed = time.perf_counter() - start
+        return {"steps_per_s": (len(t) - 1) / elapsed, "seconds": elapsed}
+    return run
+
+
+for _name in ("Mothership", "Pod"):
+    for _step in (1, 5, 10):
+        benchmark(f"sym/{_name}/dt={_step}")(_sym_benchmark(_name, _step))
+    benchmark(f"sym/{_name}/dt=1/kernel")(_sym_benchmark(_name, 1, kernel=True))
+
+
+@benchmark("atmosphere/direct/scalar")
+def _atmosphere_direct(quick=False):
+    from nrlmsis_calculator import get_atmospheric_data
+
+    return {"us_per_call": _best(lambda: get_atmospheric_data(100.0, 150.0, 0, 0), 200 if quick else 2000) * 1e6}
+
+
+@benchmark("atmosphere/table/scalar")
+def _atmosphere_table(quick=False):
+    from atmosphere import TabulatedAtmosphere
+
+    atmosphere = TabulatedAtmosphere()
+    return {"us_per_call": _best(lambda: atmosphere.density(100.0, 150.0, 0, 0), 10000 if quick else 100000) * 1e6}
+
+
+@benchmark("atmosphere/table/batch")
+def _atmosphere_table_batch(quick=False):
+    from atmosphere import TabulatedAtmosphere
+
+    atmosphere = TabulatedAtmosphere()
+    altitudes = np.random.default_rng(0).uniform(0, 1000, 10000 if quick else 1000000)
+    return {"us_per_point": _best(lambda: atmosphere.densities(0.0, altitudes)) / len(altitudes) * 1e6}
+
+
+@benchmark("atmosphere/direct/batch")
+def _atmosphere_direct_batch(quick=False):
+    from drag import msis_profile
+
+    altitudes = np.random.default_rng(0).uniform(0, 1000, 1000 if quick else 10000)
+    return {"us_per_point": _best(lambda: msis_profile(altitudes, 0.0, 0.0)) / len(altitudes) * 1e6}
+
+
+@benchmark("atmosphere/direct/memoized")
+def _atmosphere_memoized(quick=False):
+    from nrlmsis_calculator import BatchQuery
+
+    altitudes = np.random.default_rng(0).uniform(0, 1000, 1000 if quick else 10000)
+    query = BatchQuery()
+    cold = _best(lambda: query(0.0, altitudes), repeat=1)
+    warm = _best(lambda: query(0.0, altitudes))
+    return {"us_per_point": cold / len(altitudes) * 1e6, "warm_us_per_point": warm / len(altitudes) * 1e6}
+
+
+@benchmark("atmosphere/grid/scalar")
+def _atmosphere_grid(quick=False):
+    from drag import GriddedAtmosphere
+
+    atmosphere = GriddedAtmosphere()
+    return {"us_per_call": _best(lambda: atmosphere.density(100.0, 150.0, 12.0, 34.0), 10000 if quick else 100000) * 1e6}
+
+
+@benchmark("shape/heat_flux/scalar")
+def _shape_scalar(quick=False):
+    from Heat_profile import Shape
+
+    shape = Shape("double_cone", 0.001)
+    return {"us_per_call": _best(lambda: shape.calculate_heat_flux_coefficient(1e-9, 7500.0), 10000 if quick else 100000) * 1e6}
+
+
+@benchmark("shape/heat_flux/grid")
+def _shape_grid(quick=False):
+    from Heat_profile import Shape
+
+    shape = Shape("double_cone", 0.001)
+    n = 1000 if quick else 10000
+    density, velocity, profile = np.full(n, 1e-9), np.full(n, 7500.0), np.linspace(0, 1, 100)
+    return {"us_per_point": _best(lambda: shape.heat_flux_grid(density, velocity, profile)) / (n * len(profile)) * 1e6}
+
+
+@benchmark("heating/heat_profile")
+def _heating(quick=False):
+    from Heat_profile import Shape
+    from atmosphere import TabulatedAtmosphere
+    from heating import heat_profile
+
+    n = 10000 if quick else 1000000
+    angle = np.linspace(0, 2 * np.pi, n)
+    radius = 6378100.0 + 200e3
+    positions = radius * np.column_stack([np.cos(angle), np.sin(angle), np.zeros(n)])
+    velocity = 7800.0 * np.column_stack([-np.sin(angle), np.cos(angle), np.zeros(n)])
+    times = np.arange(n, dtype=float)
+    shape, atmosphere = Shape("double_cone", 0.001), TabulatedAtmosphere()
+    seconds = _best(lambda: heat_profile(positions, velocity, times, shape, atmosphere), repeat=1 if not quick else 3)
+    return {"seconds": seconds, "us_per_point": seconds / n * 1e6}
+
+
+@benchmark("surrogate/train_predict")
+def _surrogate(quick=False):
+    try:
+        import sklearn  # noqa: F401
+    except ImportError:
+        return {"skipped": "scikit-learn is not installed"}
+    from drag import TemperatureDensityPredictor, generate_training_data
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "training.csv")
+        generate_training_data(path, n_samples=2000 if quick else 20000)
+        predictor = TemperatureDensityPredictor(path, n_estimators=10 if quick else 100, cache_dir=None)
+        start = time.perf_counter()
+        predictor.get_losses()
+        train = time.perf_counter() - start
+    height = np.random.default_rng(0).uniform(0, 1000, 10000)
+    predict = _best(lambda: predictor.predict(height, 0.0, 0.0), repeat=3)
+    single = _best(lambda: predictor.predict(400.0, 0.0, 0.0), 10)
+    return {"seconds": train, "us_per_point": predict / len(height) * 1e6, "us_per_call": single * 1e6}
+
+
+@benchmark("trajectory/io")
+def _trajectory_io(quick=False):
+    from trajfile import TrajectoryWriter, open_trajectory
+
+    n = 100000 if quick else 2000000
+    positions, velocity, times = np.random.default_rng(0).normal(size=(n, 3)), np.ones((n, 3)), np.arange(n, dtype=float)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.traj")
+
+        def write():
+            with TrajectoryWriter(path) as writer:
+                for start in range(0, n, 65536):
+                    writer.write(positions[start:start + 65536], velocity[start:start + 65536], times[start:start + 65536])
+
+        write_seconds = _best(write)
+        size_mb = os.path.getsize(path) / 1e6
+        read_seconds = _best(lambda: float(open_trajectory(path).positions[:, 0].sum()))
+    return {"write_mb_per_s": size_mb / write_seconds, "read_mb_per_s": size_mb / read_seconds}
+
+
+@benchmark("plot/decimate")
+def _plot_decimate(quick=False):
+    from plotting import decimated_altitude, decimated_orbit
+    from trajfile import open_trajectory, save_trajectory
+
+    n = 100000 if quick else 1000000
+    t = np.arange(n, dtype=float)
+    phase = t * 2 * np.pi / 5400
+    positions = 6.7e6 * np.column_stack([np.cos(phase), np.sin(phase), 0.1 * np.sin(phase)])
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.traj")
+        save_trajectory(path, positions, positions, t)
+        trajectory = open_trajectory(path)
+        decimated_altitude(trajectory.time, trajectory.positions, method="lttb")  # numba compile / cache load
+        metrics = {}
+        for method in ("minmax", "lttb"):
+            seconds = _best(lambda: (decimated_orbit(trajectory.positions, method=method),
+                                     decimated_altitude(trajectory.time, trajectory.positions, method=method)))
+            metrics[f"{method}_us_per_point"] = seconds / n * 1e6
+    return metrics
+
+
+def _run_one(name, quick):
+    metrics = BENCHMARKS[name](quick=quick)
+    metrics["peak_rss_kb"] = peak_rss_kb()
+    return metrics
+
+
+def run_benchmarks(patterns=("*",), quick=False, isolate=True):
+    """
+    Run the registered benchmarks whose names match any of the glob patterns.
+
+    Parameters:
+        patterns (sequence): fnmatch patterns, e.g. 'sym/*' or 'atmosphere/*'.
+        quick (bool): Smaller problem sizes, for a fast smoke run.
+        isolate (bool): Run every benchmark in a fresh process, so peak_rss_kb
+            belongs to that benchmark alone and caches do not carry over.
+
+    Returns:
+        dict: 'meta' (machine and versions) and 'results' (metrics per benchmark).
+    """
+    names = [name for name in BENCHMARKS if any(fnmatch.fnmatch(name, pattern) for pattern in patterns)]
+    results = {}
+    for name in names:
+        if isolate:
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                results[name] = pool.submit(_run_one, name, quick).result()
+        else:
+            results[name] = _run_one(name, quick)
+    meta = {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "quick": quick,
+    }
+    return {"meta": meta, "results": results}
+
+
+def _direction(metric):
+    if metric.endswith(LOWER_IS_BETTER):
+        return -1
+    if metric.endswith(HIGHER_IS_BETTER):
+        return 1
+    return 0
+
+
+def compare(results, baseline, tolerance=0.1):
+    """
+    Compare benchmark results with a baseline.
+
+    Parameters:
+        results, baseline (dict): Outputs of run_benchmarks() (or loaded JSON files).
+        tolerance (float): Relative change that still counts as unchanged.
+
+    Returns:
+        list: (benchmark, metric, baseline value, new value, relative change,
+        status) rows, status being 'ok', 'faster' or 'REGRESSION'. The change
+        is signed so that positive is always an improvement.
+    """
+    rows = []
+    for name, metrics in results["results"].items():
+        old_metrics = baseline["results"].get(name, {})
+        for metric, value in metrics.items():
+            direction = _direction(metric)
+            old = old_metrics.get(metric)
+            if not direction or not isinstance(old, (int, float)) or not old:
+                continue
+            change = direction * (value - old) / old
+            status = "REGRESSION" if change < -tolerance else "faster" if change > tolerance else "ok"
+            rows.append((name, metric, old, value, change, status))
+    return rows
+
+
+def load_results(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def save_results(results, path):
+    with open(path, "w") as file:
+        json.dump(results, file, indent=2)
+
+
+def format_results(results, rows=None):
+    """Human-readable table of results, with the baseline comparison when rows are given."""
+    lines = []
+    if rows is None:
+        for name, metrics in results["results"].items():
+            values = ", ".join(f"{metric}={value:.4g}" if isinstance(value, float) else f"{metric}={value}"
+                               for metric, value in metrics.items())
+            lines.append(f"{name:32s} {values}")
+    else:
+        for name, metric, old, new, change, status in rows:
+            lines.append(f"{name:32s} {metric:16s} {old:12.4g} -> {new:12.4g} {change:+7.1%} {status}")
+    return "\n".join(lines)
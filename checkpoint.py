@@ -0,0 +1,94 @@
+import os
+import pickle
+
+import numpy as np
+
+from scenario import Scenario
+from trajfile import open_trajectory
+
+FORMAT = 1
+
+
+def checkpoint_path(output):
+    """Default checkpoint file of a trajectory file."""
+    return output + ".ckpt"
+
+
+def save_checkpoint(path, state):
+    """Write a propagator state atomically, so an interruption never leaves a torn checkpoint."""
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as file:
+        pickle.dump({"format": FORMAT, **state}, file, protocol=pickle.HIGHEST_PROTOCOL)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+
+
+def load_checkpoint(path):
+    """
+    Read a checkpoint written by sym(..., checkpoint=path).
+
+    Returns:
+        dict: t, pos, vel, h (next step size), steps, samples (records of the
+        trajectory file that belong to the state), integrator and event
+        state, the run description ('run') and stopped_by (name of the
+        terminal event, if one ended the run).
+    """
+    with open(path, "rb") as file:
+        state = pickle.load(file)
+    if state.get("format") != FORMAT:
+        raise ValueError(f"Unsupported checkpoint format in {path}")
+    return state
+
+
+def state_from_trajectory(path):
+    """
+    Approximate propagator state at the last sample of a trajectory file without a checkpoint.
+
+    Integrator caches and event records are not stored in the file, so they
+    start afresh: the orbit counter restarts and its reference plane is that
+    of the last sample.
+    """
+    trajectory = open_trajectory(path)
+    if not len(trajectory):
+        raise ValueError(f"Empty trajectory file: {path}")
+    metadata = trajectory.metadata
+    step = float(metadata.get("step", 1.0))
+    t = float(trajectory.time[-1])
+    return {"t": t, "pos": np.array(trajectory.positions[-1]), "vel": np.array(trajectory.velocity[-1]), "h": step,
+            "steps": int(round(t / step)), "samples": len(trajectory), "integrator": None, "events": None,
+            "values": None, "stopped_by": None, "run": {"scenario": {key: metadata[key] for key in (
+                "name", "pos", "vel", "mass", "A", "Cd", "epoch", "duration", "step")},
+                "integrator": metadata.get("integrator", "euler"),
+                "rotating_atmosphere": metadata.get("rotating_atmosphere", True), "j2": metadata.get("j2", False)}}
+
+
+def continue_run(output, duration, checkpoint=None, **options):
+    """
+    Resume an interrupted run, or extend a finished one to a longer duration.
+
+    Only the new samples are appended to the trajectory file. The run is
+    restored from its checkpoint when there is one, exactly as it was
+    (integrator caches, event records, orbit count); otherwise from the last
+    sample of the file, see state_from_trajectory().
+
+    Parameters:
+        output (str): Trajectory file of the run.
+        duration (float): New total simulated time (s), counted from the start of the run.
+        checkpoint (str, optional): Checkpoint file, default output + '.ckpt'.
+        **options: Passed to sym() (max_orbits, atmosphere, checkpoint_every, ...);
+            integrator, rotating_atmosphere and j2 default to those of the run.
+
+    Returns:
+        tuple: positions, velocity and time of the whole trajectory (memory-mapped).
+    """
+    from symulation import sym
+
+    checkpoint = checkpoint or checkpoint_path(output)
+    state = load_checkpoint(checkpoint) if os.path.exists(checkpoint) else state_from_trajectory(output)
+    run = state["run"]
+    for name in ("integrator", "rotating_atmosphere", "j2"):
+        options.setdefault(name, run[name])
+    options.setdefault("max_orbits", None)
+    return sym(Scenario.from_dict(run["scenario"]), duration=duration, output=output, checkpoint=checkpoint,
+               resume=state, **options)
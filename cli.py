@@ -0,0 +1,408 @@
+import argparse
+import os
+import sys
+
+TRAJECTORY_DIR = "trajectories"
+SATELLITES = ("Mothership", "Pod")
+
+
+def trajectory_path(name, directory=TRAJECTORY_DIR):
+    return os.path.join(directory, f"{name}.traj")
+
+
+def propagate(names=SATELLITES, directory=TRAJECTORY_DIR, batch=False, **options):
+    """
+    Propagate satellites from initial_conditions and store their trajectories.
+
+    Parameters:
+        names (sequence): Satellite class names in initial_conditions.
+        directory (str): Where the <name>.traj files are written.
+        batch (bool): Propagate all of them together with sym_batch().
+        **options: Passed to sym() or sym_batch().
+    """
+    import initial_conditions
+
+    os.makedirs(directory, exist_ok=True)
+    satellites = [getattr(initial_conditions, name) for name in names]
+    if batch:
+        from batch import sym_batch
+        from trajfile import save_trajectory
+        from scenario import Scenario
+
+        results, status = sym_batch(satellites, **options)
+        for name, satellite, (positions, velocity, time), reason in zip(names, satellites, results, status):
+            metadata = Scenario(satellite).as_dict()
+            metadata.update(propagator="sym_batch", status=reason)
+            save_trajectory(trajectory_path(name, directory), positions, velocity, time, metadata)
+    else:
+        from symulation import sym
+
+        from checkpoint import checkpoint_path
+
+        checkpoint_every = options.pop("checkpoint_every", None)
+        for name, satellite in zip(names, satellites):
+            path = trajectory_path(name, directory)
+            if checkpoint_every:
+                options.update(checkpoint=checkpoint_path(path), checkpoint_every=checkpoint_every)
+            sym(satellite, output=path, **options)
+
+
+def continue_propagation(names=SATELLITES, directory=TRAJECTORY_DIR, duration=None, **options):
+    """Resume or extend stored trajectories to duration, see checkpoint.continue_run."""
+    from checkpoint import continue_run
+
+    for name in names:
+        continue_run(trajectory_path(name, directory), duration, **options)
+
+
+def load_trajectories(names=SATELLITES, directory=TRAJECTORY_DIR):
+    """
+    Stored trajectories of the named satellites.
+
+    Only satellites without a stored trajectory are propagated (with the
+    default settings); everything else is memory-mapped from disk.
+
+    Returns:
+        list: trajfile.Trajectory per name.
+    """
+    from trajfile import open_trajectory
+
+    missing = [name for name in names if not os.path.exists(trajectory_path(name, directory))]
+    if missing:
+        propagate(missing, directory)
+    return [open_trajectory(trajectory_path(name, directory)) for name in names]
+
+
+def _finish_figure(fig, save, name):
+    import matplotlib.pyplot as plt
+
+    if save:
+        os.makedirs(save, exist_ok=True)
+        fig.savefig(os.path.join(save, f"{name}.png"))
+        plt.close(fig)
+
+
+def plot(names=SATELLITES, directory=TRAJECTORY_DIR, save=None, delta=True, points=None, method="minmax"):
+    """
+    Orbit and altitude plots (and delta_pos.txt) from stored trajectories.
+
+    Curves are decimated to about points samples, see plotting.minmax_indices.
+    delta_pos.txt is written into save, or next to the trajectories when the
+    figures are shown.
+    """
+    if save:
+        import matplotlib
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from output import delta_distance, make_graf
+    from plotting import POINTS, plot_altitudes
+
+    points = points or POINTS
+    trajectories = load_trajectories(names, directory)
+    for name, trajectory in zip(names, trajectories):
+        _finish_figure(make_graf(trajectory.positions, show=False, points=points, method=method), save, f"{name}_orbit")
+    if delta and len(trajectories) == 2:
+        delta_distance(trajectories[0], trajectories[1], os.path.join(save or directory, "delta_pos.txt"))
+
+    fig = plt.figure()
+    plot_altitudes(trajectories, fig.add_subplot(), list(names), points, method)
+    _finish_figure(fig, save, "altitude")
+    if not save:
+        plt.show()
+
+
+def plot_directory(directory=TRAJECTORY_DIR, save=None, points=None, method="minmax"):
+    """
+    Every trajectory file in directory (e.g. of a sweep) on one orbit and one altitude figure.
+
+    With save the figures are rendered headless into save/orbits.png and
+    save/altitude.png, see plotting.render_trajectories.
+    """
+    from plotting import BATCH_POINTS, plot_altitudes, plot_orbits, render_trajectories, trajectory_files
+
+    paths = trajectory_files(directory)
+    if not paths:
+        raise SystemExit(f"No trajectory files in {directory}")
+    if save:
+        render_trajectories(paths, save, points or BATCH_POINTS, method)
+        return
+    import matplotlib.pyplot as plt
+
+    plot_orbits(paths, plt.figure().add_subplot(), points=points or BATCH_POINTS, method=method)
+    plot_altitudes(paths, plt.figure().add_subplot(), points=points or BATCH_POINTS, method=method)
+    plt.show()
+
+
+def heat(name="Pod", directory=TRAJECTORY_DIR, shape="double_cone", volume=0.001, save=None):
+    """Heat flux, accumulated heat and temperature of a stored trajectory."""
+    if save:
+        import matplotlib
+        matplotlib.use("Agg")
+    from Heat_profile import Shape
+    from HeatFlux import heat_analysis, plot_heat
+
+    trajectory = load_trajectories([name], directory)[0]
+    results = heat_analysis(trajectory.positions, trajectory.velocity, trajectory.time, Shape(shape, volume))
+    fig = plot_heat(trajectory.time, *results, show=not save)
+    _finish_figure(fig, save, f"{name}_heat")
+
+
+def _values(text):
+    return [float(value) for value in text.split(",")]
+
+
+def _distribution(text):
+    """'uniform:a:b' or 'normal:mean:sigma' -> callable drawing one value."""
+    kind, a, b = text.split(":")
+    a, b = float(a), float(b)
+    if kind == "uniform":
+        return lambda rng: rng.uniform(a, b)
+    if kind == "normal":
+        return lambda rng: rng.normal(a, b)
+    raise argparse.ArgumentTypeError(f"Unknown distribution: {kind}")
+
+
+def sweep(grid=(), random=(), samples=100, seed=0, results="sweep.jsonl", base="Pod", workers=None, trajectories=None,
+          **options):
+    """Run a parameter grid or Monte Carlo sweep, see sweep.run_sweep."""
+    import initial_conditions
+    from sweep import grid_cases, random_cases, run_sweep
+
+    if grid:
+        cases = grid_cases({name: _values(values) for name, values in grid})
+    else:
+        cases = random_cases({name: _distribution(spec) for name, spec in random}, samples, seed)
+    run_sweep(cases, results, base=getattr(initial_conditions, base), workers=workers, trajectory_dir=trajectories,
+              **options)
+
+
+def lifetime(names=SATELLITES, handover_km=150.0, years=25.0, reentry=True):
+    """Print the orbit-averaged lifetime estimate of satellites, see lifetime.estimate_lifetime."""
+    import initial_conditions
+    from lifetime import YEAR, estimate_lifetime
+
+    for name in names:
+        result = estimate_lifetime(getattr(initial_conditions, name), handover_km=handover_km, max_time=years * YEAR,
+                                   reentry=reentry)
+        history = result["history"]
+        line = f"{name}: {result['status']}"
+        if result["lifetime"] is not None:
+            line += f", lifetime {result['lifetime'] / 86400:.2f} days"
+        if result["handover_time"] is not None:
+            line += f", handover after {result['handover_time'] / 86400:.2f} days"
+        line += f", final perigee/apogee {history['perigee_km'][-1]:.1f}/{history['apogee_km'][-1]:.1f} km"
+        print(line)
+
+
+def relative(chief="Mothership", deputy="Pod", mode="auto", duration=None, step=None, save=None):
+    """Print (and save) the separation history of deputy relative to chief, see relative.relative_motion."""
+    import numpy as np
+    import initial_conditions
+    from relative import relative_motion
+
+    result = relative_motion(getattr(initial_conditions, chief), getattr(initial_conditions, deputy), duration, step, mode)
+    radial, in_track, cross = result["position"][-1]
+    print(f"{deputy} relative to {chief} ({result['mode']}, {result['status']}): after {result['time'][-1]:.0f} s "
+          f"R/I/C {radial:.3f}/{in_track:.3f}/{cross:.3f} m, largest range {result['range'].max():.3f} m")
+    if save:
+        np.savetxt(save, np.column_stack([result["time"], result["position"], result["range"]]),
+                   header="time_s radial_m in_track_m cross_track_m range_m")
+
+
+def bench(patterns=("*",), quick=False, save=None, baseline=None, tolerance=0.1):
+    """
+    Run the benchmark suite, see benchmark.run_benchmarks.
+
+    Returns:
+        int: 1 if a metric regressed against the baseline by more than tolerance, else 0.
+    """
+    from benchmark import compare, format_results, load_results, run_benchmarks, save_results
+
+    results = run_benchmarks(patterns or ("*",), quick)
+    if save:
+        save_results(results, save)
+    if not baseline:
+        print(format_results(results))
+        return 0
+    rows = compare(results, load_results(baseline), tolerance)
+    print(format_results(results, rows))
+    return int(any(row[-1] == "REGRESSION" for row in rows))
+
+
+def validate(names=None, integrators=None, steps=None, atmospheres=None, duration=20000.0, budget=(), save=None,
+             baseline=None, tolerance=0.1):
+    """
+    Speed/accuracy table of integrator x step x atmosphere configurations, see validation.validate.
+
+    Returns:
+        int: 1 if an error grew against the baseline by more than tolerance, else 0.
+    """
+    import validation
+
+    configs = validation.configurations(integrators or validation.INTEGRATORS, steps or validation.STEPS,
+                                        atmospheres or validation.ATMOSPHERES)
+    rows = validation.validate(names, configs, duration)
+    print(validation.format_table(rows))
+    if budget:
+        budget = {metric: float(value) for metric, value in budget}
+        for name, row in validation.fastest_within(rows, budget).items():
+            label = None if row is None else " ".join(validation.describe(row).split())
+            choice = "none within budget" if row is None else f"{label} ({row['seconds']:.3f} s)"
+            print(f"fastest within budget, {name}: {choice}")
+    if save:
+        validation.save_results(rows, save)
+    if not baseline:
+        return 0
+    comparison = validation.compare(rows, validation.load_results(baseline), tolerance)
+    print(validation.format_comparison(comparison))
+    return int(any(row[-1] == "REGRESSION" for row in comparison))
+
+
+def _assignment(text):
+    name, _, value = text.partition("=")
+    if not value:
+        raise argparse.ArgumentTypeError(f"Expected NAME=VALUE, got {text!r}")
+    return name, value
+
+
+def _max_orbits(text):
+    return None if text.lower() == "none" else int(text)
+
+
+def build_parser():
+    from atmosphere import ATMOSPHERES
+
+    parser = argparse.ArgumentParser(prog="orbital_calculator", description="Orbit decay and re-entry simulation.")
+    parser.add_argument("--space-weather", metavar="CSV",
+                        help="CelesTrak F10.7/Ap file for the atmosphere model (default: constant activity)")
+    commands = parser.add_subparsers(dest="command")
+
+    propagate_parser = commands.add_parser("propagate", help="propagate satellites and store their trajectories")
+    propagate_parser.add_argument("satellites", nargs="*", default=list(SATELLITES))
+    propagate_parser.add_argument("--dir", default=TRAJECTORY_DIR)
+    propagate_parser.add_argument("--integrator", default="euler", choices=("euler", "rk4", "leapfrog", "dopri54"))
+    propagate_parser.add_argument("--step", type=float)
+    propagate_parser.add_argument("--duration", type=float)
+    propagate_parser.add_argument("--max-orbits", type=_max_orbits, default=1)
+    propagate_parser.add_argument("--atmosphere", default="table", choices=tuple(ATMOSPHERES))
+    propagate_parser.add_argument("--j2", action="store_true")
+    propagate_parser.add_argument("--batch", action="store_true", help="propagate all satellites together")
+    propagate_parser.add_argument("--profile", action="store_true", help="print per-stage timings of every run")
+    propagate_parser.add_argument("--trace", metavar="JSON", help="also write a Chrome trace of the (last) run")
+    propagate_parser.add_argument("--kernel", action="store_true", help="use the compiled Euler kernel where possible")
+    propagate_parser.add_argument("--checkpoint-every", type=float, metavar="SECONDS",
+                                  help="save <trajectory>.ckpt this often (wall time) so the run can be resumed")
+
+    continue_parser = commands.add_parser("continue", help="resume interrupted runs or extend stored trajectories")
+    continue_parser.add_argument("satellites", nargs="*", default=list(SATELLITES))
+    continue_parser.add_argument("--dir", default=TRAJECTORY_DIR)
+    continue_parser.add_argument("--duration", type=float, required=True, help="new total simulated time (s)")
+    continue_parser.add_argument("--max-orbits", type=_max_orbits, default=None)
+    continue_parser.add_argument("--checkpoint-every", type=float, default=300.0, metavar="SECONDS")
+
+    plot_parser = commands.add_parser("plot", help="plot stored trajectories")
+    plot_parser.add_argument("satellites", nargs="*", default=list(SATELLITES))
+    plot_parser.add_argument("--dir", default=TRAJECTORY_DIR)
+    plot_parser.add_argument("--save", metavar="DIR", help="write PNG files instead of showing the figures")
+    plot_parser.add_argument("--all", action="store_true", help="every trajectory file in --dir on shared figures")
+    plot_parser.add_argument("--points", type=int, help="samples drawn per curve")
+    plot_parser.add_argument("--method", default="minmax", choices=("minmax", "lttb", "none"),
+                             help="decimation of the curves ('none' draws every sample)")
+
+    heat_parser = commands.add_parser("heat", help="heating analysis of a stored trajectory")
+    heat_parser.add_argument("satellite", nargs="?", default="Pod")
+    heat_parser.add_argument("--dir", default=TRAJECTORY_DIR)
+    heat_parser.add_argument("--shape", default="double_cone")
+    heat_parser.add_argument("--volume", type=float, default=0.001)
+    heat_parser.add_argument("--save", metavar="DIR")
+
+    sweep_parser = commands.add_parser("sweep", help="parameter sweep / Monte Carlo over a process pool")
+    sweep_parser.add_argument("--grid", type=_assignment, action="append", default=[], metavar="NAME=V1,V2,...")
+    sweep_parser.add_argument("--random", type=_assignment, action="append", default=[], metavar="NAME=normal:MEAN:SIGMA")
+    sweep_parser.add_argument("--samples", type=int, default=100)
+    sweep_parser.add_argument("--seed", type=int, default=0)
+    sweep_parser.add_argument("--results", default="sweep.jsonl")
+    sweep_parser.add_argument("--base", default="Pod")
+    sweep_parser.add_argument("--workers", type=int)
+    sweep_parser.add_argument("--duration", type=float)
+    sweep_parser.add_argument("--integrator", default="euler")
+    sweep_parser.add_argument("--trajectories", metavar="DIR", help="also store every case's trajectory here")
+
+    lifetime_parser = commands.add_parser("lifetime", help="orbit-averaged lifetime estimate with re-entry handover")
+    lifetime_parser.add_argument("satellites", nargs="*", default=list(SATELLITES))
+    lifetime_parser.add_argument("--handover", type=float, default=150.0, help="apogee altitude (km) of the handover")
+    lifetime_parser.add_argument("--years", type=float, default=25.0)
+    lifetime_parser.add_argument("--no-reentry", action="store_true", help="stop at the handover")
+
+    relative_parser = commands.add_parser("relative", help="separation history of two satellites")
+    relative_parser.add_argument("chief", nargs="?", default="Mothership")
+    relative_parser.add_argument("deputy", nargs="?", default="Pod")
+    relative_parser.add_argument("--mode", default="auto", choices=("auto", "cw", "nonlinear"))
+    relative_parser.add_argument("--duration", type=float)
+    relative_parser.add_argument("--step", type=float)
+    relative_parser.add_argument("--save", metavar="TXT", help="write time and R/I/C separation columns")
+
+    validate_parser = commands.add_parser("validate", help="accuracy and wall time of integrators, steps and atmospheres")
+    validate_parser.add_argument("scenarios", nargs="*", help="Mothership, Pod and/or Kepler (default all)")
+    validate_parser.add_argument("--integrators", type=lambda text: text.split(","), help="e.g. euler,rk4")
+    validate_parser.add_argument("--steps", type=_values, help="fixed step sizes (s), e.g. 1,5,10")
+    validate_parser.add_argument("--atmospheres", type=lambda text: text.split(","), help="e.g. table,grid,direct")
+    validate_parser.add_argument("--duration", type=float, default=20000.0)
+    validate_parser.add_argument("--budget", type=_assignment, action="append", default=[], metavar="METRIC=LIMIT",
+                                 help="e.g. position_error_m=1000; report the fastest configuration within it")
+    validate_parser.add_argument("--save", metavar="JSON", help="write the results to this file")
+    validate_parser.add_argument("--baseline", metavar="JSON", help="compare the errors with results saved earlier")
+    validate_parser.add_argument("--tolerance", type=float, default=0.1)
+
+    bench_parser = commands.add_parser("bench", help="benchmark the hot paths, optionally against a baseline")
+    bench_parser.add_argument("patterns", nargs="*", help="benchmark name patterns, e.g. 'sym/*'")
+    bench_parser.add_argument("--quick", action="store_true", help="small problem sizes")
+    bench_parser.add_argument("--save", metavar="JSON", help="write the results to this file")
+    bench_parser.add_argument("--baseline", metavar="JSON", help="compare with results saved earlier")
+    bench_parser.add_argument("--tolerance", type=float, default=0.1)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.space_weather:
+        from nrlmsis_calculator import set_space_weather
+        set_space_weather(args.space_weather)
+    if args.command == "propagate":
+        options = dict(step=args.step, duration=args.duration, max_orbits=args.max_orbits,
+                       atmosphere=args.atmosphere, j2=args.j2)
+        if not args.batch:
+            options["integrator"] = args.integrator
+            options["profile"] = args.trace or args.profile
+            options["kernel"] = args.kernel
+            options["checkpoint_every"] = args.checkpoint_every
+        propagate(args.satellites, args.dir, batch=args.batch, **options)
+    elif args.command == "continue":
+        continue_propagation(args.satellites, args.dir, args.duration, max_orbits=args.max_orbits,
+                             checkpoint_every=args.checkpoint_every)
+    elif args.command == "heat":
+        heat(args.satellite, args.dir, args.shape, args.volume, args.save)
+    elif args.command == "sweep":
+        options = {"integrator": args.integrator}
+        if args.duration is not None:
+            options["duration"] = args.duration
+        sweep(args.grid, args.random, args.samples, args.seed, args.results, args.base, args.workers, args.trajectories,
+              **options)
+    elif args.command == "lifetime":
+        lifetime(args.satellites, args.handover, args.years, not args.no_reentry)
+    elif args.command == "relative":
+        relative(args.chief, args.deputy, args.mode, args.duration, args.step, args.save)
+    elif args.command == "validate":
+        return validate(args.scenarios, args.integrators, args.steps, args.atmospheres, args.duration, args.budget,
+                        args.save, args.baseline, args.tolerance)
+    elif args.command == "bench":
+        return bench(args.patterns, args.quick, args.save, args.baseline, args.tolerance)
+    elif getattr(args, "all", False):
+        plot_directory(args.dir, args.save, args.points, args.method)
+    else:
+        plot(getattr(args, "satellites", SATELLITES), getattr(args, "dir", TRAJECTORY_DIR), getattr(args, "save", None),
+             points=getattr(args, "points", None), method=getattr(args, "method", "minmax"))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,60 +1,168 @@
-import numpy as np
-import pandas as pd
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.metrics import mean_squared_error
+import hashlib
+import json
+import math
 import os
 
+import numpy as np
+
+import nrlmsis_calculator
+from initial_conditions import EPOCH
+from atmosphere import CACHE_DIR
+
+TRAINING_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output.txt")
+
+
+def msis_profile(height, latitude, longitude, time_offset=0.0, epoch=EPOCH, space_weather=None):
+    """
+    NRLMSISE-00 temperature and density for arrays of points in one call.
+
+    Args:
+        height (array): Altitude in km.
+        latitude (array): Latitude in degrees.
+        longitude (array): Longitude in degrees.
+        time_offset (float): Seconds since the epoch.
+        epoch (datetime): Date and time (UTC) of time_offset 0.
+        space_weather: F10.7/Ap source, see nrlmsis_calculator.space_weather_source().
+
+    Returns:
+        tuple: Temperature (K) and density (kg/m³) arrays of the broadcast shape.
+    """
+    result = nrlmsis_calculator.evaluate(time_offset, height, latitude, longitude, epoch, space_weather)
+    return result[..., nrlmsis_calculator.TEMPERATURE], result[..., nrlmsis_calculator.DENSITY]
+
+
+def generate_training_data(data_path=TRAINING_FILE, n_samples=20000, h_max=1000.0, seed=42, epoch=EPOCH):
+    """
+    Write a CSV of random NRLMSISE-00 samples for TemperatureDensityPredictor.
+
+    Args:
+        data_path (str): Output CSV with height (km), latitude, longitude,
+            temperature (K) and density (kg/m³) columns.
+        n_samples (int): Number of random points.
+        h_max (float): Highest sampled altitude in km.
+        seed (int): Random seed for reproducibility.
+        epoch (datetime): Date and time (UTC) of the samples.
+    """
+    rng = np.random.default_rng(seed)
+    height = rng.uniform(0.0, h_max, n_samples)
+    latitude = np.degrees(np.arcsin(rng.uniform(-1.0, 1.0, n_samples)))
+    longitude = rng.uniform(-180.0, 180.0, n_samples)
+    temperature, density = msis_profile(height, latitude, longitude, epoch=epoch)
+    np.savetxt(data_path, np.column_stack([height, latitude, longitude, temperature, density]), delimiter=",",
+               header="height,latitude,longitude,temperature,density", comments="")
+
+
 class TemperatureDensityPredictor:
-    def __init__(self, data_path, n_estimators=100, random_state=42):
+    def __init__(self, data_path=TRAINING_FILE, n_estimators=100, random_state=42, n_jobs=None, log_density=True,
+                 cache_dir=CACHE_DIR):
         """
-        Initialize the predictor by loading the data, preprocessing it, and training the models.
+        Random forest surrogate of temperature and density over (height, latitude, longitude).
+
+        The models are trained on first use and saved in cache_dir under a key
+        made from the data file contents and the training parameters; later
+        instances with the same data load them instead of retraining.
 
         Args:
-            data_path (str): Path to the CSV file containing the data.
+            data_path (str): Path to the CSV file containing the data (see generate_training_data).
             n_estimators (int): Number of trees in the Random Forest model.
             random_state (int): Random seed for reproducibility.
+            n_jobs (int, optional): Parallel jobs for training and prediction.
+            log_density (bool): Fit log(density) instead of density. Density
+                spans 15 orders of magnitude, so a forest fitted on the raw
+                values is only usable near the ground. The density losses are
+                then in log space.
+            cache_dir (str, optional): Directory of the model cache, None disables it.
         """
         if not os.path.exists(data_path):
             raise FileNotFoundError(f"Data file not found: {data_path}")
-        
+        self.data_path = data_path
+        self.n_estimators = n_estimators
+        self.random_state = random_state
+        self.n_jobs = n_jobs
+        self.log_density = log_density
+        self.cache_dir = cache_dir
+        self.key = self._cache_key()
+        self._loaded = False
+
+    def _cache_key(self):
+        digest = hashlib.sha1()
+        with open(self.data_path, "rb") as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                digest.update(block)
+        digest.update(json.dumps({"n_estimators": self.n_estimators, "random_state": self.random_state,
+                                  "log_density": self.log_density}).encode())
+        return digest.hexdigest()
+
+    def _path(self):
+        return os.path.join(self.cache_dir, f"surrogate_{self.key}.joblib")
+
+    def _load(self):
+        if self._loaded:
+            return
+        import joblib
+
+        state = None
+        if self.cache_dir:
+            try:
+                state = joblib.load(self._path())
+            except (OSError, EOFError, KeyError, ValueError):
+                state = None
+        if state is None:
+            state = self._train()
+            if self.cache_dir:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                joblib.dump(state, self._path())
+        self.__dict__.update(state)
+        for model in (self.temp_model, self.density_model):
+            model.n_jobs = self.n_jobs
+        self._loaded = True
+
+    def _train(self):
+        """Fit the scaler and both forests; returns them with their losses."""
+        import pandas as pd
+        from sklearn.model_selection import train_test_split
+        from sklearn.preprocessing import StandardScaler
+
         # Load and preprocess data
-        self.data = pd.read_csv(data_path)
-        
+        data = pd.read_csv(self.data_path)
+
         # Ensure required columns exist
         required_columns = {'height', 'latitude', 'longitude', 'temperature', 'density'}
-        if not required_columns.issubset(self.data.columns):
+        if not required_columns.issubset(data.columns):
             raise ValueError(f"Dataset must contain columns: {required_columns}")
-        
+
         # Prepare features (X) and targets (y)
-        X = self.data[['height', 'latitude', 'longitude']]
-        y_temp = self.data['temperature']
-        y_density = self.data['density']
-        
-        # Split data into training and testing sets
-        X_train, X_test, y_temp_train, y_temp_test = train_test_split(
-            X, y_temp, test_size=0.2, random_state=random_state
-        )
-        _, _, y_density_train, y_density_test = train_test_split(
-            X, y_density, test_size=0.2, random_state=random_state
+        X = data[['height', 'latitude', 'longitude']].to_numpy()
+        y_temp = data['temperature'].to_numpy()
+        y_density = data['density'].to_numpy()
+        if self.log_density:
+            y_density = np.log(y_density)
+
+        # Split data into training and testing sets (one split for both targets)
+        X_train, X_test, y_temp_train, y_temp_test, y_density_train, y_density_test = train_test_split(
+            X, y_temp, y_density, test_size=0.2, random_state=self.random_state
         )
-        
+
         # Scale features
-        self.scaler_X = StandardScaler()
-        X_train_scaled = self.scaler_X.fit_transform(X_train)
-        X_test_scaled = self.scaler_X.transform(X_test)
-        
+        scaler_X = StandardScaler()
+        X_train_scaled = scaler_X.fit_transform(X_train)
+        X_test_scaled = scaler_X.transform(X_test)
+
         # Train the models and calculate losses
-        self.temp_model, self.temp_train_loss, self.temp_test_loss = self._train_and_evaluate(
-            X_train_scaled, y_temp_train, X_test_scaled, y_temp_test, n_estimators, random_state
+        temp_model, temp_train_loss, temp_test_loss = self._train_and_evaluate(
+            X_train_scaled, y_temp_train, X_test_scaled, y_temp_test
         )
-        
-        self.density_model, self.density_train_loss, self.density_test_loss = self._train_and_evaluate(
-            X_train_scaled, y_density_train, X_test_scaled, y_density_test, n_estimators, random_state
+        density_model, density_train_loss, density_test_loss = self._train_and_evaluate(
+            X_train_scaled, y_density_train, X_test_scaled, y_density_test
         )
-    
-    def _train_and_evaluate(self, X_train, y_train, X_test, y_test, n_estimators, random_state):
+        return {
+            "scaler_X": scaler_X,
+            "temp_model": temp_model, "temp_train_loss": temp_train_loss, "temp_test_loss": temp_test_loss,
+            "density_model": density_model, "density_train_loss": density_train_loss,
+            "density_test_loss": density_test_loss,
+        }
+
+    def _train_and_evaluate(self, X_train, y_train, X_test, y_test):
         """
         Train a Random Forest model and calculate train and test losses.
 
@@ -63,43 +171,51 @@ class TemperatureDensityPredictor:
             y_train (ndarray): Training target values.
             X_test (ndarray): Scaled testing feature matrix.
             y_test (ndarray): Testing target values.
-            n_estimators (int): Number of trees in the Random Forest model.
-            random_state (int): Random seed for reproducibility.
 
         Returns:
             tuple: Trained model, training loss (float), testing loss (float).
         """
-        model = RandomForestRegressor(n_estimators=n_estimators, random_state=random_state)
+        from sklearn.ensemble import RandomForestRegressor
+        from sklearn.metrics import mean_squared_error
+
+        model = RandomForestRegressor(n_estimators=self.n_estimators, random_state=self.random_state, n_jobs=self.n_jobs)
         model.fit(X_train, y_train)
-        
+
         # Calculate losses
         train_loss = mean_squared_error(y_train, model.predict(X_train))
         test_loss = mean_squared_error(y_test, model.predict(X_test))
-        
+
         return model, train_loss, test_loss
-    
+
     def predict(self, height, latitude, longitude):
         """
         Predict temperature and density based on input parameters.
 
         Args:
-            height (float): Height above sea level.
-            latitude (float): Latitude in degrees.
-            longitude (float): Longitude in degrees.
+            height (float or array): Height above sea level (km for generated data).
+            latitude (float or array): Latitude in degrees.
+            longitude (float or array): Longitude in degrees.
 
         Returns:
-            tuple: Predicted temperature (float) and density (float).
+            tuple: Predicted temperature and density, floats for scalar input
+            and arrays of the broadcast input shape otherwise.
         """
-        # Prepare input features
-        input_data = np.array([[height, latitude, longitude]])
+        self._load()
+        height, latitude, longitude = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (height, latitude, longitude)))
+
+        # Prepare input features, one row per point
+        input_data = np.column_stack([height.ravel(), latitude.ravel(), longitude.ravel()])
         input_scaled = self.scaler_X.transform(input_data)
-        
+
         # Predict temperature and density
-        predicted_temp = self.temp_model.predict(input_scaled)[0]
-        predicted_density = self.density_model.predict(input_scaled)[0]
-        
+        predicted_temp = self.temp_model.predict(input_scaled).reshape(height.shape)
+        predicted_density = self.density_model.predict(input_scaled).reshape(height.shape)
+        if self.log_density:
+            predicted_density = np.exp(predicted_density)
+        if height.ndim == 0:
+            return float(predicted_temp), float(predicted_density)
         return predicted_temp, predicted_density
-    
+
     def get_losses(self):
         """
         Get the training and testing losses for temperature and density models.
@@ -107,32 +223,231 @@ class TemperatureDensityPredictor:
         Returns:
             dict: Dictionary containing train and test losses for both models.
         """
+        self._load()
         return {
             "Temperature": {"Train Loss": self.temp_train_loss, "Test Loss": self.temp_test_loss},
             "Density": {"Train Loss": self.density_train_loss, "Test Loss": self.density_test_loss}
         }
 
 
-def predict_temp_density(height, latitude, longitude, data_path='output.txt'):
+class GriddedAtmosphere:
+    def __init__(self, epoch=EPOCH, h_max=1000.0, dh=2.0, lat_step=15.0, lon_step=30.0, cache_dir=CACHE_DIR,
+                 space_weather=None):
+        """
+        NRLMSISE-00 temperature and log-density on a (latitude, longitude, height) grid.
+
+        A light alternative to the random forest: built with one vectorised
+        model call (and cached like TabulatedAtmosphere), evaluated by
+        trilinear interpolation, so it can be queried on every step while
+        keeping the latitude/longitude dependence the altitude table drops.
+
+        Args:
+            epoch (datetime): Date and time (UTC) the grid is evaluated at.
+            h_max (float): Highest altitude in km. Density above is 0.
+            dh (float): Altitude spacing in km.
+            lat_step (float): Latitude spacing in degrees.
+            lon_step (float): Longitude spacing in degrees.
+            cache_dir (str, optional): Directory of the on-disk cache, None disables it.
+            space_weather: F10.7/Ap source, see nrlmsis_calculator.space_weather_source().
+        """
+        self.epoch = epoch
+        self.space_weather = nrlmsis_calculator.space_weather_source(space_weather)
+        self.h_max = float(h_max)
+        self.heights = np.arange(0.0, h_max + dh / 2, dh)
+        self.latitudes = np.arange(-90.0, 90.0 + lat_step / 2, lat_step)
+        self.longitudes = np.arange(-180.0, 180.0 + lon_step / 2, lon_step)
+        self.steps = (float(lat_step), float(lon_step), float(dh))
+        self.cache_dir = cache_dir
+        inputs = {"epoch": epoch.isoformat(), "h_max": self.h_max, "steps": self.steps,
+                  **nrlmsis_calculator.model_settings(self.space_weather, epoch)}
+        self.key = hashlib.sha1(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+        self.temperature, self.log_density = self._load() if cache_dir else (None, None)
+        self.loaded_from_cache = self.temperature is not None
+        if self.temperature is None:
+            lat, lon, height = np.meshgrid(self.latitudes, self.longitudes, self.heights, indexing="ij")
+            self.temperature, density = msis_profile(height, lat, lon, epoch=epoch, space_weather=self.space_weather)
+            self.log_density = np.log(density)
+            if cache_dir:
+                os.makedirs(cache_dir, exist_ok=True)
+                np.savez(self._path(), temperature=self.temperature, log_density=self.log_density)
+        self._flat = self.log_density.ravel().tolist()
+        self._flat_temperature = self.temperature.ravel().tolist()
+        self._strides = (len(self.longitudes) * len(self.heights), len(self.heights))
+        self._last = (len(self.latitudes) - 2, len(self.longitudes) - 2, len(self.heights) - 2)
+
+    def _path(self):
+        return os.path.join(self.cache_dir, f"grid_{self.key}.npz")
+
+    def _load(self):
+        try:
+            with np.load(self._path()) as data:
+                return data["temperature"], data["log_density"]
+        except (OSError, KeyError, ValueError):
+            return None, None
+
+    def _cell(self, latitude, longitude, height):
+        """Lower grid indices and fractions of arrays of points."""
+        lat_step, lon_step, dh = self.steps
+        longitude = np.mod(longitude + 180.0, 360.0) - 180.0
+        coordinates = ((np.clip(latitude, -90.0, 90.0) + 90.0) / lat_step, (longitude + 180.0) / lon_step,
+                       np.clip(height, 0.0, self.h_max) / dh)
+        cells = []
+        for x, last in zip(coordinates, self._last):
+            i = np.minimum(x.astype(int), last)
+            cells.append((i, x - i))
+        return cells
+
+    def _interpolate(self, table, latitude, longitude, height):
+        (i, f), (j, g), (k, e) = self._cell(latitude, longitude, height)
+        result = 0.0
+        for di, wi in ((0, 1 - f), (1, f)):
+            for dj, wj in ((0, 1 - g), (1, g)):
+                lo, hi = table[i + di, j + dj, k], table[i + di, j + dj, k + 1]
+                result = result + wi * wj * (lo + e * (hi - lo))
+        return result
+
+    def predict(self, height, latitude, longitude):
+        """
+        Temperature (K) and density (kg/m³) at arrays of height (km), latitude and longitude (deg).
+
+        Returns:
+            tuple: Arrays of the broadcast input shape.
+        """
+        height, latitude, longitude = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (height, latitude, longitude)))
+        temperature = self._interpolate(self.temperature, latitude, longitude, height)
+        density = np.exp(self._interpolate(self.log_density, latitude, longitude, height))
+        return temperature, np.where(height >= self.h_max, 0.0, density)
+
+    def density(self, t, altitude_km, lat_deg=0.0, lon_deg=0.0):
+        """Air density (kg/m³) at altitude (km) and geodetic lat/lon (deg); t is ignored."""
+        if altitude_km >= self.h_max:
+            return 0.0
+        return math.exp(self._point(self._flat, altitude_km, lat_deg, lon_deg))
+
+    def densities(self, t, altitude_km, lat_deg=0.0, lon_deg=0.0):
+        """Vectorised density over arrays of times, altitudes and lat/lon."""
+        return self.predict(altitude_km, lat_deg, lon_deg)[1]
+
+    def air_temperature(self, t, altitude_km, lat_deg=0.0, lon_deg=0.0):
+        """Air temperature (K) at altitude (km) and geodetic lat/lon (deg); above h_max that at h_max."""
+        return self._point(self._flat_temperature, min(altitude_km, self.h_max), lat_deg, lon_deg)
+
+    def air_temperatures(self, t, altitude_km, lat_deg=0.0, lon_deg=0.0):
+        """Vectorised air_temperature()."""
+        return self.predict(altitude_km, lat_deg, lon_deg)[0]
+
+    def _point(self, table, altitude_km, lat_deg, lon_deg):
+        """Trilinear interpolation of a flat table at one point."""
+        lat_step, lon_step, dh = self.steps
+        x = (min(max(lat_deg, -90.0), 90.0) + 90.0) / lat_step
+        y = ((lon_deg + 180.0) % 360.0) / lon_step
+        z = max(altitude_km, 0.0) / dh
+        i, j, k = min(int(x), self._last[0]), min(int(y), self._last[1]), min(int(z), self._last[2])
+        f, g, e = x - i, y - j, z - k
+        si, sj = self._strides
+        value = 0.0
+        for base, w in ((i * si + j * sj + k, (1 - f) * (1 - g)), ((i + 1) * si + j * sj + k, f * (1 - g)),
+                        (i * si + (j + 1) * sj + k, (1 - f) * g), ((i + 1) * si + (j + 1) * sj + k, f * g)):
+            value += w * (table[base] + e * (table[base + 1] - table[base]))
+        return value
+
+
+class SurrogateAtmosphere:
+    def __init__(self, predictor=None, epoch=EPOCH, **options):
+        """
+        Atmosphere interface (density and temperature) over a surrogate model.
+
+        Args:
+            predictor (optional): Object with predict(height_km, lat, lon) ->
+                (temperature, density), e.g. TemperatureDensityPredictor.
+                Defaults to one trained on TRAINING_FILE, generated if missing.
+            epoch (datetime): Accepted for get_atmosphere(); the surrogate has no time axis.
+            **options: Passed to TemperatureDensityPredictor.
+        """
+        if predictor is None:
+            if not os.path.exists(options.get("data_path", TRAINING_FILE)):
+                generate_training_data(options.get("data_path", TRAINING_FILE), epoch=epoch)
+            predictor = TemperatureDensityPredictor(**options)
+        self.predictor = predictor
+        self.epoch = epoch
+
+    def density(self, t, altitude_km, lat_deg=0.0, lon_deg=0.0):
+        return max(float(self.predictor.predict(altitude_km, lat_deg, lon_deg)[1]), 0.0)
+
+    def densities(self, t, altitude_km, lat_deg=0.0, lon_deg=0.0):
+        return np.maximum(self.predictor.predict(altitude_km, lat_deg, lon_deg)[1], 0.0)
+
+    def air_temperature(self, t, altitude_km, lat_deg=0.0, lon_deg=0.0):
+        return float(self.predictor.predict(altitude_km, lat_deg, lon_deg)[0])
+
+    def air_temperatures(self, t, altitude_km, lat_deg=0.0, lon_deg=0.0):
+        return np.asarray(self.predictor.predict(altitude_km, lat_deg, lon_deg)[0])
+
+
+def error_report(model, n_samples=2000, h_max=1000.0, seed=0, epoch=EPOCH):
+    """
+    Error of a surrogate against NRLMSISE-00 at random points.
+
+    Args:
+        model: Object with predict(height_km, lat, lon) -> (temperature, density).
+        n_samples (int): Number of random test points.
+        h_max (float): Highest sampled altitude in km.
+        seed (int): Random seed of the test points.
+        epoch (datetime): Date and time (UTC) of the reference model.
+
+    Returns:
+        dict: Median, 95th percentile and max relative density error, RMS
+        temperature error (K) and prediction time per point (µs).
+    """
+    import time
+
+    rng = np.random.default_rng(seed)
+    height = rng.uniform(0.0, h_max, n_samples)
+    latitude = np.degrees(np.arcsin(rng.uniform(-1.0, 1.0, n_samples)))
+    longitude = rng.uniform(-180.0, 180.0, n_samples)
+    temperature, density = msis_profile(height, latitude, longitude, epoch=epoch)
+    start = time.perf_counter()
+    predicted_temp, predicted_density = model.predict(height, latitude, longitude)
+    elapsed = time.perf_counter() - start
+    error = np.abs(np.asarray(predicted_density) / density - 1)
+    return {
+        "density_median_rel_error": float(np.median(error)),
+        "density_p95_rel_error": float(np.percentile(error, 95)),
+        "density_max_rel_error": float(np.max(error)),
+        "temperature_rms_error": float(np.sqrt(np.mean((np.asarray(predicted_temp) - temperature) ** 2))),
+        "us_per_point": elapsed / n_samples * 1e6,
+    }
+
+
+_PREDICTORS = {}
+
+
+def predict_temp_density(height, latitude, longitude, data_path=TRAINING_FILE):
     """
-    Wrapper function to initialize the predictor and make predictions.
+    Wrapper function to make predictions with a cached predictor.
 
     Args:
-        height (float): Height above sea level.
-        latitude (float): Latitude in degrees.
-        longitude (float): Longitude in degrees.
+        height (float or array): Height above sea level.
+        latitude (float or array): Latitude in degrees.
+        longitude (float or array): Longitude in degrees.
         data_path (str): Path to the CSV data file.
 
     Returns:
-        tuple: Predicted temperature (float) and density (float).
+        tuple: Predicted temperature and density.
     """
-    predictor = TemperatureDensityPredictor(data_path)
-    return predictor.predict(height, latitude, longitude)
+    if data_path not in _PREDICTORS:
+        _PREDICTORS[data_path] = TemperatureDensityPredictor(data_path)
+    return _PREDICTORS[data_path].predict(height, latitude, longitude)
 
 
-# Example usage:
-predictor = TemperatureDensityPredictor('output.txt')
-temp, density = predictor.predict(1000, 40.7128, -74.0060)
-losses = predictor.get_losses()
-print(f"Temperature: {temp}°C, Air Density: {density} kg/m³")
-print("Losses:", losses)
+if __name__ == "__main__":
+    # Example usage:
+    if not os.path.exists(TRAINING_FILE):
+        generate_training_data(TRAINING_FILE)
+    predictor = TemperatureDensityPredictor(TRAINING_FILE)
+    temp, density = predictor.predict(1000, 40.7128, -74.0060)
+    losses = predictor.get_losses()
+    print(f"Temperature: {temp} K, Air Density: {density} kg/m³")
+    print("Losses:", losses)
+    print("Random forest vs NRLMSISE-00:", error_report(predictor))
+    print("Grid vs NRLMSISE-00:", error_report(GriddedAtmosphere()))
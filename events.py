@@ -0,0 +1,283 @@
+import numpy as np
+
+from geodesy import geodetic_point
+
+
+class Event:
+    """
+    Base class of the propagation events.
+
+    An event is the zero of a function g(t, pos, vel) of the state. sym()
+    evaluates g after every step; when its sign changes in the requested
+    direction the crossing is located inside the step by root finding on a
+    cubic Hermite interpolant of the step, so the event time does not depend
+    on the step size.
+
+    Parameters:
+        name (str): Label used in records and messages.
+        direction (int): +1 only rising zero crossings, -1 only falling ones,
+            0 both.
+        terminal (bool or int): Stop the run on the first occurrence (True) or
+            on the n-th occurrence (n).
+    """
+    name = "event"
+    direction = 0
+    terminal = False
+
+    def __init__(self, name=None, direction=None, terminal=None):
+        if name is not None:
+            self.name = name
+        if direction is not None:
+            self.direction = direction
+        if terminal is not None:
+            self.terminal = terminal
+        self.reset()
+
+    def reset(self):
+        self.times = []
+        self.positions = []
+        self.velocities = []
+        self.signs = []
+
+    @property
+    def count(self):
+        return len(self.times)
+
+    def __call__(self, t, pos, vel):
+        raise NotImplementedError
+
+    def bind(self, atmosphere, epoch):
+        """Called by sym() before the run with its atmosphere and epoch."""
+
+    def start(self, t, pos, vel):
+        """Called with the initial state of the run."""
+
+    def end_step(self, t, pos, vel):
+        """Called with the state at the end of every accepted step."""
+
+    def finish(self, t):
+        """Called once when the run ends."""
+
+    def triggers(self, g_old, g_new):
+        """Sign of the crossing between two values of g, or 0 if there is none that counts."""
+        if g_old < 0 <= g_new:
+            sign = 1
+        elif g_old > 0 >= g_new:
+            sign = -1
+        else:
+            return 0
+        return sign if self.direction in (0, sign) else 0
+
+    def record(self, t, pos, vel, sign):
+        """Store an occurrence; returns True when it ends the run."""
+        self.times.append(t)
+        self.positions.append(np.array(pos))
+        self.velocities.append(np.array(vel))
+        self.signs.append(sign)
+        if self.terminal is True:
+            return True
+        return bool(self.terminal) and self.count >= self.terminal
+
+
+class AltitudeCrossing(Event):
+    """Geodetic altitude passes altitude_km (falling by default, e.g. a target altitude)."""
+    name = "altitude"
+    direction = -1
+
+    def __init__(self, altitude_km, **options):
+        self.altitude_km = altitude_km
+        super().__init__(**options)
+
+    def __call__(self, t, pos, vel):
+        return geodetic_point(pos, 0.0)[2] - self.altitude_km
+
+
+class Impact(AltitudeCrossing):
+    """Surface impact; stops the run."""
+    name = "impact"
+    terminal = True
+
+    def __init__(self, altitude_km=0.0, **options):
+        super().__init__(altitude_km, **options)
+
+
+class OrbitCrossing(Event):
+    """
+    Return to the initial position angle, i.e. one completed revolution.
+
+    g is the position component along the initial in-plane direction of
+    motion, so a rising zero on the side of the initial position marks the
+    end of an orbit. For the equatorial starts in initial_conditions this is
+    the x-z plane crossing sym() has always counted.
+
+    Parameters:
+        pos0, vel0 (ndarray): Initial state that defines the reference plane.
+        max_count (int, optional): Stop after this many orbits.
+    """
+    name = "orbit"
+    direction = 1
+
+    def __init__(self, pos0, vel0, max_count=None, **options):
+        pos0, vel0 = np.asarray(pos0, dtype=float), np.asarray(vel0, dtype=float)
+        self.radial = pos0 / np.linalg.norm(pos0)
+        along = vel0 - np.dot(vel0, self.radial) * self.radial
+        self.along = along / np.linalg.norm(along)
+        options.setdefault("terminal", max_count or False)
+        super().__init__(**options)
+
+    def __call__(self, t, pos, vel):
+        return float(np.dot(pos, self.along))
+
+    def record(self, t, pos, vel, sign):
+        if np.dot(pos, self.radial) <= 0:
+            return False  # crossing of the plane on the far side of the Earth
+        return super().record(t, pos, vel, sign)
+
+    @property
+    def periods(self):
+        return np.diff([0.0] + self.times)
+
+
+class NodeCrossing(Event):
+    """Equator crossing; rising zeros are ascending nodes, falling ones descending nodes."""
+    name = "node"
+
+    def __call__(self, t, pos, vel):
+        return float(pos[2])
+
+
+class Apsis(Event):
+    """Periapsis (rising zero of r.v, the default) or apoapsis (direction=-1)."""
+    name = "apsis"
+    direction = 1
+
+    def __call__(self, t, pos, vel):
+        return float(np.dot(pos, vel))
+
+
+class AltitudeBand(Event):
+    """
+    Entry into (rising) and exit from (falling) the altitude band low_km - high_km.
+
+    time_inside holds the accurately timed residence in the band.
+    """
+    name = "band"
+
+    def __init__(self, low_km, high_km, **options):
+        self.low_km = low_km
+        self.high_km = high_km
+        super().__init__(**options)
+
+    def reset(self):
+        super().reset()
+        self.time_inside = 0.0
+        self._entered = None
+
+    def __call__(self, t, pos, vel):
+        altitude = geodetic_point(pos, 0.0)[2]
+        return min(altitude - self.low_km, self.high_km - altitude)
+
+    def start(self, t, pos, vel):
+        self._entered = t if self(t, pos, vel) > 0 else None  # a run starting inside the band counts
+
+    def record(self, t, pos, vel, sign):
+        if sign > 0:
+            self._entered = t
+        elif self._entered is not None:
+            self.time_inside += t - self._entered
+            self._entered = None
+        return super().record(t, pos, vel, sign)
+
+    def finish(self, t):
+        if self._entered is not None:
+            self.time_inside += t - self._entered
+            self._entered = t
+
+
+def hermite(t0, p0, v0, t1, p1, v1, t):
+    """Cubic Hermite interpolation of position and velocity inside one step."""
+    h = t1 - t0
+    s = (t - t0) / h
+    h00, h10, h01, h11 = 2 * s**3 - 3 * s**2 + 1, s**3 - 2 * s**2 + s, -2 * s**3 + 3 * s**2, s**3 - s**2
+    d00, d10, d01, d11 = 6 * s**2 - 6 * s, 3 * s**2 - 4 * s + 1, -6 * s**2 + 6 * s, 3 * s**2 - 2 * s
+    pos = h00 * p0 + h10 * h * v0 + h01 * p1 + h11 * h * v1
+    vel = (d00 * p0 + d01 * p1) / h + d10 * v0 + d11 * v1
+    return pos, vel
+
+
+def find_root(g, a, b, ga, gb, tol=1e-6, max_iter=60):
+    """Illinois regula falsi for g on [a, b] with g(a), g(b) of opposite sign."""
+    side = 0
+    for _ in range(max_iter):
+        c = (a * gb - b * ga) / (gb - ga)
+        if b - a < tol:
+            break
+        gc = g(c)
+        if gc == 0:
+            return c
+        if (gc > 0) == (gb > 0):
+            b, gb = c, gc
+            if side == -1:
+                ga /= 2
+            side = -1
+        else:
+            a, ga = c, gc
+            if side == 1:
+                gb /= 2
+            side = 1
+    return b  # the side past the crossing, so the sign has changed at the returned time
+
+
+class EventDetector:
+    def __init__(self, events, t, pos, vel):
+        """
+        Track a list of events over the accepted steps of a run.
+
+        Parameters:
+            events (list): Event instances; they are reset here.
+            t, pos, vel: Initial state of the run.
+        """
+        self.events = list(events)
+        self.values = []
+        for event in self.events:
+            event.reset()
+            event.start(t, pos, vel)
+            self.values.append(event(t, pos, vel))
+
+    def resync(self, t, pos, vel):
+        """Take (t, pos, vel) as the start of the next step, for callers that skip steps without crossings."""
+        self.values = [event(t, pos, vel) for event in self.events]
+
+    def check(self, t0, p0, v0, t1, p1, v1):
+        """
+        Locate and record the events inside the step from t0 to t1.
+
+        Returns:
+            tuple or None: (t, pos, vel, event) of the first terminal event
+            inside the step, or None to continue.
+        """
+        found = []
+        new_values = []
+        for k, event in enumerate(self.events):
+            g_new = event(t1, p1, v1)
+            new_values.append(g_new)
+            sign = event.triggers(self.values[k], g_new)
+            if sign:
+                def g(t, event=event):
+                    return event(t, *hermite(t0, p0, v0, t1, p1, v1, t))
+                t_event = find_root(g, t0, t1, self.values[k], g_new)
+                found.append((t_event, k, sign))
+        self.values = new_values
+        for t_event, k, sign in sorted(found):
+            pos, vel = hermite(t0, p0, v0, t1, p1, v1, t_event)
+            if self.events[k].record(t_event, pos, vel, sign):
+                for event in self.events:
+                    event.end_step(t_event, pos, vel)
+                return t_event, pos, vel, self.events[k]
+        for event in self.events:
+            event.end_step(t1, p1, v1)
+        return None
+
+    def finish(self, t):
+        for event in self.events:
+            event.finish(t)
@@ -0,0 +1,84 @@
+import math
+from datetime import datetime
+
+import numpy as np
+
+from initial_conditions import EPOCH
+
+OMEGA_E = 7.2921159e-5  # Earth rotation rate [rad/s]
+A_WGS84 = 6378137.0  # WGS84 equatorial radius [m]
+F_WGS84 = 1 / 298.257223563  # WGS84 flattening
+B_WGS84 = A_WGS84 * (1 - F_WGS84)  # polar radius [m]
+E2 = F_WGS84 * (2 - F_WGS84)  # first eccentricity squared
+EP2 = E2 / (1 - E2)  # second eccentricity squared
+EPOCH_J2000 = datetime(2000, 1, 1, 12)
+OMEGA_CROSS = np.array([[0.0, -OMEGA_E, 0.0], [OMEGA_E, 0.0, 0.0], [0.0, 0.0, 0.0]])  # r -> omega x r
+
+
+def earth_rotation_angle(t, epoch=EPOCH):
+    """
+    Greenwich mean sidereal angle in radians at t seconds after epoch.
+
+    Parameters:
+        t (float or ndarray): Seconds since the epoch.
+        epoch (datetime): UTC date and time of t = 0.
+
+    Returns:
+        float or ndarray: Angle between the ECI x axis and the Greenwich meridian.
+    """
+    days = (epoch - EPOCH_J2000).total_seconds() / 86400.0
+    gmst0 = np.radians((280.46061837 + 360.98564736629 * days) % 360.0)
+    return gmst0 + OMEGA_E * np.asarray(t, dtype=float)
+
+
+def eci_to_geodetic(pos, t=0.0, epoch=EPOCH):
+    """
+    Convert ECI positions into WGS84 geodetic coordinates (vectorised).
+
+    Uses Bowring's closed form, accurate to well below a metre for
+    altitudes from the ground to the exosphere.
+
+    Parameters:
+        pos (ndarray): Position(s) in m with shape (3,) or (N, 3).
+        t (float or ndarray): Seconds since the epoch, scalar or shape (N,).
+        epoch (datetime): UTC date and time of t = 0.
+
+    Returns:
+        tuple: Latitude (deg), longitude (deg, -180 to 180) and altitude (km).
+    """
+    pos = np.asarray(pos, dtype=float)
+    x, y, z = pos[..., 0], pos[..., 1], pos[..., 2]
+    p = np.hypot(x, y)
+    theta = np.arctan2(z * A_WGS84, p * B_WGS84)
+    lat = np.arctan2(z + EP2 * B_WGS84 * np.sin(theta) ** 3, p - E2 * A_WGS84 * np.cos(theta) ** 3)
+    sin_lat = np.sin(lat)
+    alt = p * np.cos(lat) + z * sin_lat - A_WGS84 * np.sqrt(1 - E2 * sin_lat ** 2)
+    lon = np.arctan2(y, x) - earth_rotation_angle(t, epoch)
+    lon = (lon + np.pi) % (2 * np.pi) - np.pi
+    return np.degrees(lat), np.degrees(lon), alt / 1000
+
+
+def geodetic_point(pos, theta):
+    """
+    Scalar version of eci_to_geodetic for the propagation loop.
+
+    Parameters:
+        pos (sequence): One ECI position (x, y, z) in m.
+        theta (float): Earth rotation angle in radians, see earth_rotation_angle.
+
+    Returns:
+        tuple: Latitude (deg), longitude (deg, -180 to 180) and altitude (km).
+    """
+    x, y, z = float(pos[0]), float(pos[1]), float(pos[2])
+    p = math.hypot(x, y)
+    beta = math.atan2(z * A_WGS84, p * B_WGS84)
+    lat = math.atan2(z + EP2 * B_WGS84 * math.sin(beta) ** 3, p - E2 * A_WGS84 * math.cos(beta) ** 3)
+    sin_lat = math.sin(lat)
+    alt = p * math.cos(lat) + z * sin_lat - A_WGS84 * math.sqrt(1 - E2 * sin_lat * sin_lat)
+    lon = (math.atan2(y, x) - theta + math.pi) % (2 * math.pi) - math.pi
+    return math.degrees(lat), math.degrees(lon), alt / 1000
+
+
+def corotating_velocity(pos, vel):
+    """Velocity relative to an atmosphere rotating with the Earth, v - omega x r, for (3,) or (N, 3)."""
+    return vel - pos @ OMEGA_CROSS.T
@@ -0,0 +1,158 @@
+import numpy as np
+
+from initial_conditions import EPOCH
+from atmosphere import run_atmosphere
+from events import Event
+from geodesy import corotating_velocity, earth_rotation_angle, eci_to_geodetic, geodetic_point, OMEGA_E
+
+# Constants
+C_IRON = 449  # Heat capacity of iron in J/(kg·K)
+INITIAL_TEMPERATURE = 300  # Initial temperature in Kelvin (27°C)
+IRON_DENSITY = 7850  # Density of the object in kg/m^3
+THICKNESS = 0.002  # thicken in m
+
+
+def heat_rate(shape, heat_flux, thickness=THICKNESS):
+    """Heat absorbed by the body per second (W) for a given nose heat flux."""
+    return heat_flux * shape.reference_area * thickness
+
+
+def heat_capacity(shape, material_density=IRON_DENSITY, specific_heat=C_IRON):
+    """Heat capacity of the whole body (J/K)."""
+    return shape.volume * material_density * specific_heat
+
+
+def heat_profile(positions, velocity, time, shape, atmosphere="table", density=None, epoch=EPOCH,
+                 rotating_atmosphere=True, initial_temperature=INITIAL_TEMPERATURE, thickness=THICKNESS,
+                 material_density=IRON_DENSITY, specific_heat=C_IRON):
+    """
+    Aerothermal history of a whole trajectory in one vectorised pass.
+
+    Parameters:
+        positions, velocity, time (ndarray): Trajectory, in memory or memory-mapped.
+        shape (Shape): Body; its Sutton-Graves coefficient gives the nose heat flux.
+        atmosphere (str or object): Density source, see atmosphere.run_atmosphere;
+            a 'table' covers the orbit of the first sample.
+        density (ndarray, optional): Densities already known for every sample,
+            e.g. recorded during propagation. Skips the atmosphere lookup.
+        epoch (datetime): Epoch of the trajectory, for lat/lon of the lookup.
+        rotating_atmosphere (bool): Use the speed relative to the co-rotating air.
+        initial_temperature (float): Wall temperature at the first sample (K).
+        thickness (float): Absorbing wall thickness (m).
+        material_density (float): Density of the body material (kg/m³).
+        specific_heat (float): Heat capacity of the body material (J/(kg·K)).
+
+    Returns:
+        dict: Arrays per sample: altitude (km), density (kg/m³), speed (m/s),
+        heat_flux (W/m²), heat_load (J/m², integrated flux), accumulated_heat
+        (J) and temperature (K).
+    """
+    positions = np.asarray(positions, dtype=float)
+    velocity = np.asarray(velocity, dtype=float)
+    time = np.asarray(time, dtype=float)
+    lat, lon, altitude = eci_to_geodetic(positions, time, epoch)
+    if density is None:
+        source = run_atmosphere(atmosphere, epoch, [(positions[0], velocity[0])], float(time[-1]))
+        density = source.densities(time, np.maximum(altitude, 0.0), lat, lon)
+    air_velocity = corotating_velocity(positions, velocity) if rotating_atmosphere else velocity
+    speed = np.linalg.norm(air_velocity, axis=1)
+    heat_flux = shape.calculate_heat_flux_coefficient(density, speed)
+
+    # trapezoidal integration, exact for the variable steps of adaptive integrators
+    heat_load = np.concatenate(([0.0], np.cumsum((heat_flux[1:] + heat_flux[:-1]) / 2 * np.diff(time))))
+    accumulated_heat = heat_rate(shape, heat_load, thickness)
+    temperature = initial_temperature + accumulated_heat / heat_capacity(shape, material_density, specific_heat)
+    return {
+        "altitude": altitude,
+        "density": density,
+        "speed": speed,
+        "heat_flux": heat_flux,
+        "heat_load": heat_load,
+        "accumulated_heat": accumulated_heat,
+        "temperature": temperature,
+    }
+
+
+class HeatingMonitor(Event):
+    """
+    Couples the wall heating into sym(): integrates the absorbed heat step by
+    step and stops the run when the temperature reaches max_temperature.
+
+    Pass it in sym(..., events=[monitor]); after the run times, temperatures
+    and peak_heat_flux describe the heating history, and the stop time is
+    located inside the step like any other event. sym() binds it to the
+    atmosphere and epoch of the run.
+
+    Parameters:
+        shape (Shape): Body.
+        max_temperature (float, optional): Temperature limit in K; None only monitors.
+        atmosphere (object, optional): Density source with density(). By
+            default the atmosphere of the run, so that the heating sees the
+            density of the drag.
+        rotating_atmosphere (bool): Use the speed relative to the co-rotating air.
+        initial_temperature, thickness, material_density, specific_heat: As in heat_profile().
+    """
+    name = "temperature"
+    direction = -1
+
+    def __init__(self, shape, max_temperature=None, atmosphere=None, rotating_atmosphere=True,
+                 initial_temperature=INITIAL_TEMPERATURE, thickness=THICKNESS, material_density=IRON_DENSITY,
+                 specific_heat=C_IRON, **options):
+        self.shape = shape
+        self.max_temperature = np.inf if max_temperature is None else max_temperature
+        self.source = atmosphere
+        self.atmosphere = atmosphere
+        self.theta0 = float(earth_rotation_angle(0.0, EPOCH))
+        self.rotating_atmosphere = rotating_atmosphere
+        self.initial_temperature = initial_temperature
+        self.thickness = thickness
+        self.capacity = heat_capacity(shape, material_density, specific_heat)
+        options.setdefault("terminal", max_temperature is not None)
+        super().__init__(**options)
+
+    def reset(self):
+        super().reset()
+        self.temperature = self.initial_temperature
+        self.peak_heat_flux = 0.0
+        self.temperatures = []
+        self.step_times = []
+        self._t0 = self._flux0 = None
+        self._last = None
+
+    def bind(self, atmosphere, epoch):
+        self.atmosphere = atmosphere if self.source is None else self.source
+        self.theta0 = float(earth_rotation_angle(0.0, epoch))
+
+    def heat_flux(self, t, pos, vel):
+        lat, lon, altitude = geodetic_point(pos, self.theta0 + OMEGA_E * t)
+        density = self.atmosphere.density(t, max(altitude, 0.0), lat, lon)
+        if self.rotating_atmosphere:
+            vel = corotating_velocity(pos, vel)
+        return float(self.shape.calculate_heat_flux_coefficient(density, np.linalg.norm(vel)))
+
+    def _temperature(self, t, flux):
+        heat = heat_rate(self.shape, (self._flux0 + flux) / 2 * (t - self._t0), self.thickness)
+        return self.temperature + heat / self.capacity
+
+    def __call__(self, t, pos, vel):
+        if self._t0 is None or t == self._t0:
+            return self.max_temperature - self.temperature
+        flux = self.heat_flux(t, pos, vel)
+        self._last = (t, np.array(pos), flux)
+        return self.max_temperature - self._temperature(t, flux)
+
+    def start(self, t, pos, vel):
+        self._t0, self._flux0 = t, self.heat_flux(t, pos, vel)
+        self.step_times.append(t)
+        self.temperatures.append(self.temperature)
+
+    def end_step(self, t, pos, vel):
+        if self._last is not None and self._last[0] == t and np.array_equal(self._last[1], pos):
+            flux = self._last[2]  # g() of the detector already evaluated this state
+        else:
+            flux = self.heat_flux(t, pos, vel)
+        self.temperature = self._temperature(t, flux)
+        self.peak_heat_flux = max(self.peak_heat_flux, flux)
+        self._t0, self._flux0 = t, flux
+        self.step_times.append(t)
+        self.temperatures.append(self.temperature)
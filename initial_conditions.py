@@ -1,24 +1,33 @@
-import pandas as pd
+import os
 import numpy as np
-import astropy.constants as constants
-import astropy as astro
+from datetime import datetime
 
 #TODO: import pod r,v from desmos
 
-atmo_file  = pd.read_csv("atmo_0_to_1000.txt", sep=r"\s+", engine="python")
+ATMO_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "atmo_0_to_1000.txt")
+
+# values of astropy.constants (CODATA 2018 / IAU 2015), kept literal so importing is cheap
+G = 6.6743e-11 # gravitational constant
+M_e = 5.972167867791379e+24  # mass earth [kg]
+r_e = 6378100.0  # radius earth [m]
+J2 = 1.08262668e-3  # Earth oblateness coefficient (WGS84 equatorial radius)
+
+def load_atmo_file():
+    """Tabulated standard atmosphere (height in m, air density in kg/m3), loaded on demand."""
+    import pandas as pd
+    return pd.read_csv(ATMO_FILE, sep=r"\s+")
 
-G = constants.G.value # gravitational constant
-M_e = constants.M_earth.value  # mass earth [kg]
-r_e = constants.R_earth.value  # radius earth [m]
 
 # Ro = lambda h_fun: 0 if h_fun > 1_000_000 else atmo_file["air(kg/m3)"][int(h_fun/1000)] # density based on height [kg/m3]
-Drag = lambda vel_fun, v_fun, ro_fun, A_fun: A_fun  * 0.5* ro_fun * vel_fun * v_fun # drag vector [m/s2]
+Drag = lambda vel_fun, v_fun, ro_fun, A_fun, Cd_fun=1: Cd_fun * A_fun  * 0.5* ro_fun * vel_fun * v_fun # drag force vector [N]
 V = lambda r_fun: np.sqrt(G * M_e / r_fun) # velocity for circular orbit
 V0 = lambda t_fun,l_low,l_high: np.sqrt((r_e+l_high)**2-(r_e+l_low)**2)/t_fun
+Vel = lambda v_fun, inc_fun: np.array([0.0, v_fun * np.cos(np.radians(inc_fun)), v_fun * np.sin(np.radians(inc_fun))]) # velocity at the ascending node [m/s]
 #Tau = lambda :2*np.pi*pow(pow(r,3) / (G * M_e), 0.5) #time circular orbit
 
 # Cd = 1 # drag coefficient
 
+EPOCH = datetime(2024, 1, 1)  # UTC date and time of simulation time 0
 dt = 1  # Time step (s)
 total_time = 200000.0  # Total simulation time (s)
 n_steps = int(total_time / dt)
@@ -28,11 +37,13 @@ class Mothership:
     mass = 200
     A = 0.5 * 0.5
     Cd = 1
+    inc = 0  # inclination (deg)
 
     r = H + r_e
     v = V(r) * 1.00
-    pos = np.array([r, 0])  # Initial position (m)
-    vel = np.array([0.0, v])
+    pos = np.array([r, 0, 0])  # Initial position (m)
+    vel = Vel(v, inc)
+    pos.flags.writeable = vel.flags.writeable = False  # initial state, simulations work on copies
     # print(v)
 
 
@@ -41,11 +52,13 @@ class Pod:
     mass = 5
     A = 0.2 *0.2
     Cd = 1
+    inc = 0  # inclination (deg)
 
     r = H + r_e
     v = V(r) * 1.007
     v = 7.66834622e+03
     r = 300e3 +r_e
-    pos = np.array([r, 0])  # Initial position (m)
-    vel = np.array([0.0, v])
+    pos = np.array([r, 0, 0])  # Initial position (m)
+    vel = Vel(v, inc)
+    pos.flags.writeable = vel.flags.writeable = False
     # print(v)
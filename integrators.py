@@ -0,0 +1,247 @@
+import numpy as np
+
+
+class IntegratorStats:
+    def __init__(self):
+        """Step-count and error bookkeeping collected while an integrator runs."""
+        self.reset()
+
+    def reset(self):
+        self.steps = 0  # accepted steps
+        self.rejected = 0  # rejected adaptive steps
+        self.force_evaluations = 0
+        self.reused_evaluations = 0  # accelerations taken over from the previous step
+        self.max_error = 0.0  # largest normalised local error estimate
+        self.error_sum = 0.0
+        self.min_dt = np.inf
+        self.max_dt = 0.0
+
+    def record(self, h, error=None):
+        self.steps += 1
+        self.min_dt = min(self.min_dt, h)
+        self.max_dt = max(self.max_dt, h)
+        if error is not None:
+            self.max_error = max(self.max_error, error)
+            self.error_sum += error
+
+    @property
+    def mean_error(self):
+        return self.error_sum / self.steps if self.steps else 0.0
+
+    def as_dict(self):
+        return {
+            "steps": self.steps,
+            "rejected": self.rejected,
+            "force_evaluations": self.force_evaluations,
+            "reused_evaluations": self.reused_evaluations,
+            "max_error": self.max_error,
+            "mean_error": self.mean_error,
+            "min_dt": self.min_dt,
+            "max_dt": self.max_dt,
+        }
+
+    def __repr__(self):
+        return "IntegratorStats(" + ", ".join(f"{k}={v}" for k, v in self.as_dict().items()) + ")"
+
+
+class Integrator:
+    """
+    Base class of the orbit integrators.
+
+    An integrator advances (pos, vel) by one accepted step of the equation of
+    motion pos'' = accel(t, pos, vel). ``step`` returns the new time, position,
+    velocity and the step size to try next.
+    """
+    name = None
+    adaptive = False
+
+    def __init__(self):
+        self.stats = IntegratorStats()
+
+    def reset(self):
+        self.stats.reset()
+
+    def _accel(self, accel, t, pos, vel):
+        self.stats.force_evaluations += 1
+        return accel(t, pos, vel)
+
+    def get_state(self):
+        """Stats and the acceleration kept for the next step, for checkpoints."""
+        last = getattr(self, "_last", None)
+        return {"stats": dict(vars(self.stats)), "cached": None if last is None else last[1]}
+
+    def set_state(self, state, pos):
+        """Restore get_state(); pos is the position array the next step() starts from."""
+        vars(self.stats).update(state["stats"])
+        if hasattr(self, "_last"):
+            self._last = None if state["cached"] is None else (pos, state["cached"])
+
+    def step(self, accel, t, pos, vel, dt):
+        raise NotImplementedError
+
+
+class Euler(Integrator):
+    """Semi-implicit Euler, the scheme sym() has always used (1 force evaluation per step)."""
+    name = "euler"
+
+    def step(self, accel, t, pos, vel, dt):
+        acc = self._accel(accel, t, pos, vel)
+        vel = vel + acc * dt
+        pos = pos + vel * dt
+        self.stats.record(dt)
+        return t + dt, pos, vel, dt
+
+
+class RK4(Integrator):
+    """Classical fourth order Runge-Kutta (4 force evaluations per step)."""
+    name = "rk4"
+
+    def step(self, accel, t, pos, vel, dt):
+        h2 = dt / 2
+        a1 = self._accel(accel, t, pos, vel)
+        p2, v2 = pos + h2 * vel, vel + h2 * a1
+        a2 = self._accel(accel, t + h2, p2, v2)
+        p3, v3 = pos + h2 * v2, vel + h2 * a2
+        a3 = self._accel(accel, t + h2, p3, v3)
+        p4, v4 = pos + dt * v3, vel + dt * a3
+        a4 = self._accel(accel, t + dt, p4, v4)
+        pos = pos + dt / 6 * (vel + 2 * v2 + 2 * v3 + v4)
+        vel = vel + dt / 6 * (a1 + 2 * a2 + 2 * a3 + a4)
+        self.stats.record(dt)
+        return t + dt, pos, vel, dt
+
+
+class Leapfrog(Integrator):
+    """
+    Kick-drift-kick leapfrog (velocity Verlet).
+
+    Symplectic for the drag-free problem, so the orbital energy does not drift
+    over long arcs. The acceleration at the end of a step is reused at the start
+    of the next one, which makes it 1 force evaluation per step. Drag is
+    evaluated with the half-step velocity.
+    """
+    name = "leapfrog"
+
+    def __init__(self):
+        super().__init__()
+        self._last = None
+
+    def reset(self):
+        super().reset()
+        self._last = None
+
+    def step(self, accel, t, pos, vel, dt):
+        if self._last is not None and self._last[0] is pos:
+            acc = self._last[1]
+            self.stats.reused_evaluations += 1
+        else:
+            acc = self._accel(accel, t, pos, vel)
+        vel_half = vel + acc * (dt / 2)
+        pos = pos + vel_half * dt
+        acc = self._accel(accel, t + dt, pos, vel_half)
+        vel = vel_half + acc * (dt / 2)
+        self._last = (pos, acc)
+        self.stats.record(dt)
+        return t + dt, pos, vel, dt
+
+
+class DormandPrince(Integrator):
+    """
+    Adaptive Dormand-Prince 5(4) embedded Runge-Kutta.
+
+    The step size follows the local error estimate, so it stays large on quiet
+    arcs and only shrinks where drag and re-entry dynamics need it. Uses the
+    first-same-as-last property, i.e. 6 force evaluations per accepted step.
+
+    Parameters:
+        rtol (float): Relative error tolerance per step.
+        atol (float): Absolute error tolerance per step (m and m/s).
+        dt_min (float): Smallest step size the error control chooses (s). A
+            shorter step is only taken when the caller asks for it, e.g. to
+            end exactly at the end of the run.
+        dt_max (float): Largest step size allowed (s).
+    """
+    name = "dopri54"
+    adaptive = True
+
+    C = np.array([0, 1 / 5, 3 / 10, 4 / 5, 8 / 9, 1, 1])
+    A = [
+        [],
+        [1 / 5],
+        [3 / 40, 9 / 40],
+        [44 / 45, -56 / 15, 32 / 9],
+        [19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729],
+        [9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656],
+        [35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84],
+    ]
+    B = np.array([35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84, 0])
+    E = B - np.array([5179 / 57600, 0, 7571 / 16695, 393 / 640, -92097 / 339200, 187 / 2100, 1 / 40])
+
+    def __init__(self, rtol=1e-9, atol=1e-6, dt_min=1e-3, dt_max=600.0, safety=0.9):
+        super().__init__()
+        self.rtol = rtol
+        self.atol = atol
+        self.dt_min = dt_min
+        self.dt_max = dt_max
+        self.safety = safety
+        self._last = None
+
+    def reset(self):
+        super().reset()
+        self._last = None
+
+    def _derivative(self, accel, t, y):
+        d = len(y) // 2
+        return np.concatenate((y[d:], self._accel(accel, t, y[:d], y[d:])))
+
+    def step(self, accel, t, pos, vel, dt):
+        y = np.concatenate((pos, vel))
+        d = len(pos)
+        if self._last is not None and self._last[0] is pos:
+            k1 = self._last[1]
+            self.stats.reused_evaluations += 1
+        else:
+            k1 = self._derivative(accel, t, y)
+        h = min(dt, self.dt_max)
+        while True:
+            k = [k1]
+            for i in range(1, 7):
+                yi = y + h * sum(a * kj for a, kj in zip(self.A[i], k) if a)
+                k.append(self._derivative(accel, t + self.C[i] * h, yi))
+            y_new = yi  # the 7th stage is evaluated at the 5th order solution
+            err_vec = h * sum(e * kj for e, kj in zip(self.E, k) if e)
+            scale = self.atol + self.rtol * np.maximum(np.abs(y), np.abs(y_new))
+            error = float(np.sqrt(np.mean((err_vec / scale) ** 2)))
+            if error <= 1 or h <= self.dt_min:
+                break
+            self.stats.rejected += 1
+            h = max(h * max(0.2, self.safety * error ** -0.2), self.dt_min)
+
+        factor = 5.0 if error == 0 else min(5.0, max(0.2, self.safety * error ** -0.2))
+        pos, vel = y_new[:d], y_new[d:]
+        self._last = (pos, k[6])
+        self.stats.record(h, error)
+        return t + h, pos, vel, min(max(h * factor, self.dt_min), self.dt_max)
+
+
+INTEGRATORS = {cls.name: cls for cls in (Euler, RK4, Leapfrog, DormandPrince)}
+
+
+def get_integrator(integrator="euler", **options):
+    """
+    Return an integrator instance.
+
+    Parameters:
+        integrator (str or Integrator): Name from INTEGRATORS ('euler', 'rk4',
+            'leapfrog', 'dopri54') or an already configured instance.
+        **options: Keyword arguments for the integrator constructor.
+
+    Returns:
+        Integrator: The integrator to use for the run.
+    """
+    if isinstance(integrator, Integrator):
+        return integrator
+    try:
+        return INTEGRATORS[integrator](**options)
+    except KeyError:
+        raise ValueError(f"Unknown integrator: {integrator}") from None
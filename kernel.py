@@ -0,0 +1,159 @@
+import math
+
+import numpy as np
+
+from initial_conditions import G, J2, M_e
+from atmosphere import TabulatedAtmosphere, _interpolate
+from geodesy import A_WGS84, B_WGS84, E2, EP2, OMEGA_E
+from integrators import Euler
+
+try:
+    from numba import njit
+except ImportError:  # the same kernel then runs as plain Python on floats
+    njit = None
+
+CHUNK = 4096  # steps per kernel call
+
+
+def _geodetic(x, y, z):
+    """Geodetic latitude (deg) and altitude (km), as geodesy.geodetic_point."""
+    p = math.hypot(x, y)
+    beta = math.atan2(z * A_WGS84, p * B_WGS84)
+    lat = math.atan2(z + EP2 * B_WGS84 * math.sin(beta) ** 3, p - E2 * A_WGS84 * math.cos(beta) ** 3)
+    sin_lat = math.sin(lat)
+    return math.degrees(lat), (p * math.cos(lat) + z * sin_lat - A_WGS84 * math.sqrt(1 - E2 * sin_lat * sin_lat)) / 1000
+
+
+def _altitude(x, y, z):
+    """Geodetic altitude in km."""
+    return _geodetic(x, y, z)[1]
+
+
+def _euler_steps(state, t, h, n, cd_area, mass, rotating, j2, table, axes, h_min, h_max, dh, last, theta0, along,
+                 out_pos, out_vel, out_t):
+    """
+    Up to n semi-implicit Euler steps of gravity (+ J2) and tabulated drag.
+
+    state holds x, y, z, vx, vy, vz and is updated in place; the samples are
+    written to out_pos/out_vel/out_t. Stops after the first step in which the
+    geodetic altitude or the orbit-crossing function pos . along changes
+    sign, so the caller can locate the event.
+
+    Returns:
+        tuple: Number of steps taken and whether the last one changed a sign.
+    """
+    x, y, z, vx, vy, vz = state[0], state[1], state[2], state[3], state[4], state[5]
+    mu = G * M_e
+    k_j2 = -1.5 * J2 * G * M_e * A_WGS84 ** 2
+    g_alt = _altitude(x, y, z)
+    g_orbit = x * along[0] + y * along[1] + z * along[2]
+    for k in range(n):
+        r = math.sqrt(x * x + y * y + z * z)
+        lat, alt = _geodetic(x, y, z)
+        lon = math.degrees((math.atan2(y, x) - (theta0 + OMEGA_E * t) + math.pi) % (2 * math.pi) - math.pi)
+        rho = _table_density(table, axes, h_min, h_max, dh, last, t, alt, lat, lon)
+
+        if rotating:
+            ux, uy, uz = vx + OMEGA_E * y, vy - OMEGA_E * x, vz
+        else:
+            ux, uy, uz = vx, vy, vz
+        speed = math.sqrt(ux * ux + uy * uy + uz * uz)
+        gravity = -mu / r ** 3
+        q = cd_area * 0.5 * rho  # same operation order as the Drag lambda, for identical rounding
+        ax = gravity * x + -(q * ux * speed / mass)
+        ay = gravity * y + -(q * uy * speed / mass)
+        az = gravity * z + -(q * uz * speed / mass)
+        if j2:
+            c = k_j2 / r ** 5
+            z2 = 5 * (z / r) ** 2
+            ax += c * x * (1.0 - z2)
+            ay += c * y * (1.0 - z2)
+            az += c * z * (3.0 - z2)
+
+        vx += ax * h
+        vy += ay * h
+        vz += az * h
+        x += vx * h
+        y += vy * h
+        z += vz * h
+        t += h
+        out_pos[k, 0], out_pos[k, 1], out_pos[k, 2] = x, y, z
+        out_vel[k, 0], out_vel[k, 1], out_vel[k, 2] = vx, vy, vz
+        out_t[k] = t
+
+        g_alt_new = _altitude(x, y, z)
+        g_orbit_new = x * along[0] + y * along[1] + z * along[2]
+        crossed = ((g_alt > 0) != (g_alt_new > 0) or (g_alt < 0) != (g_alt_new < 0)
+                   or (g_orbit > 0) != (g_orbit_new > 0) or (g_orbit < 0) != (g_orbit_new < 0))
+        g_alt, g_orbit = g_alt_new, g_orbit_new
+        if crossed:
+            state[0], state[1], state[2], state[3], state[4], state[5] = x, y, z, vx, vy, vz
+            return k + 1, True
+    state[0], state[1], state[2], state[3], state[4], state[5] = x, y, z, vx, vy, vz
+    return n, False
+
+
+_table_density = _interpolate
+if njit is not None:
+    _geodetic = njit(cache=True)(_geodetic)
+    _altitude = njit(cache=True)(_altitude)
+    _table_density = njit(cache=True)(_interpolate)
+    _euler_steps = njit(cache=True)(_euler_steps)
+COMPILED = njit is not None
+
+
+def supports(integrator, atmosphere, events=(), drag=None):
+    """Whether a sym() run can use the kernel: Euler, a TabulatedAtmosphere, constant Cd and only the built-in events."""
+    return type(integrator) is Euler and isinstance(atmosphere, TabulatedAtmosphere) and not events and drag is None
+
+
+def propagate(satellite, atmosphere, t, pos, vel, h, max_steps, trajectory, detector, along,
+              rotating_atmosphere=True, j2=False, cd=1.0, stats=None, theta0=0.0):
+    """
+    The Euler loop of sym() in kernel calls of up to CHUNK steps.
+
+    Compiled with numba when it is installed; otherwise the same kernel runs
+    as Python on floats, which still avoids the small-array NumPy overhead of
+    the generic loop. Samples go to trajectory in bulk. Steps in which the
+    altitude or the orbit-crossing function changes sign are handed to the
+    event detector, which locates and records the event as in the generic loop.
+
+    Returns:
+        tuple: t, pos, vel at the end and the terminal event (or None).
+    """
+    if COMPILED:
+        table, axes = atmosphere.log_density.ravel(), np.array(atmosphere._axes, dtype=float)
+        along, state = np.asarray(along, dtype=float), np.concatenate((pos, vel))
+    else:  # lists of floats, NumPy scalars would make the Python kernel slow
+        table, axes = atmosphere._flat, atmosphere._axes
+        along, state = [float(a) for a in along], [float(a) for a in (*pos, *vel)]
+    t, h = float(t), float(h)
+    out_pos, out_vel, out_t = np.empty((CHUNK, 3)), np.empty((CHUNK, 3)), np.empty(CHUNK)
+    i = 0
+    while i < max_steps:
+        n, crossed = _euler_steps(state, t, h, min(CHUNK, max_steps - i), cd * satellite.A, satellite.mass,
+                                  rotating_atmosphere, j2, table, axes, atmosphere.h_min, atmosphere.h_max,
+                                  atmosphere.dh, atmosphere._last, theta0, along,
+                                  out_pos, out_vel, out_t)
+        if stats is not None:
+            stats.steps += n
+            stats.force_evaluations += n
+            stats.min_dt, stats.max_dt = min(stats.min_dt, h), max(stats.max_dt, h)
+        if crossed:
+            if n > 1:
+                trajectory.extend(out_pos[:n - 1], out_vel[:n - 1], out_t[:n - 1])
+                t, pos, vel = float(out_t[n - 2]), out_pos[n - 2].copy(), out_vel[n - 2].copy()
+            detector.resync(t, pos, vel)
+            t1, p1, v1 = float(out_t[n - 1]), out_pos[n - 1].copy(), out_vel[n - 1].copy()
+            stop = detector.check(t, pos, vel, t1, p1, v1)
+            if stop:
+                t, pos, vel, event = stop
+                trajectory.append(pos, vel, t)
+                return t, pos, vel, event
+            trajectory.append(p1, v1, t1)
+            t, pos, vel = t1, p1, v1
+        else:
+            trajectory.extend(out_pos[:n], out_vel[:n], out_t[:n])
+            t, pos, vel = float(out_t[n - 1]), out_pos[n - 1].copy(), out_vel[n - 1].copy()
+        i += n
+    return t, pos, vel, None
@@ -0,0 +1,220 @@
+from datetime import timedelta
+
+import numpy as np
+
+from initial_conditions import EPOCH, G, M_e, r_e
+from atmosphere import get_atmosphere
+from geodesy import OMEGA_E, eci_to_geodetic
+from scenario import Scenario
+
+MU = G * M_e
+YEAR = 365.25 * 86400
+
+
+def orbital_elements(pos, vel):
+    """
+    Semi-major axis, eccentricity and orientation of the orbit through (pos, vel).
+
+    Returns:
+        tuple: a (m), e, mean anomaly (rad), unit vectors P (to perigee) and Q
+        (90° ahead in the orbit plane), and the inclination (rad). For a
+        circular orbit P points at pos.
+    """
+    pos, vel = np.asarray(pos, dtype=float), np.asarray(vel, dtype=float)
+    r, v2 = np.linalg.norm(pos), vel @ vel
+    h = np.cross(pos, vel)
+    a = 1 / (2 / r - v2 / MU)
+    e_vec = np.cross(vel, h) / MU - pos / r
+    e = np.linalg.norm(e_vec)
+    w = h / np.linalg.norm(h)
+    P = e_vec / e if e > 1e-10 else pos / r
+    Q = np.cross(w, P)
+    E = np.arctan2(pos @ Q / np.sqrt(1 - e ** 2) / a, pos @ P / a + e)
+    return a, e, E - e * np.sin(E), P, Q, np.arccos(np.clip(w[2], -1, 1))
+
+
+def state_vector(a, e, M, P, Q):
+    """Position and velocity (ECI) at mean anomaly M of the orbit (a, e) in the plane P, Q."""
+    E = M
+    for _ in range(30):  # Newton on Kepler's equation
+        E -= (E - e * np.sin(E) - M) / (1 - e * np.cos(E))
+    b = a * np.sqrt(1 - e ** 2)
+    r = a * (1 - e * np.cos(E))
+    E_dot = np.sqrt(MU / a ** 3) * a / r
+    pos = a * (np.cos(E) - e) * P + b * np.sin(E) * Q
+    vel = -a * np.sin(E) * E_dot * P + b * np.cos(E) * E_dot * Q
+    return pos, vel
+
+
+class ShiftedAtmosphere:
+    def __init__(self, atmosphere, offset):
+        """
+        An atmosphere queried offset seconds later, for a run that starts offset seconds after its epoch.
+
+        Parameters:
+            atmosphere: Density source with density() and densities(), and
+                air_temperature() / air_temperatures() for a drag model.
+            offset (float): Seconds added to every query time.
+        """
+        self.atmosphere = atmosphere
+        self.offset = offset
+
+    def density(self, t, altitude_km, lat_deg=None, lon_deg=None):
+        return self.atmosphere.density(t + self.offset, altitude_km, lat_deg, lon_deg)
+
+    def densities(self, t, altitude_km, lat_deg=None, lon_deg=None):
+        return self.atmosphere.densities(np.asarray(t) + self.offset, altitude_km, lat_deg, lon_deg)
+
+    def air_temperature(self, t, altitude_km, lat_deg=None, lon_deg=None):
+        return self.atmosphere.air_temperature(t + self.offset, altitude_km, lat_deg, lon_deg)
+
+    def air_temperatures(self, t, altitude_km, lat_deg=None, lon_deg=None):
+        return self.atmosphere.air_temperatures(np.asarray(t) + self.offset, altitude_km, lat_deg, lon_deg)
+
+
+class OrbitAveragedDecay:
+    def __init__(self, ballistic, atmosphere, inclination=0.0, rotating_atmosphere=True, nodes=64, plane=None,
+                 epoch=EPOCH):
+        """
+        Drag decay rates of a and e averaged over one revolution.
+
+        The Gauss equations for a tangential drag acceleration
+        -B/2 ρ v², B = Cd A / m, are averaged over the eccentric anomaly
+        (dt ∝ (1 - e cos E) dE) with the trapezoid rule, which is spectrally
+        accurate for the periodic integrand. The densities of all nodes come
+        from one densities() call of the atmosphere, at the geodetic
+        latitude, longitude and altitude the node passes during the
+        revolution.
+
+        Parameters:
+            ballistic (float): Cd A / m (m²/kg).
+            atmosphere: Density source with densities(t, altitude_km).
+            inclination (float): Orbit inclination (rad), for the co-rotating air.
+            rotating_atmosphere (bool): Scale drag by the King-Hele wind factor
+                (1 - r ω cos i / v)².
+            nodes (int): Quadrature nodes per revolution.
+            plane (tuple, optional): Unit vectors P (to perigee) and Q of the
+                orbit plane (ECI), see orbital_elements(). Defaults to the
+                plane of the inclination through the x axis.
+            epoch (datetime): Epoch of t, for the longitudes of the nodes.
+        """
+        self.ballistic = ballistic
+        self.atmosphere = atmosphere
+        self.wind = OMEGA_E * np.cos(inclination) if rotating_atmosphere else 0.0
+        if plane is None:
+            plane = (np.array([1.0, 0.0, 0.0]), np.array([0.0, np.cos(inclination), np.sin(inclination)]))
+        self.P, self.Q = (np.asarray(vector, dtype=float) for vector in plane)
+        self.epoch = epoch
+        self.E = np.linspace(0.0, 2 * np.pi, nodes, endpoint=False)
+        self.cos_E = np.cos(self.E)
+        self.sin_E = np.sin(self.E)
+
+    def rates(self, t, a, e):
+        """Orbit-averaged da/dt (m/s) and de/dt (1/s)."""
+        one_minus = 1 - e * self.cos_E
+        r = a * one_minus
+        v = np.sqrt(MU * (2 / r - 1 / a))
+        pos = np.outer(a * (self.cos_E - e), self.P) + np.outer(a * np.sqrt(1 - e ** 2) * self.sin_E, self.Q)
+        times = t + (self.E - e * self.sin_E) / np.sqrt(MU / a ** 3)
+        lat, lon, altitude = eci_to_geodetic(pos, times, self.epoch)
+        rho = self.atmosphere.densities(times, np.maximum(altitude, 0.0), lat, lon)
+        drag = self.ballistic * rho * v * (1 - r * self.wind / v) ** 2
+        cos_nu = (self.cos_E - e) / one_minus
+        da = -np.mean(a ** 2 * drag * v ** 2 / MU * one_minus)
+        de = -np.mean(drag * (e + cos_nu) * one_minus)
+        return da, de
+
+
+def estimate_lifetime(satellite, atmosphere="direct", handover_km=150.0, max_time=25 * YEAR, rotating_atmosphere=True,
+                      step_fraction=0.02, max_step=10 * 86400.0, nodes=64, reentry=True, reentry_time=10 * 86400.0,
+                      **sym_options):
+    """
+    Orbit lifetime from orbit-averaged decay, with a full sym() run for the final re-entry.
+
+    a and e are integrated (midpoint rule) over whole revolutions, with steps
+    of at least one period, at most max_step and at most step_fraction of the remaining
+    apogee height above handover_km. Once the whole orbit is below
+    handover_km (or the perigee below the surface, or one revolution would
+    take away more than half of the apogee height above handover_km) the state is converted back to a position and velocity (the mean anomaly
+    is carried along) and sym() propagates it until impact.
+
+    Parameters:
+        satellite: Object with pos, vel, mass, A and Cd (e.g. Mothership) or a Scenario.
+        atmosphere (str or object): Density source of both phases, see
+            atmosphere.get_atmosphere. 'direct' follows the F10.7/Ap history
+            over the years (see nrlmsis_calculator.set_space_weather). A
+            TabulatedAtmosphere instance only covers its own time span; the
+            name 'table' is refused, as a table cannot span a lifetime.
+        handover_km (float): Apogee altitude at which sym() takes over.
+        max_time (float): Longest time to follow the decay (s).
+        rotating_atmosphere (bool): Drag relative to the co-rotating atmosphere.
+        step_fraction (float): Largest decay of the apogee height per step,
+            as a fraction of its height above handover_km.
+        max_step (float): Longest step (s), so the decay profile is resolved.
+        nodes (int): Quadrature nodes per revolution.
+        reentry (bool): Run sym() after the handover; otherwise stop there.
+        reentry_time (float): Longest sym() run after the handover (s).
+        **sym_options: Passed to sym() for the re-entry (integrator, step, j2, ...).
+
+    Returns:
+        dict: lifetime (s, None if the object does not come down within
+        max_time), handover_time (s), status ('FALL', 'HANDOVER' or 'TIME'),
+        history (time, a, e, perigee_km and apogee_km arrays of the averaged
+        phase) and trajectory (positions, velocity, time of the re-entry with
+        time counted from the start, or None).
+    """
+    if isinstance(atmosphere, str) and atmosphere == "table":
+        raise ValueError("A density table cannot span a lifetime; use 'direct' or pass a TabulatedAtmosphere")
+    epoch = getattr(satellite, "epoch", EPOCH)
+    density_source = get_atmosphere(atmosphere, epoch=epoch)
+    a, e, M, P, Q, inclination = orbital_elements(satellite.pos, satellite.vel)
+    ballistic = getattr(satellite, "Cd", 1.0) * satellite.A / satellite.mass
+    decay = OrbitAveragedDecay(ballistic, density_source, inclination, rotating_atmosphere, nodes, (P, Q), epoch)
+    handover_radius = r_e + handover_km * 1000
+
+    t = 0.0
+    history = [(t, a, e)]
+    status = "TIME"
+    while t < max_time:
+        if a * (1 + e) <= handover_radius or a * (1 - e) <= r_e:
+            status = "HANDOVER"
+            break
+        period = 2 * np.pi * np.sqrt(a ** 3 / MU)
+        da, de = decay.rates(t, a, e)
+        apogee_rate = -(da * (1 + e) + a * de)
+        if apogee_rate * period > 0.5 * (a * (1 + e) - handover_radius):
+            status = "HANDOVER"  # decays too fast within one revolution for the averages
+            break
+        h = step_fraction * (a * (1 + e) - handover_radius) / max(apogee_rate, 1e-300)
+        h = min(max(min(h, max_step), period), max_time - t)
+        da2, de2 = decay.rates(t + h / 2, a + da * h / 2, max(e + de * h / 2, 0.0))
+        n_mean = (np.sqrt(MU / a ** 3) + np.sqrt(MU / (a + da * h) ** 3)) / 2
+        a, e, M, t = a + da2 * h, max(e + de2 * h, 0.0), (M + n_mean * h) % (2 * np.pi), t + h
+        history.append((t, a, e))
+
+    time, a_hist, e_hist = (np.array(column) for column in zip(*history))
+    result = {
+        "lifetime": None,
+        "handover_time": t if status == "HANDOVER" else None,
+        "status": status,
+        "history": {"time": time, "a": a_hist, "e": e_hist,
+                    "perigee_km": (a_hist * (1 - e_hist) - r_e) / 1000,
+                    "apogee_km": (a_hist * (1 + e_hist) - r_e) / 1000},
+        "trajectory": None,
+    }
+    if status != "HANDOVER" or not reentry:
+        return result
+
+    from symulation import sym
+
+    pos, vel = state_vector(a, e, M, P, Q)
+    remaining = min(max_time - t, reentry_time)
+    scenario = Scenario(satellite, epoch + timedelta(seconds=t), remaining, getattr(satellite, "step", 1.0))
+    scenario = scenario.replace(pos=pos, vel=vel)
+    sym_options.setdefault("max_orbits", None)
+    positions, velocity, times = sym(scenario, atmosphere=ShiftedAtmosphere(density_source, t),
+                                     rotating_atmosphere=rotating_atmosphere, **sym_options)
+    result["trajectory"] = (positions, velocity, np.asarray(times) + t)
+    if times[-1] < remaining and np.linalg.norm(positions[-1]) < r_e + 1000:
+        result["status"], result["lifetime"] = "FALL", t + float(times[-1])
+    return result
@@ -1,26 +1,262 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from nrlmsise00 import gtd7_flat
 from datetime import datetime, timedelta
-import matplotlib.pyplot as plt
 import numpy as np
+from initial_conditions import EPOCH
+from space_weather import ConstantSpaceWeather, get_space_weather
 
-def get_atmospheric_data(time_offset, height_km, lat_deg, lon_deg):
+F107A = 150.0  # 3-month average solar flux, when no space-weather data is set
+F107 = 150.0  # Daily solar flux, when no space-weather data is set
+AP = 4  # Geomagnetic activity index, when no space-weather data is set
+SPACE_WEATHER = None  # default space-weather source, see set_space_weather()
+
+# gtd7_flat output columns; number densities come in cm⁻³ and the mass density in g/cm³
+SPECIES = {"He": 0, "O": 1, "N2": 2, "O2": 3, "Ar": 4, "H": 6, "N": 7, "anomalous_O": 8}
+DENSITY = 5
+EXOSPHERIC_TEMPERATURE = 9
+TEMPERATURE = 10
+# conversion of the output columns to SI: number densities to m⁻³, mass density to kg/m³
+_TO_SI = np.array([1e6] * 5 + [1e3] + [1e6] * 3 + [1.0, 1.0])
+
+
+def date_inputs(time_offset, epoch=EPOCH):
+    """
+    Convert a simulation time into the date fields NRLMSISE-00 expects.
+
+    Parameters:
+        time_offset (float): Seconds since the epoch.
+        epoch (datetime): Start of the simulation (UTC).
+
+    Returns:
+        tuple: year, day of year and second of day.
+    """
+    time = epoch + timedelta(seconds=float(time_offset))
+    year = time.year
+    day_of_year = time.timetuple().tm_yday
+    second_of_day = time.hour * 3600 + time.minute * 60 + time.second
+    return year, day_of_year, second_of_day
+
+
+def local_solar_time(second_of_day, lon_deg):
+    """Apparent local solar time (h) from universal time and longitude, as NRLMSISE-00 expects it."""
+    return (second_of_day / 3600.0 + lon_deg / 15.0) % 24.0
+
+
+def set_space_weather(space_weather):
+    """
+    Set the default F10.7/Ap source of all model calls that do not get one.
+
+    Parameters:
+        space_weather: Path of a CelesTrak space-weather CSV file, a
+            space_weather.SpaceWeather-like object, or None to go back to the
+            F107A, F107 and AP constants.
+    """
+    global SPACE_WEATHER
+    SPACE_WEATHER = None if space_weather is None else get_space_weather(space_weather)
+
+
+def space_weather_source(space_weather=None):
+    """The given space-weather source, else the default one."""
+    if space_weather is not None:
+        return get_space_weather(space_weather)
+    if SPACE_WEATHER is not None:
+        return SPACE_WEATHER
+    return ConstantSpaceWeather(F107A, F107, AP)
+
+
+def model_settings(space_weather=None, epoch=EPOCH, start=0.0, end=0.0):
+    """Model inputs besides time and position over [start, end] s after epoch, for the cache keys of tables built from the model."""
+    return {**space_weather_source(space_weather).key(epoch, start, end), "units": "SI", "local_time": "ut"}
+
+
+def date_fields(time_offset, epoch=EPOCH, space_weather=None):
+    """
+    date_inputs() and the space-weather inputs for an array of times, computed once per distinct time.
+
+    Returns:
+        tuple: year, day of year, second of day, f107A, f107 and ap arrays of
+        the shape of time_offset.
+    """
+    time_offset = np.asarray(time_offset, dtype=float)
+    unique, inverse = np.unique(time_offset, return_inverse=True)
+    fields = np.array([date_inputs(t, epoch) for t in unique], dtype=float).reshape(-1, 3)
+    weather = np.column_stack(space_weather_source(space_weather).inputs(epoch, unique))
+    fields = np.hstack((fields, weather.reshape(-1, 3)))[inverse.ravel()]
+    return tuple(column.reshape(time_offset.shape) for column in fields.T)
+
+
+def evaluate(time_offset, height_km, lat_deg, lon_deg, epoch=EPOCH, space_weather=None):
+    """
+    Run NRLMSISE-00 on arrays of points in one vectorised call.
+
+    Parameters:
+        time_offset, height_km, lat_deg, lon_deg (float or array): Seconds since
+            the epoch, altitude (km) and latitude/longitude (deg), broadcast together.
+        epoch (datetime): Date and time (UTC) of time_offset 0.
+        space_weather: F10.7/Ap source, see space_weather_source().
+
+    Returns:
+        ndarray: Model output in SI units, shape broadcast shape + (11,); see
+        SPECIES, DENSITY, EXOSPHERIC_TEMPERATURE and TEMPERATURE for the columns.
+    """
+    arrays = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (time_offset, height_km, lat_deg, lon_deg)))
+    shape = arrays[0].shape
+    time_offset, height_km, lat_deg, lon_deg = (x.ravel() for x in arrays)
+    if len(height_km) == 0:
+        return np.empty(shape + (11,))
+    year, doy, sec, f107a, f107, ap = date_fields(time_offset, epoch, space_weather)
+    result = gtd7_flat(alt=height_km, g_lat=lat_deg, g_long=lon_deg, year=year.astype(int), doy=doy.astype(int),
+                       sec=sec, lst=local_solar_time(sec, lon_deg), f107A=f107a, f107=f107, ap=ap)
+    return (np.asarray(result).reshape(-1, 11) * _TO_SI).reshape(shape + (11,))
+
+
+def _evaluate_chunk(arguments):
+    return evaluate(*arguments)
+
+
+class BatchQuery:
+    def __init__(self, epoch=EPOCH, resolution=(1e-3, 1e-6, 1e-6, 1e-6), workers=None, executor="process",
+                 chunk_size=20000, max_entries=1_000_000, space_weather=None):
+        """
+        NRLMSISE-00 for many points at once, with memoized results.
+
+        Inputs are rounded to resolution and the model is evaluated at the
+        rounded values, so a repeated query (same point up to the resolution)
+        is answered from memory and always gives the same numbers. Only the
+        distinct points not seen before go to the model, in vectorised calls
+        of chunk_size points, spread over a worker pool when workers > 1.
+
+        Parameters:
+            epoch (datetime): Date and time (UTC) of time 0.
+            resolution (tuple): Rounding of time (s), altitude (km), latitude
+                and longitude (deg).
+            workers (int, optional): Pool size; None or 1 evaluates in this process.
+            executor (str): 'process' or 'thread'. The model is a C extension
+                that holds the GIL, so threads only help when it is released.
+            chunk_size (int): Points per model call.
+            max_entries (int): Memoized points kept; the memo is emptied when full.
+            space_weather: F10.7/Ap source, see space_weather_source().
+        """
+        self.epoch = epoch
+        self.space_weather = space_weather_source(space_weather)
+        self.resolution = np.asarray(resolution, dtype=float)
+        self.workers = workers
+        self.executor = executor
+        self.chunk_size = chunk_size
+        self.max_entries = max_entries
+        self._memo = {}
+        self.hits = 0
+        self.misses = 0
+
+    def cache_info(self):
+        """Memo hits and misses (points), as read by the profiler."""
+        return self.hits, self.misses
+
+    def cache_clear(self):
+        self._memo.clear()
+        self.hits = self.misses = 0
+
+    def _compute(self, points):
+        chunks = [points[start:start + self.chunk_size] for start in range(0, len(points), self.chunk_size)]
+        arguments = [(*chunk.T, self.epoch, self.space_weather) for chunk in chunks]
+        if not self.workers or self.workers == 1 or len(chunks) == 1:
+            results = [_evaluate_chunk(argument) for argument in arguments]
+        else:
+            pool = ProcessPoolExecutor if self.executor == "process" else ThreadPoolExecutor
+            with pool(max_workers=self.workers) as executor:
+                results = list(executor.map(_evaluate_chunk, arguments))
+        return np.concatenate(results) if results else np.empty((0, 11))
+
+    def evaluate(self, time_offset, height_km, lat_deg=0.0, lon_deg=0.0):
+        """Model output in SI units of shape broadcast shape + (11,), as evaluate()."""
+        arrays = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (time_offset, height_km, lat_deg, lon_deg)))
+        shape = arrays[0].shape
+        keys = np.rint(np.stack([x.ravel() for x in arrays], axis=1) / self.resolution).astype(np.int64)
+        unique, inverse = np.unique(keys, axis=0, return_inverse=True)
+        memo = self._memo
+        rows = [memo.get(key) for key in map(tuple, unique.tolist())]
+        missing = [k for k, row in enumerate(rows) if row is None]
+        self.misses += len(missing)
+        self.hits += len(unique) - len(missing)
+        if missing:
+            computed = self._compute(unique[missing] * self.resolution)
+            if len(memo) + len(missing) > self.max_entries:
+                memo.clear()
+            for k, row in zip(missing, computed):
+                rows[k] = row
+                memo[tuple(unique[k].tolist())] = row
+        table = np.array(rows).reshape(-1, 11)
+        return table[inverse.ravel()].reshape(shape + (11,))
+
+    def __call__(self, time_offset, height_km, lat_deg=0.0, lon_deg=0.0, species=False):
+        """
+        Temperature, density (and species densities) at arrays of points.
+
+        Parameters:
+            time_offset, height_km, lat_deg, lon_deg (float or array): Seconds
+                since the epoch, altitude (km) and latitude/longitude (deg),
+                broadcast together.
+            species (bool): Also return the number density (m⁻³) of each SPECIES.
+
+        Returns:
+            dict: 'temperature' (K), 'exospheric_temperature' (K), 'density'
+            (kg/m³) and with species=True one array per SPECIES name, all of
+            the broadcast shape.
+        """
+        return _columns(self.evaluate(time_offset, height_km, lat_deg, lon_deg), species)
+
+    def profile(self, heights_km, time_offset=0.0, lat_deg=0.0, lon_deg=0.0, species=False):
+        """Altitude profile at one time and place, as __call__ with arrays of len(heights_km)."""
+        return self(time_offset, np.asarray(heights_km, dtype=float), lat_deg, lon_deg, species)
+
+    def time_grid(self, times, heights_km, lat_deg=0.0, lon_deg=0.0, species=False):
+        """Profiles at several times, as __call__ with arrays of shape (len(times), len(heights_km))."""
+        times, heights_km = np.asarray(times, dtype=float), np.asarray(heights_km, dtype=float)
+        return self(times[:, None], heights_km[None, :], lat_deg, lon_deg, species)
+
+
+def _columns(result, species=False):
+    columns = {"temperature": result[..., TEMPERATURE], "exospheric_temperature": result[..., EXOSPHERIC_TEMPERATURE],
+               "density": result[..., DENSITY]}
+    if species:
+        columns.update((name, result[..., index]) for name, index in SPECIES.items())
+    return columns
+
+
+def get_atmospheric_batch(time_offset, height_km, lat_deg=0.0, lon_deg=0.0, epoch=EPOCH, species=False, **options):
+    """
+    Vectorised get_atmospheric_data(): temperature and density at arrays of points.
+
+    Parameters:
+        time_offset, height_km, lat_deg, lon_deg (float or array): Broadcast together.
+        epoch (datetime): Date and time (UTC) of time_offset 0.
+        species (bool): Also return the species number densities (m⁻³).
+        **options: Passed to BatchQuery (resolution, workers, space_weather, ...).
+
+    Returns:
+        dict: Arrays by name, see BatchQuery.__call__.
+    """
+    return BatchQuery(epoch, **options)(time_offset, height_km, lat_deg, lon_deg, species)
+
+
+def get_atmospheric_data(time_offset, height_km, lat_deg, lon_deg, epoch=EPOCH, space_weather=None):
     """
     Get temperature and air density from the NRLMSISE-00 model.
     
     Parameters:
-        t (datetime): Date and time (UTC).
+        time_offset (float): Seconds since the epoch.
         height_km (float): Altitude in kilometers.
         lat_deg (float): Latitude in degrees.
         lon_deg (float): Longitude in degrees.
+        epoch (datetime): Date and time (UTC) of time_offset 0. Defaults to the
+            fixed initial_conditions.EPOCH so results do not depend on when they run.
+        space_weather: F10.7/Ap source, see space_weather_source().
 
     Returns:
         tuple: Temperature (K) and air density (kg/m³).
     """
-    time = datetime.utcnow() + timedelta(seconds=time_offset)
-    # Convert time to required inputs
-    year = time.year-1 #last year 
-    day_of_year = time.timetuple().tm_yday
-    second_of_day = time.hour * 3600 + time.minute * 60 + time.second
+    year, day_of_year, second_of_day = date_inputs(time_offset, epoch)
+    f107a, f107, ap = space_weather_source(space_weather).at(epoch, time_offset)
 
     # Define inputs for the flattened gtd7 model
     inputs = {
@@ -30,24 +266,26 @@ def get_atmospheric_data(time_offset, height_km, lat_deg, lon_deg):
         "year": year,
         "doy": day_of_year,  # Day of the year
         "sec": second_of_day,  # Seconds in the day
-        "lst": lon_deg / 15.0,  # Local solar time (approx.)
-        "f107A": 150.0,         # 3-month average solar flux
-        "f107": 150.0,          # Daily solar flux
-        "ap": 4                 # Geomagnetic activity index
+        "lst": local_solar_time(second_of_day, lon_deg),  # Local solar time (h)
+        "f107A": f107a,         # 81-day average solar flux
+        "f107": f107,          # Daily solar flux of the previous day
+        "ap": ap                 # Geomagnetic activity index
     }
 
     # Run the model using the gtd7_flat interface
     result = gtd7_flat(**inputs)
 
     # Extract outputs (adjust indices based on documentation)
-    density = result[5]  # Total mass density (kg/m³) (index 5)
-    temperature = result[10]  # Exospheric temperature (K) (index 10)
+    density = result[DENSITY] * 1e3  # Total mass density, g/cm³ -> kg/m³
+    temperature = result[TEMPERATURE]  # Temperature at the altitude (K)
 
     return temperature, density
 
 
 
 if __name__ == "__main__":
+    import matplotlib.pyplot as plt
+
     # Define the range of heights (in km) for which we want to get atmospheric data
     heights_km = np.linspace(0, 500, 101)  # Heights from 0 to 100 km
 
@@ -55,21 +293,13 @@ if __name__ == "__main__":
     lat_deg = 0  # Example latitude (equator)
     lon_deg = 0  # Example longitude (prime meridian)
 
-    # Initialize lists to store temperature and density data
-    temperatures = []
-    densities = []
-    baro = []
     rho_0=get_atmospheric_data(3600, 1, lat_deg, lon_deg)[1]
     bar= lambda h, T: rho_0*np.exp(-(9.80665*(h-1000))/(287.058*T))
-    # Retrieve atmospheric data for each height
-    for height_km in heights_km:
-        temp, density = get_atmospheric_data(3600, height_km, lat_deg, lon_deg)
-        temperatures.append(temp)
-        densities.append(density)
-        baro.append(bar(height_km*1000,temp))
-    # Convert lists to numpy arrays for plotting
-    temperatures = np.array(temperatures)
-    densities = np.array(densities)
+    # Retrieve atmospheric data for all heights in one call
+    profile = BatchQuery().profile(heights_km, 3600, lat_deg, lon_deg)
+    temperatures = profile["temperature"]
+    densities = profile["density"]
+    baro = bar(heights_km*1000, temperatures)
     # Plot temperature vs. height
     plt.figure(figsize=(10, 5))
     plt.subplot(1, 2, 1)
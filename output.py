@@ -1,25 +1,53 @@
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
 from initial_conditions import *
+from plotting import POINTS
 
 
-def delta_distance (pos1,pos2):
-    file = open('delta_pos.txt', 'w') #save position delta to file
-    points = min(len(pos1),len(pos2))
-    for i in range(points):
-        delta_pos=abs(np.array(pos1[i,0]-pos2[i,0]))
-        file.write(f"{str(delta_pos)}\n")
-    file.close()
-
-
-def make_graf(positions):
-    fig,ax = plt.subplots()
-    circle = patches.Circle((0,0),r_e/1000,fill=True,color='blue')
-    ax.add_patch(circle)
-    ax.plot(positions[:,0]/1000, positions[:,1]/1000,c='red', label='Orbit')
-    plt.xlabel('X position (km)')
-    plt.ylabel('Y position (km)')
-    plt.title('Orbit Simulation')
-    plt.axis('equal')
-    plt.legend()
-    plt.show()
+def separation(pos1, pos2, chunk_size=1_000_000):
+    """
+    Distance between two trajectories sample by sample (full position vector).
+
+    Works chunk by chunk, so memory-mapped trajectories are never loaded whole.
+
+    Parameters:
+        pos1, pos2 (ndarray): Positions (n, 3) of both trajectories on the same time grid.
+        chunk_size (int): Number of samples processed at once.
+
+    Returns:
+        ndarray: Separation in m for the samples both trajectories have.
+    """
+    points = min(len(pos1), len(pos2))
+    distance = np.empty(points)
+    for start in range(0, points, chunk_size):
+        stop = min(start + chunk_size, points)
+        distance[start:stop] = np.linalg.norm(np.asarray(pos1[start:stop]) - np.asarray(pos2[start:stop]), axis=1)
+    return distance
+
+
+def delta_distance(first, second, path):
+    """
+    Save the separation of two trajectories (second relative to first) to a text file.
+
+    Both are resampled onto a common time base first, see relative.trajectory_separation,
+    so their time grids do not have to match.
+    """
+    from relative import trajectory_separation
+
+    result = trajectory_separation(first, second)
+    np.savetxt(path, np.column_stack([result["time"], result["position"], result["range"]]),
+               header="time_s radial_m in_track_m cross_track_m range_m")
+
+
+def make_graf(positions, show=True, points=POINTS, method="minmax"):
+    """
+    Orbit plot in the x-y plane.
+
+    Only a shape-preserving subset of points samples is drawn, see
+    plotting.plot_orbits; method='none' draws every sample.
+    """
+    import matplotlib.pyplot as plt
+    from plotting import plot_orbits
+
+    ax = plot_orbits([positions], plt.figure().add_subplot(), ["Orbit"], points, method)
+    if show:
+        plt.show()
+    return ax.figure
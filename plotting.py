@@ -0,0 +1,319 @@
+import glob
+import os
+
+import numpy as np
+
+from geodesy import B_WGS84, E2, eci_to_geodetic
+from initial_conditions import r_e
+
+try:
+    from numba import njit
+except ImportError:  # the selection loop then runs as plain Python
+    njit = None
+
+POINTS = 4000  # samples drawn per curve
+BATCH_POINTS = 1000  # per curve when many share a figure
+CHUNK_SIZE = 1 << 18  # samples read from a trajectory file at once
+LEGEND_LIMIT = 10  # more curves than this are drawn without a legend
+METHODS = ("minmax", "lttb", "none")
+
+
+def minmax_indices(values, points=POINTS, transform=None, chunk_size=CHUNK_SIZE):
+    """
+    Indices of a shape-preserving subset of about points samples.
+
+    The series is cut into points / 2 buckets of consecutive samples and
+    the smallest and largest value of every bucket (of every column for 2-D
+    values) is kept, together with the first and last sample. Peaks, such
+    as perigee passes, therefore survive at any zoom-out. The values are
+    read chunk_size samples at a time, so memory-mapped trajectories are
+    never loaded whole.
+
+    Parameters:
+        values (ndarray): Series of shape (n,) or (n, k), may be a memmap.
+        points (int): Approximate number of samples to keep per column.
+        transform (callable, optional): Applied to every chunk before it is
+            compared, e.g. positions -> altitude.
+        chunk_size (int): Samples read at once.
+
+    Returns:
+        ndarray: Sorted sample indices.
+    """
+    n = len(values)
+    if n <= points:
+        return np.arange(n)
+    size = -(-n // max(points // 2, 1))
+    step = size * max(chunk_size // size, 1)
+    indices = [np.array([0, n - 1])]
+    for start in range(0, n, step):
+        block = np.asarray(values[start:start + step])
+        block = np.asarray(transform(block) if transform else block, dtype=float)
+        block = block.reshape(len(block), -1)
+        full = len(block) // size * size
+        if full:
+            buckets = block[:full].reshape(full // size, size, -1)
+            offsets = start + np.arange(full // size)[:, None] * size
+            indices += [(offsets + np.argmin(buckets, axis=1)).ravel(), (offsets + np.argmax(buckets, axis=1)).ravel()]
+        if full < len(block):
+            indices += [start + full + np.argmin(block[full:], axis=0), start + full + np.argmax(block[full:], axis=0)]
+    return np.unique(np.concatenate(indices))
+
+
+def _lttb(x, y, edges, count, ax, ay, out):
+    """
+    Sequential core of lttb_indices() over one window of buckets.
+
+    Bucket k spans edges[k]:edges[k + 1] of x and y; the bucket after the
+    last one is edges[count]:edges[count + 1], or the last sample when edges
+    ends there. (ax, ay) is the sample kept from the bucket before the
+    window. Fills out[:count] with window indices and returns the last kept sample.
+    """
+    for k in range(count):
+        lo, hi = edges[k], edges[k + 1]
+        if k + 2 < len(edges):
+            cx, cy = x[hi:edges[k + 2]].mean(), y[hi:edges[k + 2]].mean()
+        else:
+            cx, cy = x[-1], y[-1]
+        best, largest = lo, -1.0
+        for j in range(lo, hi):
+            area = abs((ax - cx) * (y[j] - ay) - (ax - x[j]) * (cy - ay))
+            if area > largest:
+                best, largest = j, area
+        out[k] = best
+        ax, ay = x[best], y[best]
+    return ax, ay
+
+
+if njit is not None:
+    _lttb = njit(cache=True)(_lttb)
+
+
+def lttb_indices(x, y, points=POINTS, transform=None, chunk_size=CHUNK_SIZE):
+    """
+    Indices of the Largest-Triangle-Three-Buckets subset of a curve.
+
+    Keeps the first and last sample and, from each of points - 2 buckets,
+    the sample forming the largest triangle with the sample kept from the
+    previous bucket and the mean of the next bucket. Where the curve bends
+    the triangles are large, so curvature is kept and straight stretches
+    are thinned out. x does not have to be monotonic, so (x, y) may also be
+    an orbit in a plane. The buckets are processed in windows of about
+    chunk_size samples (at least two buckets), so memory-mapped trajectories
+    are never loaded whole. The selection loop is compiled with numba when
+    it is installed.
+
+    Parameters:
+        x, y (ndarray): Coordinates of shape (n,), may be memmaps.
+        points (int): Number of samples to keep.
+        transform (callable, optional): Applied to every window of y, e.g.
+            positions -> altitude; y may then have any shape (n, ...).
+        chunk_size (int): Samples read and transformed at once.
+
+    Returns:
+        ndarray: Sorted sample indices.
+    """
+    n = len(x)
+    if n <= points or points < 3:
+        return np.arange(n)
+    buckets = points - 2
+    edges = (np.arange(buckets + 1) * ((n - 2) / buckets)).astype(np.int64) + 1
+    edges[-1] = n - 1
+    indices = np.empty(points, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    ax, ay = float(x[0]), float(np.asarray(transform(y[:1]) if transform else y[:1], dtype=float)[0])
+    first = 0
+    while first < buckets:
+        last = max(int(np.searchsorted(edges, edges[first] + chunk_size, side="right")) - 1, first + 1)
+        last = min(last, buckets)
+        lo = edges[first]
+        # the window also holds the bucket after it (or the last sample) for the triangle's third corner
+        stop = n if last == buckets else edges[last + 1]
+        window = edges[first:min(last + 1, buckets) + 1] - lo
+        block = y[lo:stop]
+        wx = np.asarray(x[lo:stop], dtype=float)
+        wy = np.asarray(transform(np.asarray(block)) if transform else block, dtype=float)
+        ax, ay = _lttb(wx, wy, window, last - first, ax, ay, indices[1 + first:1 + last])
+        indices[1 + first:1 + last] += lo
+        first = last
+    return indices
+
+
+def _radial_altitude_km(positions):
+    """
+    Height above the WGS84 ellipsoid along the radius, in km.
+
+    Within metres of the geodetic altitude in low orbit and much cheaper, so
+    it is used to choose samples; the drawn altitudes are exact.
+    """
+    x, y, z = np.asarray(positions, dtype=float).T
+    equatorial = x * x + y * y
+    r2 = equatorial + z * z
+    return (np.sqrt(r2) - B_WGS84 / np.sqrt(1 - E2 * equatorial / r2)) / 1000
+
+
+def decimated_orbit(positions, points=POINTS, method="minmax"):
+    """Positions (m) of the samples kept for an orbit plot in the x-y plane."""
+    if method == "minmax":
+        index = minmax_indices(positions, points, transform=lambda block: block[:, :2])
+    elif method == "lttb":
+        index = lttb_indices(positions[:, 0], positions[:, 1], points)
+    elif method == "none":
+        return np.asarray(positions)
+    else:
+        raise ValueError(f"Unknown decimation method: {method}")
+    return np.asarray(positions[index])
+
+
+def decimated_altitude(time, positions, points=POINTS, method="minmax"):
+    """Time (s) and altitude (km) of the samples kept for an altitude plot."""
+    if method == "minmax":
+        index = minmax_indices(positions, points, transform=_radial_altitude_km)
+    elif method == "lttb":
+        index = lttb_indices(time, positions, points, transform=_radial_altitude_km)
+    elif method == "none":
+        return np.asarray(time), eci_to_geodetic(positions)[2]
+    else:
+        raise ValueError(f"Unknown decimation method: {method}")
+    return np.asarray(time[index]), eci_to_geodetic(positions[index])[2]
+
+
+def _open(trajectory):
+    """A path is opened (memory-mapped) only when it is drawn."""
+    if isinstance(trajectory, str):
+        from trajfile import open_trajectory
+        return open_trajectory(trajectory)
+    return trajectory
+
+
+def _label(trajectory, label):
+    if label is not None:
+        return label
+    if isinstance(trajectory, str):
+        return os.path.splitext(os.path.basename(trajectory))[0]
+    return getattr(trajectory, "metadata", {}).get("name")
+
+
+def _draw(ax, curves, labels, **style):
+    """Draw curves on ax: single lines with a legend, or one LineCollection for many."""
+    from matplotlib.collections import LineCollection
+
+    if len(curves) <= LEGEND_LIMIT:
+        for curve, label in zip(curves, labels):
+            ax.plot(curve[:, 0], curve[:, 1], label=label, **style)
+        if any(labels):
+            ax.legend()
+    else:
+        ax.add_collection(LineCollection(curves, linewidths=0.5, alpha=0.5, colors=[f"C{k % 10}" for k in range(len(curves))]))
+        ax.autoscale_view()
+
+
+def plot_orbits(trajectories, ax=None, labels=None, points=POINTS, method="minmax", earth=True):
+    """
+    Draw the orbits (x-y plane) of many trajectories on one axes.
+
+    Parameters:
+        trajectories (list): trajfile.Trajectory objects, trajectory file
+            paths (opened one at a time) or (n, 3) position arrays.
+        ax (matplotlib.axes.Axes, optional): Axes to draw on, default a new figure.
+        labels (list, optional): Curve labels, default the file or satellite names.
+        points (int): Samples drawn per orbit, see minmax_indices().
+        method (str): 'minmax', 'lttb' or 'none' (every sample).
+        earth (bool): Draw the Earth.
+
+    Returns:
+        matplotlib.axes.Axes
+    """
+    if ax is None:
+        ax = new_figure().add_subplot()
+    labels = labels or [None] * len(trajectories)
+    curves, names = [], []
+    for trajectory, label in zip(trajectories, labels):
+        opened = _open(trajectory)
+        positions = getattr(opened, "positions", opened)
+        curves.append(decimated_orbit(positions, points, method)[:, :2] / 1000)
+        names.append(_label(trajectory, label))
+    if earth:
+        from matplotlib.patches import Circle
+        ax.add_patch(Circle((0, 0), r_e / 1000, fill=True, color="blue"))
+    _draw(ax, curves, names, **({"c": "red"} if len(curves) == 1 else {}))
+    ax.set_xlabel("X position (km)")
+    ax.set_ylabel("Y position (km)")
+    ax.set_title("Orbit Simulation")
+    ax.axis("equal")
+    return ax
+
+
+def plot_altitudes(trajectories, ax=None, labels=None, points=POINTS, method="minmax"):
+    """
+    Draw altitude against time of many trajectories on one axes.
+
+    Parameters are those of plot_orbits(), except that position arrays are
+    not accepted: the curves need the time of the samples.
+
+    Returns:
+        matplotlib.axes.Axes
+    """
+    if ax is None:
+        ax = new_figure().add_subplot()
+    labels = labels or [None] * len(trajectories)
+    curves, names = [], []
+    for trajectory, label in zip(trajectories, labels):
+        opened = _open(trajectory)
+        curves.append(np.column_stack(decimated_altitude(opened.time, opened.positions, points, method)))
+        names.append(_label(trajectory, label))
+    _draw(ax, curves, names)
+    ax.set_xlabel("Time (s)")
+    ax.set_ylabel("Altitud (km)")
+    return ax
+
+
+def new_figure(headless=False, **options):
+    """
+    A new figure; with headless a plain Agg figure outside pyplot.
+
+    Headless figures need no display, are never shown and are freed with
+    the last reference, so batch runs neither block nor leak figures.
+    """
+    if headless:
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        figure = Figure(**options)
+        FigureCanvasAgg(figure)
+        return figure
+    import matplotlib.pyplot as plt
+    return plt.figure(**options)
+
+
+def trajectory_files(directory, pattern="*.traj"):
+    """Trajectory files in a directory, sorted by name."""
+    return sorted(glob.glob(os.path.join(directory, pattern)))
+
+
+def render_trajectories(trajectories, save, points=BATCH_POINTS, method="minmax", dpi=100):
+    """
+    Batch mode: write orbits.png and altitude.png of many trajectories without a display.
+
+    All trajectories share one figure of each kind; files are opened one at
+    a time and only the decimated samples are kept, so a sweep of hundreds
+    of stored runs renders in seconds.
+
+    Parameters:
+        trajectories (list): Trajectory file paths or trajfile.Trajectory objects.
+        save (str): Output directory.
+        points (int): Samples drawn per curve.
+        method (str): 'minmax', 'lttb' or 'none'.
+        dpi (int): Resolution of the PNG files.
+
+    Returns:
+        list: Paths of the written files.
+    """
+    os.makedirs(save, exist_ok=True)
+    written = []
+    for name, draw in (("orbits", plot_orbits), ("altitude", plot_altitudes)):
+        figure = new_figure(headless=True)
+        draw(trajectories, figure.add_subplot(), points=points, method=method)
+        path = os.path.join(save, f"{name}.png")
+        figure.savefig(path, dpi=dpi)
+        written.append(path)
+    return written
@@ -0,0 +1,145 @@
+import json
+import time
+
+
+class Profiler:
+    def __init__(self, trace_path=None, trace_limit=1_000_000, verbose=True):
+        """
+        Per-stage timing of a propagation run.
+
+        sym(..., profile=profiler) wraps its stages (gravity, atmosphere, drag,
+        integration, storage, events, ...) with timed versions only when a
+        profiler is given, so a run without one executes the plain code.
+        Stages nest: a stage's total time includes the stages it calls, its
+        self time does not.
+
+        Parameters:
+            trace_path (str, optional): Write a Chrome trace-event JSON file here at
+                the end of the run (open it in chrome://tracing or ui.perfetto.dev).
+            trace_limit (int): Most trace events kept; later ones are only counted.
+            verbose (bool): Print the summary at the end of the run.
+        """
+        self.trace_path = trace_path
+        self.trace_limit = trace_limit
+        self.verbose = verbose
+        self.stages = {}  # name -> [calls, total time, time in nested stages]
+        self.counters = {}
+        self.info = {}
+        self._stack = []
+        self._trace = [] if trace_path else None
+        self.dropped_events = 0
+        self._origin = time.perf_counter()
+
+    def wrap(self, name, function):
+        """Return function timed as stage name."""
+        stage = self.stages.setdefault(name, [0, 0.0, 0.0])
+        clock = time.perf_counter
+        stack = self._stack
+        trace = self._trace
+
+        def timed(*args, **kwargs):
+            stack.append(0.0)
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = clock() - start
+                stage[0] += 1
+                stage[1] += elapsed
+                stage[2] += stack.pop()
+                if stack:
+                    stack[-1] += elapsed
+                if trace is not None:
+                    if len(trace) < self.trace_limit:
+                        trace.append((name, start, elapsed))
+                    else:
+                        self.dropped_events += 1
+        return timed
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def finish(self, integrator=None, atmosphere=None, wall_time=None):
+        """Collect the end-of-run numbers, then print the summary and write the trace as configured."""
+        if wall_time is not None:
+            self.info["wall_time"] = wall_time
+        if integrator is not None:
+            self.info["integrator"] = integrator.stats.as_dict()
+        if atmosphere is not None:
+            cache = {"type": type(atmosphere).__name__}
+            if hasattr(atmosphere, "loaded_from_cache"):
+                cache["loaded_from_cache"] = atmosphere.loaded_from_cache
+            if hasattr(atmosphere, "cache_info"):
+                hits, misses = atmosphere.cache_info()
+                cache.update(hits=hits, misses=misses, hit_rate=hits / (hits + misses) if hits + misses else 0.0)
+            self.info["atmosphere"] = cache
+        if self.verbose:
+            print(self.format_summary())
+        if self.trace_path:
+            self.write_trace(self.trace_path)
+
+    def summary(self):
+        """
+        Returns:
+            dict: 'stages' (calls, total_s, self_s, us_per_call per stage),
+            'counters' and the end-of-run 'info' (integrator stats, atmosphere cache).
+        """
+        stages = {
+            name: {"calls": calls, "total_s": total, "self_s": total - nested,
+                   "us_per_call": total / calls * 1e6 if calls else 0.0}
+            for name, (calls, total, nested) in self.stages.items()
+        }
+        return {"stages": stages, "counters": dict(self.counters), **self.info}
+
+    def format_summary(self):
+        summary = self.summary()
+        wall = summary.get("wall_time")
+        lines = [f"{'stage':14s} {'calls':>10s} {'total s':>10s} {'self s':>10s} {'us/call':>10s} {'self %':>7s}"]
+        for name, stage in sorted(summary["stages"].items(), key=lambda item: -item[1]["self_s"]):
+            if not stage["calls"]:
+                continue
+            share = f"{stage['self_s'] / wall:7.1%}" if wall else ""
+            lines.append(f"{name:14s} {stage['calls']:10d} {stage['total_s']:10.4f} {stage['self_s']:10.4f} "
+                         f"{stage['us_per_call']:10.2f} {share}")
+        if wall:
+            lines.append(f"wall time {wall:.4f} s")
+        stats = summary.get("integrator")
+        if stats:
+            lines.append(f"force evaluations {stats['force_evaluations']} (reused {stats['reused_evaluations']}), "
+                         f"steps {stats['steps']}, rejected {stats['rejected']}")
+        atmosphere = summary.get("atmosphere")
+        if atmosphere:
+            lines.append("atmosphere " + ", ".join(f"{key}={value}" for key, value in atmosphere.items()))
+        for name, value in summary["counters"].items():
+            lines.append(f"{name} {value}")
+        return "\n".join(lines)
+
+    def write_trace(self, path):
+        """Write the recorded stage calls as Chrome trace-event JSON ("X" complete events, µs)."""
+        events = [{"name": name, "ph": "X", "ts": (start - self._origin) * 1e6, "dur": elapsed * 1e6,
+                   "pid": 0, "tid": 0} for name, start, elapsed in self._trace or ()]
+        with open(path, "w") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms",
+                       "otherData": {"dropped_events": self.dropped_events}}, file)
+
+
+class ProfiledAtmosphere:
+    def __init__(self, atmosphere, profiler):
+        """Atmosphere whose density lookups are timed as the 'atmosphere' stage."""
+        self.atmosphere = atmosphere
+        self.density = profiler.wrap("atmosphere", atmosphere.density)
+        self.densities = profiler.wrap("atmosphere", atmosphere.densities)
+
+    def __getattr__(self, name):
+        return getattr(self.atmosphere, name)
+
+
+def get_profiler(profile):
+    """None/False -> None, True -> Profiler(), a str -> Profiler writing a trace there, a Profiler as is."""
+    if not profile:
+        return None
+    if profile is True:
+        return Profiler()
+    if isinstance(profile, str):
+        return Profiler(trace_path=profile)
+    return profile
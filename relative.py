@@ -0,0 +1,247 @@
+import math
+
+import numpy as np
+
+from initial_conditions import EPOCH, G, M_e, dt, total_time
+from atmosphere import run_atmosphere
+from events import hermite
+from geodesy import OMEGA_E, corotating_velocity, earth_rotation_angle, geodetic_point
+from integrators import get_integrator
+from symulation import atmospheric_drag, gravitational_acceleration, j2_acceleration
+from trajectory import TrajectoryBuffer
+
+MU = G * M_e
+
+
+def ric_basis(pos, vel):
+    """
+    Radial / in-track / cross-track unit vectors of the orbit through (pos, vel).
+
+    Returns:
+        ndarray: (..., 3, 3) with the R, I and C vectors as rows, so
+        basis @ vector gives the RIC components of an ECI vector.
+    """
+    pos, vel = np.asarray(pos, dtype=float), np.asarray(vel, dtype=float)
+    radial = pos / np.linalg.norm(pos, axis=-1, keepdims=True)
+    normal = np.cross(pos, vel)
+    cross = normal / np.linalg.norm(normal, axis=-1, keepdims=True)
+    return np.stack([radial, np.cross(cross, radial), cross], axis=-2)
+
+
+def to_ric(chief_pos, chief_vel, rel_pos, rel_vel=None):
+    """
+    Express a relative state (deputy - chief, ECI) in the chief's RIC frame.
+
+    Parameters:
+        chief_pos, chief_vel (array): Chief state, (3,) or (n, 3).
+        rel_pos, rel_vel (array): Deputy minus chief, same shape.
+
+    Returns:
+        ndarray or tuple: RIC position; with rel_vel also the velocity seen
+        in the rotating RIC frame.
+    """
+    basis = ric_basis(chief_pos, chief_vel)
+    position = np.einsum("...ij,...j->...i", basis, rel_pos)
+    if rel_vel is None:
+        return position
+    chief_pos, chief_vel = np.asarray(chief_pos, dtype=float), np.asarray(chief_vel, dtype=float)
+    rate = np.linalg.norm(np.cross(chief_pos, chief_vel), axis=-1) / np.einsum("...i,...i", chief_pos, chief_pos)
+    velocity = np.einsum("...ij,...j->...i", basis, rel_vel)
+    # minus omega x r with omega = rate along C
+    velocity[..., 0] += rate * position[..., 1]
+    velocity[..., 1] -= rate * position[..., 0]
+    return position, velocity
+
+
+def clohessy_wiltshire(mean_motion, position, velocity, time):
+    """
+    Closed-form relative motion about a circular orbit (Clohessy-Wiltshire).
+
+    Parameters:
+        mean_motion (float): Mean motion of the chief's orbit (rad/s).
+        position, velocity (array): Initial RIC state (3,) in m and m/s.
+        time (array): Times since the initial state (s).
+
+    Returns:
+        tuple: RIC positions and velocities (len(time), 3).
+    """
+    n = mean_motion
+    (x0, y0, z0), (u0, v0, w0) = np.asarray(position, dtype=float), np.asarray(velocity, dtype=float)
+    nt = n * np.asarray(time, dtype=float)
+    c, s = np.cos(nt), np.sin(nt)
+    positions = np.column_stack([
+        (4 - 3 * c) * x0 + s / n * u0 + 2 / n * (1 - c) * v0,
+        6 * (s - nt) * x0 + y0 - 2 / n * (1 - c) * u0 + (4 * s - 3 * nt) / n * v0,
+        c * z0 + s / n * w0,
+    ])
+    velocities = np.column_stack([
+        3 * n * s * x0 + c * u0 + 2 * s * v0,
+        6 * n * (c - 1) * x0 - 2 * s * u0 + (4 * c - 3) * v0,
+        -n * s * z0 + c * w0,
+    ])
+    return positions, velocities
+
+
+def gravity_difference(chief_pos, rel_pos):
+    """
+    Two-body acceleration of the deputy minus that of the chief.
+
+    Written in terms of rel_pos so the difference keeps its relative
+    precision instead of cancelling two accelerations of ~9 m/s².
+    """
+    r2 = chief_pos @ chief_pos
+    q = rel_pos @ (2 * chief_pos + rel_pos) / r2  # |deputy|²/|chief|² - 1
+    deputy = chief_pos + rel_pos
+    f = math.expm1(1.5 * math.log1p(q))  # |deputy|³/|chief|³ - 1
+    return -MU / np.linalg.norm(deputy) ** 3 * (rel_pos - f * chief_pos)
+
+
+def _differential(chief, deputy, epoch, duration, step, integrator, atmosphere, rotating_atmosphere, j2, record_every):
+    """Propagate the chief and the deputy's offset from it; returns the chief and relative arrays and the stop reason."""
+    integrator = get_integrator(integrator)
+    integrator.reset()
+    atmosphere = run_atmosphere(atmosphere, epoch, [(chief.pos, chief.vel), (deputy.pos, deputy.vel)], duration)
+    theta0 = float(earth_rotation_angle(0.0, epoch))
+    bodies = [(chief.mass, chief.A, getattr(chief, "Cd", 1)), (deputy.mass, deputy.A, getattr(deputy, "Cd", 1))]
+
+    def perturbations(t, pos, vel, body):
+        """Drag (and J2) acceleration of one body."""
+        lat, lon, altitude_km = geodetic_point(pos, theta0 + OMEGA_E * t)
+        mass, area, cd = body
+        air = corotating_velocity(pos, vel) if rotating_atmosphere else vel
+        acc = atmospheric_drag(t, altitude_km, air, mass, area, atmosphere, lat, lon, cd)
+        if j2:
+            acc = acc + j2_acceleration(np.linalg.norm(pos), pos)
+        return acc
+
+    def acceleration(t, pos, vel):
+        r_c, dr, v_c, dv = pos[:3], pos[3:], vel[:3], vel[3:]
+        chief_perturbation = perturbations(t, r_c, v_c, bodies[0])
+        a_c = gravitational_acceleration(np.linalg.norm(r_c), r_c) + chief_perturbation
+        da = gravity_difference(r_c, dr) + perturbations(t, r_c + dr, v_c + dv, bodies[1]) - chief_perturbation
+        return np.concatenate((a_c, da))
+
+    pos = np.concatenate((np.asarray(chief.pos, dtype=float), np.asarray(deputy.pos, dtype=float) - chief.pos))
+    vel = np.concatenate((np.asarray(chief.vel, dtype=float), np.asarray(deputy.vel, dtype=float) - chief.vel))
+    max_steps = int(np.ceil(duration / step))
+    buffer = TrajectoryBuffer(6, capacity=max_steps // record_every + 2)
+    buffer.append(pos, vel, 0.0)
+    t, reason = 0.0, "time"
+    for i in range(1, max_steps + 1):
+        t, pos, vel, _ = integrator.step(acceleration, t, pos, vel, min(step, duration - t))
+        if min(geodetic_point(pos[:3], 0.0)[2], geodetic_point(pos[:3] + pos[3:], 0.0)[2]) <= 0:
+            reason = "impact"
+        if i % record_every == 0 or i == max_steps or reason != "time":
+            buffer.append(pos, vel, t)
+        if reason != "time":
+            break
+    positions, velocity, time = buffer.arrays()
+    return positions, velocity, time, reason
+
+
+def relative_motion(chief, deputy, duration=None, step=None, mode="auto", cw_range_km=10.0, integrator="rk4",
+                    atmosphere="table", rotating_atmosphere=True, j2=False, record_every=1):
+    """
+    Motion of a deputy (e.g. Pod) relative to a chief (e.g. Mothership).
+
+    'cw' evaluates the Clohessy-Wiltshire solution about the chief's
+    initial orbit, treated as circular and drag-free: no integration at all,
+    valid while the separation stays small. 'nonlinear' integrates the
+    chief together with the deputy's offset from it, with the full force
+    model on both and the two-body part of the difference written so it
+    does not cancel; the offset then keeps its precision however small it
+    is next to the positions. 'auto' uses the CW solution when its range
+    stays below cw_range_km over the whole run, otherwise 'nonlinear'.
+
+    Parameters:
+        chief, deputy: Objects with pos, vel, mass, A and Cd (or Scenarios).
+            The chief's epoch, duration and step are the defaults of the run.
+        duration (float, optional): Simulated time (s).
+        step (float, optional): Step (s) of the integration or of the CW samples.
+        mode (str): 'auto', 'cw' or 'nonlinear'.
+        cw_range_km (float): Largest separation 'auto' still hands to CW.
+        integrator (str): Integrator of the nonlinear mode, see integrators.get_integrator.
+        atmosphere (str or object): Density source, see atmosphere.run_atmosphere.
+        rotating_atmosphere (bool): Drag relative to the co-rotating atmosphere.
+        j2 (bool): Include the J2 oblateness acceleration.
+        record_every (int): Keep every n-th step of the nonlinear mode.
+
+    Returns:
+        dict: time (s), position and velocity (RIC of the chief, m and m/s,
+        velocity seen in the rotating frame), range (m), mode used and
+        status ('time' or 'impact').
+    """
+    epoch = getattr(chief, "epoch", EPOCH)
+    duration = getattr(chief, "duration", total_time) if duration is None else duration
+    step = getattr(chief, "step", dt) if step is None else step
+    if mode not in ("auto", "cw", "nonlinear"):
+        raise ValueError(f"Unknown relative-motion mode: {mode}")
+    chief_pos, chief_vel = np.asarray(chief.pos, dtype=float), np.asarray(chief.vel, dtype=float)
+
+    if mode in ("auto", "cw"):
+        position0, velocity0 = to_ric(chief_pos, chief_vel, np.asarray(deputy.pos, dtype=float) - chief_pos,
+                                      np.asarray(deputy.vel, dtype=float) - chief_vel)
+        mean_motion = math.sqrt(MU / np.linalg.norm(chief_pos) ** 3)
+        time = np.arange(0.0, duration + step / 2, step)
+        position, velocity = clohessy_wiltshire(mean_motion, position0, velocity0, time)
+        distance = np.linalg.norm(position, axis=1)
+        if mode == "cw" or distance.max() <= cw_range_km * 1000:
+            return {"time": time, "position": position, "velocity": velocity, "range": distance, "mode": "cw",
+                    "status": "time"}
+
+    positions, velocity, time, status = _differential(chief, deputy, epoch, duration, step, integrator, atmosphere,
+                                                      rotating_atmosphere, j2, record_every)
+    position, velocity = to_ric(positions[:, :3], velocity[:, :3], positions[:, 3:], velocity[:, 3:])
+    return {"time": time, "position": position, "velocity": velocity, "range": np.linalg.norm(position, axis=1),
+            "mode": "nonlinear", "status": status}
+
+
+def resample(time, positions, velocity, new_time, chunk_size=1_000_000):
+    """
+    Trajectory samples at new_time by cubic Hermite interpolation of position and velocity.
+
+    Works chunk by chunk and only reads the samples around each new time, so
+    memory-mapped trajectories are never loaded whole. new_time must lie
+    inside the range of time.
+
+    Returns:
+        tuple: positions and velocity (len(new_time), 3).
+    """
+    time, new_time = np.asarray(time), np.asarray(new_time, dtype=float)
+    out_pos, out_vel = np.empty((len(new_time), 3)), np.empty((len(new_time), 3))
+    for start in range(0, len(new_time), chunk_size):
+        t = new_time[start:start + chunk_size]
+        i = np.clip(np.searchsorted(time, t, side="right") - 1, 0, len(time) - 2)
+        t0, t1 = time[i][:, None], time[i + 1][:, None]
+        pos, vel = hermite(t0, np.asarray(positions[i]), np.asarray(velocity[i]),
+                           t1, np.asarray(positions[i + 1]), np.asarray(velocity[i + 1]), t[:, None])
+        out_pos[start:start + len(t)], out_vel[start:start + len(t)] = pos, vel
+    return out_pos, out_vel
+
+
+def common_time_base(first_time, second_time, step=None):
+    """Uniform times over the overlap of two time arrays, by default at the coarser of their median steps."""
+    start, end = max(first_time[0], second_time[0]), min(first_time[-1], second_time[-1])
+    if step is None:
+        step = max(float(np.median(np.diff(first_time[:1000]))), float(np.median(np.diff(second_time[:1000]))))
+    return np.arange(start, end + step * 1e-9, step)
+
+
+def trajectory_separation(first, second, step=None, chunk_size=1_000_000):
+    """
+    Separation of two stored trajectories, resampled onto a common time base.
+
+    Parameters:
+        first, second: Objects with positions, velocity and time (e.g.
+            trajfile.Trajectory); the RIC frame is that of first.
+        step (float, optional): Spacing of the common time base, see common_time_base.
+        chunk_size (int): Samples resampled at once.
+
+    Returns:
+        dict: time, position (RIC, m) and range (m) of second relative to first.
+    """
+    time = common_time_base(first.time, second.time, step)
+    pos_a, vel_a = resample(first.time, first.positions, first.velocity, time, chunk_size)
+    pos_b, _ = resample(second.time, second.positions, second.velocity, time, chunk_size)
+    position = to_ric(pos_a, vel_a, pos_b - pos_a)
+    return {"time": time, "position": position, "range": np.linalg.norm(position, axis=1)}
@@ -0,0 +1,97 @@
+import hashlib
+import json
+from datetime import datetime
+from types import SimpleNamespace
+
+import numpy as np
+
+from initial_conditions import EPOCH, dt, total_time
+
+
+def _frozen(array):
+    array = np.array(array, dtype=float)
+    array.flags.writeable = False
+    return array
+
+
+class Scenario:
+    __slots__ = ("name", "pos", "vel", "mass", "A", "Cd", "epoch", "duration", "step")
+
+    def __init__(self, satellite, epoch=EPOCH, duration=total_time, step=dt, name=None):
+        """
+        Immutable description of one simulation run: spacecraft, epoch and time span.
+
+        A Scenario can be passed to sym() and sym_batch() wherever a satellite
+        class is accepted. Its initial state is copied and read-only and its
+        attributes cannot be set after construction, so a run can never change
+        the inputs of the next one, the same Scenario always produces the same
+        trajectory and key() stays valid. Use replace() for a changed copy.
+
+        Parameters:
+            satellite: Object with pos, vel, mass, A and Cd (e.g. Pod).
+            epoch (datetime): UTC date and time of simulation time 0.
+            duration (float): Simulated time (s).
+            step (float): Step size (s), the initial one for adaptive integrators.
+            name (str, optional): Label, defaults to the satellite class name.
+        """
+        values = {
+            "name": name or getattr(satellite, "__name__", type(satellite).__name__),
+            "pos": _frozen(satellite.pos),
+            "vel": _frozen(satellite.vel),
+            "mass": float(satellite.mass),
+            "A": float(satellite.A),
+            "Cd": float(getattr(satellite, "Cd", 1.0)),
+            "epoch": epoch,
+            "duration": float(duration),
+            "step": float(step),
+        }
+        for attribute, value in values.items():
+            object.__setattr__(self, attribute, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"Scenario is immutable, use replace({name}=...) for a changed copy")
+
+    def __delattr__(self, name):
+        raise AttributeError("Scenario is immutable")
+
+    def __reduce__(self):
+        return Scenario.from_dict, (self.as_dict(),)
+
+    def replace(self, **changes):
+        """Return a copy with some attributes replaced, e.g. scenario.replace(mass=6)."""
+        unknown = set(changes) - set(self.__slots__)
+        if unknown:
+            raise AttributeError(f"Scenario has no attribute {sorted(unknown)[0]!r}")
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values.update(changes)
+        return Scenario(SimpleNamespace(**values), values["epoch"], values["duration"], values["step"], values["name"])
+
+    def as_dict(self):
+        return {
+            "name": self.name,
+            "pos": self.pos.tolist(),
+            "vel": self.vel.tolist(),
+            "mass": self.mass,
+            "A": self.A,
+            "Cd": self.Cd,
+            "epoch": self.epoch.isoformat(),
+            "duration": self.duration,
+            "step": self.step,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Inverse of as_dict()."""
+        satellite = SimpleNamespace(pos=np.array(data["pos"], dtype=float), vel=np.array(data["vel"], dtype=float),
+                                    mass=data["mass"], A=data["A"], Cd=data["Cd"])
+        return cls(satellite, datetime.fromisoformat(data["epoch"]), data["duration"], data["step"], data["name"])
+
+    def key(self):
+        """Hash of all inputs, usable as a cache or memoization key for the run."""
+        inputs = self.as_dict()
+        inputs["pos"] = self.pos.tobytes().hex()  # exact bits, not the printed value
+        inputs["vel"] = self.vel.tobytes().hex()
+        return hashlib.sha1(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+    def __repr__(self):
+        return f"Scenario({self.name!r}, epoch={self.epoch.isoformat()}, duration={self.duration}, step={self.step})"
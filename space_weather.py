@@ -0,0 +1,190 @@
+import csv
+import hashlib
+import json
+import math
+import os
+from datetime import datetime
+
+import numpy as np
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".atmosphere_cache")
+AVERAGE_DAYS = 81  # centred average window of f107A
+COLUMNS = ("f107", "f107a", "ap")  # columns of SpaceWeather.table
+
+
+class ConstantSpaceWeather:
+    def __init__(self, f107a=150.0, f107=150.0, ap=4.0):
+        """Fixed solar and geomagnetic activity, the model inputs used when no space-weather file is given."""
+        self.f107a = float(f107a)
+        self.f107 = float(f107)
+        self.ap = float(ap)
+
+    def at(self, epoch, time_offset=0.0):
+        """f107A, f107 and ap at time_offset seconds after epoch."""
+        return self.f107a, self.f107, self.ap
+
+    def inputs(self, epoch, time_offset):
+        """at() for an array of times."""
+        shape = np.shape(time_offset)
+        return np.full(shape, self.f107a), np.full(shape, self.f107), np.full(shape, self.ap)
+
+    def key(self, epoch=None, start=0.0, end=0.0):
+        """Description of the inputs over [start, end] s after epoch, for cache keys."""
+        return {"f107A": self.f107a, "f107": self.f107, "ap": self.ap}
+
+
+class SpaceWeather:
+    def __init__(self, path, interpolate=False, cache_dir=CACHE_DIR):
+        """
+        Daily F10.7 and Ap history (and forecast) read from a CelesTrak space-weather CSV file.
+
+        The file (SW-All.csv or SW-Last5Years.csv from celestrak.org) is
+        parsed once into one row per day: observed F10.7, its 81-day centred
+        average and the daily Ap. Days the file skips, as between its monthly
+        predictions, are filled by linear interpolation. The parsed table is
+        cached in cache_dir under a key of the file's path, size and
+        modification time. A lookup is an index computation, so it can run
+        on every propagation step.
+
+        NRLMSISE-00 takes the F10.7 of the previous day, the 81-day average
+        and the Ap of the current day. Before the first or after the last day
+        of the file the first or last values are used.
+
+        Parameters:
+            path (str): CSV file with DATE, F10.7_OBS and AP_AVG columns; a
+                F10.7_OBS_CENTER81 column is used when present, otherwise the
+                average is computed.
+            interpolate (bool): Interpolate linearly between the daily values
+                (taken at noon) instead of holding them over the day.
+            cache_dir (str, optional): Directory of the parsed-table cache, None disables it.
+        """
+        self.path = path
+        self.interpolate = interpolate
+        self.cache_dir = cache_dir
+        self.first_day, self.table = self._load() if cache_dir else (None, None)
+        if self.table is None:
+            self.first_day, self.table = self._parse()
+            if cache_dir:
+                os.makedirs(cache_dir, exist_ok=True)
+                np.savez(self._path(), first_day=self.first_day, table=self.table)
+        self.start = datetime.fromordinal(self.first_day)
+        self._rows = self.table.tolist()
+        self._last = len(self._rows) - 1
+        self._offsets = {}
+
+    def _path(self):
+        stat = os.stat(self.path)
+        inputs = {"path": os.path.abspath(self.path), "size": stat.st_size, "mtime": stat.st_mtime}
+        return os.path.join(self.cache_dir, f"space_weather_{hashlib.sha1(json.dumps(inputs).encode()).hexdigest()}.npz")
+
+    def _load(self):
+        try:
+            with np.load(self._path()) as data:
+                return int(data["first_day"]), data["table"]
+        except (OSError, KeyError, ValueError):
+            return None, None
+
+    def _parse(self):
+        days, values = [], []
+        with open(self.path, newline="") as file:
+            reader = csv.reader(file)
+            header = [name.strip().upper() for name in next(reader)]
+            columns = [header.index(name) if name in header else None
+                       for name in ("F10.7_OBS", "F10.7_OBS_CENTER81", "AP_AVG")]
+            date = header.index("DATE")
+            for row in reader:
+                if not row or not row[date].strip():
+                    continue
+                days.append(datetime.strptime(row[date].strip(), "%Y-%m-%d").toordinal())
+                values.append([_number(row, column) for column in columns])
+        if not days:
+            raise ValueError(f"No space-weather data in {self.path}")
+        days, values = np.array(days), np.array(values, dtype=float)
+        order = np.argsort(days, kind="stable")
+        days, values = days[order], values[order]
+        every_day = np.arange(days[0], days[-1] + 1)
+        table = np.full((len(every_day), 3), np.nan)
+        for k in (0, 2):
+            known = ~np.isnan(values[:, k])
+            if not known.any():
+                raise ValueError(f"{self.path} has no F10.7_OBS or AP_AVG values")
+            table[:, k] = np.interp(every_day, days[known], values[known, k])
+        # the file's 81-day averages on the days it gives them, otherwise the centred average of the daily values
+        table[days - days[0], 1] = values[:, 1]
+        average = _centred_average(table[:, 0], AVERAGE_DAYS)
+        table[:, 1] = np.where(np.isnan(table[:, 1]), average, table[:, 1])
+        return int(days[0]), table
+
+    def _offset(self, epoch):
+        """Day number (0 at the file's first day) of epoch."""
+        offset = self._offsets.get(epoch)
+        if offset is None:
+            offset = self._offsets[epoch] = (epoch - self.start).total_seconds() / 86400
+        return offset
+
+    def at(self, epoch, time_offset=0.0):
+        """f107A, f107 and ap at time_offset seconds after epoch."""
+        day = self._offset(epoch) + time_offset / 86400
+        rows, last = self._rows, self._last
+        if not self.interpolate:
+            i = min(max(int(math.floor(day)), 0), last)
+            return rows[i][1], rows[max(i - 1, 0)][0], rows[i][2]
+        x = min(max(day - 0.5, 0.0), float(last))
+        i = min(int(x), last - 1) if last else 0
+        w = x - i
+        j = min(i + 1, last)
+        f107 = rows[max(i - 1, 0)][0] + w * (rows[max(j - 1, 0)][0] - rows[max(i - 1, 0)][0])
+        return (rows[i][1] + w * (rows[j][1] - rows[i][1]), f107, rows[i][2] + w * (rows[j][2] - rows[i][2]))
+
+    def inputs(self, epoch, time_offset):
+        """at() for an array of times: f107A, f107 and ap arrays."""
+        day = self._offset(epoch) + np.asarray(time_offset, dtype=float) / 86400
+        table, last = self.table, self._last
+        if not self.interpolate:
+            i = np.clip(np.floor(day).astype(int), 0, last)
+            return table[i, 1], table[np.maximum(i - 1, 0), 0], table[i, 2]
+        x = np.clip(day - 0.5, 0.0, float(last))
+        i = np.minimum(x.astype(int), max(last - 1, 0))
+        w = x - i
+        j = np.minimum(i + 1, last)
+        previous = table[np.maximum(i - 1, 0), 0], table[np.maximum(j - 1, 0), 0]
+        return (table[i, 1] + w * (table[j, 1] - table[i, 1]), previous[0] + w * (previous[1] - previous[0]),
+                table[i, 2] + w * (table[j, 2] - table[i, 2]))
+
+    def key(self, epoch, start=0.0, end=0.0):
+        """Digest of the table rows used over [start, end] s after epoch, for cache keys."""
+        first = int(math.floor(self._offset(epoch) + start / 86400)) - 1
+        last = int(math.floor(self._offset(epoch) + end / 86400)) + 1
+        rows = self.table[min(max(first, 0), self._last):min(max(last, 0), self._last) + 1]
+        digest = hashlib.sha1(np.ascontiguousarray(rows).tobytes()).hexdigest()
+        return {"space_weather": digest, "interpolate": self.interpolate}
+
+
+def _number(row, column):
+    if column is None or column >= len(row) or not row[column].strip():
+        return np.nan
+    return float(row[column])
+
+
+def _centred_average(values, days):
+    """Mean over a window of days centred on each day, shortened at the ends of the series."""
+    half = days // 2
+    cumulative = np.concatenate(([0.0], np.cumsum(values)))
+    index = np.arange(len(values))
+    lo, hi = np.maximum(index - half, 0), np.minimum(index + half + 1, len(values))
+    return (cumulative[hi] - cumulative[lo]) / (hi - lo)
+
+
+def get_space_weather(space_weather=None):
+    """
+    Return a space-weather source.
+
+    Parameters:
+        space_weather: None for ConstantSpaceWeather(), the path of a
+            CelesTrak CSV file, or an object with at(), inputs() and key().
+    """
+    if space_weather is None:
+        return ConstantSpaceWeather()
+    if isinstance(space_weather, str):
+        return SpaceWeather(space_weather)
+    return space_weather
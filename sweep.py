@@ -0,0 +1,232 @@
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import initial_conditions
+from initial_conditions import EPOCH, V, Vel, dt, r_e, total_time
+from atmosphere import TabulatedAtmosphere, table_options
+from events import AltitudeBand
+from geodesy import corotating_velocity, eci_to_geodetic
+from Heat_profile import Shape
+from scenario import Scenario
+from symulation import sym
+
+PARAMETERS = ("v", "mass", "A", "Cd", "H", "inc")
+BAND_KM = (120, 200)  # altitude band whose residence time is reported
+
+_atmosphere = None  # per-worker density table, see _init_worker
+
+
+def make_satellite(base, **params):
+    """
+    Copy a satellite class with some of its parameters replaced.
+
+    Parameters:
+        base: Satellite class to start from (e.g. initial_conditions.Pod).
+        **params: New values for v (m/s), mass (kg), A (m²), Cd, H (m) or
+            inc (deg). Changing H without v starts on a circular orbit at that
+            altitude.
+
+    Returns:
+        type: A new satellite class with its own pos and vel arrays.
+    """
+    attrs = {name: params[name] for name in ("mass", "A", "Cd", "inc") if name in params}
+    r = r_e + params["H"] if "H" in params else float(np.linalg.norm(base.pos))
+    if "v" in params:
+        v = params["v"]
+    elif "H" in params:
+        v = V(r)
+    else:
+        v = float(np.linalg.norm(base.vel))
+    inc = params.get("inc", getattr(base, "inc", 0))
+    attrs.update(r=r, v=v, pos=np.array([r, 0.0, 0.0]), vel=Vel(v, inc))
+    return type(base.__name__, (base,), attrs)
+
+
+def grid_cases(grid):
+    """Every combination of the value lists in grid, e.g. {'mass': [4, 5], 'H': [150e3, 200e3]}."""
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def random_cases(distributions, n_samples, seed=0):
+    """
+    Draw Monte Carlo cases.
+
+    Parameters:
+        distributions (dict): Parameter name -> callable taking a
+            numpy.random.Generator and returning one value,
+            e.g. {'mass': lambda rng: rng.normal(5, 0.2)}.
+        n_samples (int): Number of cases.
+        seed (int): Seed of the generator. Case i only depends on seed and i.
+
+    Returns:
+        list: One parameter dict per case.
+    """
+    cases = []
+    for i in range(n_samples):
+        rng = np.random.default_rng([seed, i])
+        cases.append({name: float(draw(rng)) for name, draw in distributions.items()})
+    return cases
+
+
+def summarize(positions, velocity, time, atmosphere, shape=None, band=None, rotating_atmosphere=True):
+    """
+    Reduce a trajectory to the per-case numbers reported by a sweep.
+
+    Parameters:
+        positions, velocity, time (ndarray): Output of sym().
+        atmosphere: Density source used for the heat flux.
+        shape (Shape, optional): Body used for the Sutton-Graves heat flux.
+        band (events.AltitudeBand, optional): Band event that ran with the
+            trajectory; its exactly timed residence is reported. Without it
+            band_time is summed over the steps that start inside the band.
+        rotating_atmosphere (bool): Take the heat flux from the speed relative
+            to the co-rotating air, as sym() does for the drag.
+
+    Returns:
+        dict: lifetime (s), orbits, band_time (s spent between 120 and 200 km),
+        peak_heat_flux (W/m²), impact_time (s, None if it did not fall) and
+        final_altitude (km).
+    """
+    lat, lon, altitude = eci_to_geodetic(positions, time, getattr(atmosphere, "epoch", EPOCH))
+    fell = bool(altitude[-1] <= 0)
+    if band is None:
+        in_band = (BAND_KM[0] < altitude[:-1]) & (altitude[:-1] < BAND_KM[1])
+        band_time = float(np.sum(np.diff(time)[in_band]))
+    else:
+        band_time = float(band.time_inside)
+    summary = {
+        "lifetime": float(time[-1]),
+        "orbits": int(np.sum((positions[:-1, 1] < 0) & (0 < positions[1:, 1]))),
+        "band_time": band_time,
+        "impact_time": float(time[-1]) if fell else None,
+        "final_altitude": float(altitude[-1]),
+    }
+    if shape is not None:
+        if rotating_atmosphere:
+            velocity = corotating_velocity(positions, velocity)
+        speed = np.linalg.norm(velocity, axis=1)
+        density = atmosphere.densities(time, np.maximum(altitude, 0), lat, lon)
+        summary["peak_heat_flux"] = float(np.max(shape.calculate_heat_flux_coefficient(density, speed)))
+    return summary
+
+
+def _init_worker(atmosphere_options):
+    global _atmosphere
+    _atmosphere = TabulatedAtmosphere(**atmosphere_options)
+
+
+def case_path(trajectory_dir, case_id):
+    """Trajectory file of a case stored by run_sweep(..., trajectory_dir=...)."""
+    return os.path.join(trajectory_dir, f"case_{case_id:05d}.traj")
+
+
+def run_case(case_id, base, params, shape_options, sym_options, trajectory_dir=None, epoch=EPOCH):
+    """Propagate one case in a worker and return its result record; epoch is that of the density table."""
+    satellite = Scenario(make_satellite(base, **params), epoch=epoch, duration=getattr(base, "duration", total_time),
+                         step=getattr(base, "step", dt))
+    output = case_path(trajectory_dir, case_id) if trajectory_dir else None
+    options = dict(sym_options)
+    band = AltitudeBand(*BAND_KM)
+    options["events"] = tuple(options.get("events", ())) + (band,)
+    positions, velocity, time = sym(satellite, atmosphere=_atmosphere, output=output, **options)
+    shape = Shape(**shape_options) if shape_options else None
+    record = {"case": case_id}
+    record.update(params)
+    record.update(summarize(positions, velocity, time, _atmosphere, shape, band,
+                            options.get("rotating_atmosphere", True)))
+    return record
+
+
+def completed_cases(results_path):
+    """Case ids already present in a results file."""
+    done = set()
+    if os.path.exists(results_path):
+        with open(results_path) as file:
+            for line in file:
+                try:
+                    done.add(json.loads(line)["case"])
+                except (ValueError, KeyError):
+                    continue  # partially written last line of an interrupted run
+    return done
+
+
+def run_sweep(cases, results_path, base=initial_conditions.Pod, workers=None, epoch=EPOCH,
+              shape_options=None, atmosphere_options=None, trajectory_dir=None, **sym_options):
+    """
+    Run sym() for every case on a process pool and stream the summaries to a file.
+
+    Results are appended to results_path as JSON lines as soon as a case
+    finishes. Cases whose id is already in the file are skipped, so an
+    interrupted sweep continues where it stopped. A case that raises is
+    recorded with an "error" entry instead of results and the sweep goes on;
+    such rows also count as done, delete them to run the case again. Every
+    worker loads the density table once (from the on-disk cache after the
+    first build).
+
+    Parameters:
+        cases (list): Parameter dicts from grid_cases() or random_cases().
+        results_path (str): JSON-lines results file.
+        base: Satellite class the cases are derived from.
+        workers (int, optional): Number of processes. Defaults to the CPU count.
+        epoch (datetime): Epoch of the runs and their atmosphere, fixed so
+            that runs repeat.
+        shape_options (dict, optional): Shape arguments for the heat flux,
+            defaults to a 0.001 m³ double cone.
+        atmosphere_options (dict, optional): TabulatedAtmosphere arguments,
+            replacing those of a table covering the orbits, latitudes and
+            duration of all cases (see atmosphere.table_options).
+        trajectory_dir (str, optional): Also stream every case's trajectory
+            into this directory (case_<id>.traj), e.g. for plotting.render_trajectories.
+        **sym_options: Passed to sym(), e.g. integrator or duration. max_orbits
+            defaults to None so that every case runs until it falls. The
+            atmosphere and output are set by the sweep (see
+            atmosphere_options and trajectory_dir) and may not be given.
+
+    Returns:
+        list: Result records of the cases run by this call.
+    """
+    for params in cases:
+        unknown = set(params) - set(PARAMETERS)
+        if unknown:
+            raise ValueError(f"Unknown sweep parameters: {unknown}")
+    for name, instead in (("atmosphere", "atmosphere_options"), ("output", "trajectory_dir")):
+        if name in sym_options:
+            raise ValueError(f"sym option {name!r} is set by the sweep, use {instead} instead")
+    shape_options = {"name": "double_cone", "volume": 0.001} if shape_options is None else shape_options
+    sym_options.setdefault("max_orbits", None)
+    satellites = [make_satellite(base, **params) for params in cases]
+    coverage = table_options([(satellite.pos, satellite.vel) for satellite in satellites],
+                             sym_options.get("duration", getattr(base, "duration", total_time)), sym_options["max_orbits"])
+    atmosphere_options = {**coverage, **(atmosphere_options or {}), "epoch": epoch}
+
+    if trajectory_dir:
+        os.makedirs(trajectory_dir, exist_ok=True)
+    TabulatedAtmosphere(**atmosphere_options)  # build the shared cache once, before the workers start
+    done = completed_cases(results_path)
+    if os.path.exists(results_path) and os.path.getsize(results_path):
+        with open(results_path, "rb+") as file:
+            file.seek(-1, os.SEEK_END)
+            if file.read(1) != b"\n":
+                file.write(b"\n")  # terminate a line cut off by an interrupted run
+    records = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(atmosphere_options,)) as pool, \
+            open(results_path, "a") as results:
+        futures = {pool.submit(run_case, case_id, base, params, shape_options, sym_options, trajectory_dir, epoch):
+                   (case_id, params) for case_id, params in enumerate(cases) if case_id not in done}
+        for future in as_completed(futures):
+            try:
+                record = future.result()
+            except Exception as error:
+                case_id, params = futures[future]
+                record = {"case": case_id}
+                record.update(params)
+                record["error"] = f"{type(error).__name__}: {error}"
+            results.write(json.dumps(record) + "\n")
+            results.flush()
+            records.append(record)
+    return records
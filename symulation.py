@@ -1,55 +1,229 @@
 from initial_conditions import *
 from nrlmsis_calculator import *
+from trajectory import TrajectoryBuffer
+from integrators import get_integrator
+from atmosphere import run_atmosphere
+from scenario import Scenario
+from trajfile import TrajectoryWriter, open_trajectory
+from events import EventDetector, Impact, OrbitCrossing
+from aerodynamics import get_drag_model
+from profiling import ProfiledAtmosphere, get_profiler
+from checkpoint import load_checkpoint, save_checkpoint
+import kernel as compiled_kernel
+import time
+from geodesy import A_WGS84, OMEGA_E, corotating_velocity, earth_rotation_angle, geodetic_point
 
 def gravitational_acceleration(r_temp,poss):
     return -G * M_e / r_temp ** 3 * poss
 
-def atmospheric_drag(t, altitude_km,velo,mass,A):
+def j2_acceleration(r_temp,poss):
+    z2 = (poss[..., 2:3] / r_temp) ** 2  # r_temp of shape (N, 1) for a batch of positions
+    return -1.5 * J2 * G * M_e * A_WGS84 ** 2 / r_temp ** 5 * poss * (np.array([1.0, 1.0, 3.0]) - 5 * z2)
+
+def atmospheric_drag(t, altitude_km,velo,mass,A, atmosphere=None, lat_deg=0, lon_deg=0, Cd=1):
     v_temp = np.linalg.norm(velo)
-    ro = get_atmospheric_data(t, altitude_km,0,0)[1]
-    d= Drag(velo,v_temp,ro,A) / mass
+    if atmosphere is None:
+        T, ro = get_atmospheric_data(t, altitude_km,lat_deg,lon_deg)
+    else:
+        ro = atmosphere.density(t, altitude_km, lat_deg, lon_deg)
+    if callable(Cd):
+        if atmosphere is not None:
+            T = atmosphere.air_temperature(t, altitude_km, lat_deg, lon_deg)
+        Cd = Cd(v_temp, ro, T)  # DragModel lookup over Mach and Knudsen number
+    d= Drag(velo,v_temp,ro,A,Cd) / mass
     return -d
 
-def sym(satellite):
-    orbit = []
-    orbits = 0
-    ionosphere_time = 0
-    t=0
-    pos = satellite.pos
-    vel = satellite.vel
-    positions=np.array(satellite.pos, ndmin=2)
-    velocity = np.array(satellite.vel, ndmin=2)
-    time=np.array(t)
-    for i in range(n_steps):
-        r_temp = np.linalg.norm(satellite.pos)
-        altitude = (r_temp - r_e)
-        acc = gravitational_acceleration(r_temp,pos) + atmospheric_drag(t,altitude/1000, vel,satellite.mass,satellite.A)
-
-        # Update velocity and position using Euler method
-        vel += acc * dt
-        pos += vel * dt
-        t +=dt
-        positions=np.append(positions,[pos],axis=0)
-        velocity=np.append(velocity,[vel],axis=0)
-        time=np.append(time,t)
-
-        if r_temp < r_e:
-            print('flight time:',i / 3600 * dt, " h")
-            print("FALL")
-            break
-        if 200 > altitude/1000 > 120:
-            ionosphere_time+=dt
-        if i:
-            if positions[i - 1,1] < 0 < positions[i,1]:
-                orbits+=1
+def _restore(state, integrator, detector, pos, max_orbits):
+    """Put the integrator and event state of a checkpoint back into a new run."""
+    if state["integrator"] is not None:
+        integrator.set_state(state["integrator"], pos)
+    if state["events"] is not None:
+        if len(state["events"]) != len(detector.events):
+            raise ValueError("The checkpoint was written with a different list of events")
+        for event, saved in zip(detector.events, state["events"]):
+            vars(event).update(saved)
+        detector.values = list(state["values"])
+    detector.events[1].terminal = max_orbits or False  # the orbit limit of the continued run
+
+
+def sym(satellite, integrator="euler", step=None, duration=None, atmosphere="table", max_orbits=1,
+        rotating_atmosphere=True, j2=False, events=(), output=None, drag=None, profile=None,
+        kernel=False, checkpoint=None, checkpoint_every=300.0, resume=None, **options):
+    """
+    Propagate a satellite until it falls, completes max_orbits orbits, hits a
+    terminal event or the time runs out.
+
+    Parameters:
+        satellite: Object with pos, vel, mass and A attributes (e.g. Pod), or a
+            Scenario, whose epoch, step and duration are then used.
+        integrator (str or Integrator): 'euler' (default), 'rk4', 'leapfrog',
+            'dopri54' or a configured Integrator instance. Its ``stats``
+            attribute holds step counts and error statistics after the run.
+        step (float, optional): Fixed step size, or the initial step size of
+            adaptive integrators (s). Defaults to the scenario step or dt.
+        duration (float, optional): Simulated time (s). Defaults to the
+            scenario duration or total_time.
+        atmosphere (str or object): Density source, 'table' (default, a
+            TabulatedAtmosphere over the latitudes, longitudes, altitudes and
+            times this run can reach, built or loaded from cache, see
+            atmosphere.table_options; its error against NRLMSISE-00 over that
+            range is its model_error, about 2%), 'direct' (NRLMSISE-00 on
+            every step), 'grid' or an atmosphere instance.
+        max_orbits (int, optional): Stop after this many orbits. None only
+            stops on impact or at the end of the duration.
+        rotating_atmosphere (bool): Compute drag from the velocity relative to
+            the atmosphere co-rotating with the Earth.
+        j2 (bool): Add the J2 oblateness term to gravity.
+        events (sequence): Extra Event instances (see events.py), e.g.
+            AltitudeBand(120, 200) or AltitudeCrossing(150, terminal=True).
+            Surface impact and the orbit count are always detected. Events
+            are timed inside the step and a terminal one ends the trajectory
+            exactly at the event; their records stay on the instances.
+        output (str or TrajectoryWriter, optional): Stream the trajectory into
+            this binary trajectory file (see trajfile.py) while it is computed,
+            keeping only one chunk in memory.
+        drag (Shape or DragModel, optional): Take Cd from the tabulated
+            Mach/Knudsen drag model of this body (see aerodynamics.py) instead
+            of the constant satellite.Cd, with the temperature and density of
+            the run's atmosphere at each step, which then needs
+            air_temperature(). The area is still satellite.A.
+        profile (bool, str or Profiler, optional): Time the stages of the run
+            (see profiling.py) and print a summary at the end; a str is the
+            path of a Chrome trace file to write as well.
+        kernel (bool): Run the loop in kernel.py, compiled with numba when it
+            is installed, many steps per call. Used when the run allows it
+            (Euler, 'table' atmosphere, constant Cd, no extra events, no
+            profiling, no checkpoints); otherwise the regular loop runs.
+        checkpoint (str, optional): Save the full propagator state (state
+            vectors, time, step size, integrator cache and statistics, event
+            records and counters) to this file every checkpoint_every seconds
+            of wall time and at the end. Needs output to be a path; the
+            checkpoint refers to the records written to it so far.
+        checkpoint_every (float): Wall-clock seconds between checkpoints.
+        resume (str or dict, optional): Checkpoint (see checkpoint.py) to
+            continue from instead of the initial state; the trajectory file
+            is cut back to the checkpoint and the new samples are appended.
+            duration may be longer than that of the original run. Use
+            checkpoint.continue_run() to restore the run settings as well.
+        **options: Passed to the integrator constructor (e.g. rtol, atol).
+
+    Returns:
+        tuple: positions, velocity and time arrays; memory-mapped views of the
+        file when output is given.
+    """
+    integrator = get_integrator(integrator, **options)
+    integrator.reset()
+    epoch = getattr(satellite, "epoch", EPOCH)
+    h = getattr(satellite, "step", dt) if step is None else step
+    duration = getattr(satellite, "duration", total_time) if duration is None else duration
+    atmosphere = run_atmosphere(atmosphere, epoch, [(satellite.pos, satellite.vel)], duration,
+                                max_orbits if resume is None else None)
+    theta0 = float(earth_rotation_angle(0.0, epoch))
+    drag = get_drag_model(drag)
+    cd = getattr(satellite, "Cd", 1) if drag is None else drag
+    max_steps = int(np.ceil(duration / h))
+    profiler = get_profiler(profile)
+    geodetic, gravity, drag_force, oblateness = geodetic_point, gravitational_acceleration, atmospheric_drag, j2_acceleration
+    density_source = atmosphere
+    if profiler:
+        started = time.perf_counter()
+        geodetic, gravity, drag_force, oblateness = (profiler.wrap(name, function) for name, function in (
+            ("geodesy", geodetic), ("gravity", gravity), ("drag", drag_force), ("j2", oblateness)))
+        density_source = ProfiledAtmosphere(atmosphere, profiler)
+
+    def acceleration(t_fun, pos_fun, vel_fun):
+        r_fun = np.linalg.norm(pos_fun)
+        lat, lon, altitude_km = geodetic(pos_fun, theta0 + OMEGA_E * t_fun)
+        if rotating_atmosphere:
+            vel_fun = corotating_velocity(pos_fun, vel_fun)
+        acc = gravity(r_fun, pos_fun) + drag_force(t_fun, altitude_km, vel_fun, satellite.mass, satellite.A, density_source, lat, lon, cd)
+        if j2:
+            acc += oblateness(r_fun, pos_fun)
+        return acc
+
+    state = load_checkpoint(resume) if isinstance(resume, str) else resume
+    if (checkpoint or state) and not isinstance(output, str):
+        raise ValueError("checkpoint and resume need output to be a trajectory file path")
+    t, i = 0, 0
+    pos = np.array(satellite.pos, dtype=float)
+    vel = np.array(satellite.vel, dtype=float)
+    if state:
+        t, i, h = state["t"], state["steps"], state["h"]
+        pos, vel = np.array(state["pos"], dtype=float), np.array(state["vel"], dtype=float)
+    writer = output
+    if isinstance(output, str):
+        metadata = Scenario(satellite, epoch, duration, h).as_dict()
+        metadata.update(integrator=integrator.name, atmosphere=type(atmosphere).__name__,
+                        rotating_atmosphere=rotating_atmosphere, j2=j2,
+                        drag=None if drag is None else type(drag).__name__)
+        writer = TrajectoryWriter(output, metadata, dim=len(pos), append=bool(state))
+        if state:
+            writer.truncate(state["samples"])
+    trajectory = TrajectoryBuffer(len(pos), capacity=max_steps - i + 1, sink=writer)
+    if not state:
+        trajectory.append(pos, vel, t)
+    for extra in events:
+        extra.bind(atmosphere, epoch)
+    detector = EventDetector([Impact(), OrbitCrossing(pos, vel, max_count=max_orbits)] + list(events), t, pos, vel)
+    if state:
+        _restore(state, integrator, detector, pos, max_orbits)
+    if checkpoint:
+        run = {"scenario": Scenario(satellite, epoch, duration, h).as_dict(),
+               "integrator": integrator.name, "rotating_atmosphere": rotating_atmosphere, "j2": j2}
+
+        def save_state(stopped_by=None):
+            trajectory.flush()
+            writer.flush()
+            save_checkpoint(checkpoint, {
+                "t": t, "pos": pos, "vel": vel, "h": h, "steps": i, "samples": writer.samples,
+                "integrator": integrator.get_state(), "stopped_by": stopped_by,
+                # after a terminal event the values at the event, where the run continues
+                "values": list(detector.values) if stopped_by is None else [event(t, pos, vel) for event in detector.events],
+                "events": [dict(vars(event)) for event in detector.events], "run": run})
+        next_checkpoint = time.perf_counter() + checkpoint_every
+    step, store, check = integrator.step, trajectory.append, detector.check
+    if profiler:
+        acceleration = profiler.wrap("acceleration", acceleration)
+        step, store, check = (profiler.wrap(name, function) for name, function in (
+            ("integration", step), ("storage", store), ("events", check)))
+    event = None
+    if state and state["stopped_by"] == Impact.name:
+        pass  # already on the ground
+    elif kernel and not profiler and not checkpoint and compiled_kernel.supports(integrator, atmosphere, events, drag):
+        t, pos, vel, event = compiled_kernel.propagate(satellite, atmosphere, t, pos, vel, h, max_steps - i, trajectory,
+                                                       detector, detector.events[1].along, rotating_atmosphere, j2,
+                                                       cd, integrator.stats, theta0)
+    else:
+        while t < duration and (integrator.adaptive or i < max_steps):
+            t_prev, pos_prev, vel_prev = t, pos, vel
+            t, pos, vel, h = step(acceleration, t, pos, vel, min(h, duration - t) if integrator.adaptive else h)
+
+            stop = check(t_prev, pos_prev, vel_prev, t, pos, vel)
+            if stop:
+                t, pos, vel, event = stop
+                store(pos, vel, t)
                 break
-                if orbit:
-                    orbit.append(t-sum(orbit))
-                else:
-                    orbit.append(t)
-    # print("time in 200-80km: ", ionosphere_time, " s ", ionosphere_time / t * 100, "% ", "time per orbit: ",ionosphere_time / orbits)
-    # print("orbits: ", orbits, "orbit time: ", orbit)
-    return positions, velocity, time
+            store(pos, vel, t)
+            i += 1
+            if checkpoint and not i % 1024 and time.perf_counter() >= next_checkpoint:
+                save_state()
+                next_checkpoint = time.perf_counter() + checkpoint_every
+    if checkpoint:
+        save_state(event.name if event is not None else state and state["stopped_by"])
+    if isinstance(event, Impact):
+        print('flight time:',t / 3600, " h")
+        print("FALL")
+    detector.finish(t)
+    if profiler:
+        profiler.finish(integrator, atmosphere, time.perf_counter() - started)
+    if writer is None:
+        return trajectory.arrays()
+    trajectory.flush()
+    if writer is output:
+        writer.flush()
+    else:
+        writer.close()
+    return open_trajectory(writer.path).arrays()
 
 
 
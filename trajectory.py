@@ -0,0 +1,89 @@
+import numpy as np
+
+
+class TrajectoryBuffer:
+    def __init__(self, dim=2, capacity=None, chunk_size=65536, sink=None):
+        """
+        Growable storage for a propagated trajectory.
+
+        Samples are written into preallocated arrays. When the arrays are full
+        they grow by whole chunks, so appending a step costs O(1) instead of
+        copying the complete history like np.append does.
+
+        Parameters:
+            dim (int or tuple): Shape of one position/velocity sample.
+            capacity (int, optional): Expected number of samples. When given the
+                buffer is allocated for it up front.
+            chunk_size (int): Number of samples added whenever the buffer grows.
+            sink (TrajectoryWriter, optional): When given, a full buffer is
+                written to the sink and reused instead of growing, so memory
+                stays at one chunk however long the run is.
+        """
+        self.shape = (dim,) if np.isscalar(dim) else tuple(dim)
+        self.chunk_size = int(chunk_size)
+        self.sink = sink
+        if capacity is None:
+            capacity = self.chunk_size
+        elif sink is not None:
+            capacity = min(capacity, self.chunk_size)
+        capacity = max(int(capacity), 1)
+        self.positions = np.empty((capacity,) + self.shape)
+        self.velocity = np.empty((capacity,) + self.shape)
+        self.time = np.empty(capacity)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self):
+        capacity = len(self.time) + self.chunk_size
+        for name in ("positions", "velocity", "time"):
+            old = getattr(self, name)
+            new = np.empty((capacity,) + old.shape[1:])
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def append(self, pos, vel, t):
+        """Store one sample (position, velocity, time)."""
+        if self.size == len(self.time):
+            if self.sink is None:
+                self._grow()
+            else:
+                self.flush()
+        self.positions[self.size] = pos
+        self.velocity[self.size] = vel
+        self.time[self.size] = t
+        self.size += 1
+
+    def extend(self, positions, velocity, time):
+        """Store a block of samples."""
+        start, n = 0, len(time)
+        while start < n:
+            if self.size == len(self.time):
+                if self.sink is None:
+                    self._grow()
+                else:
+                    self.flush()
+            count = min(n - start, len(self.time) - self.size)
+            self.positions[self.size:self.size + count] = positions[start:start + count]
+            self.velocity[self.size:self.size + count] = velocity[start:start + count]
+            self.time[self.size:self.size + count] = time[start:start + count]
+            self.size += count
+            start += count
+
+    def flush(self):
+        """Write the stored samples to the sink and empty the buffer."""
+        n = self.size
+        self.sink.write(self.positions[:n], self.velocity[:n], self.time[:n])
+        self.size = 0
+
+    def arrays(self):
+        """
+        Return the samples stored so far.
+
+        Returns:
+            tuple: positions, velocity and time arrays trimmed to the number of
+            stored samples.
+        """
+        n = self.size
+        return self.positions[:n].copy(), self.velocity[:n].copy(), self.time[:n].copy()
@@ -0,0 +1,138 @@
+import json
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b"ORBTRAJ1"
+ALIGN = 64  # records start on a multiple of this many bytes
+
+
+def record_dtype(dim=3):
+    """Fixed little-endian record of one trajectory sample."""
+    return np.dtype([("t", "<f8"), ("pos", "<f8", (dim,)), ("vel", "<f8", (dim,))])
+
+
+def _header_bytes(dim, metadata):
+    header = json.dumps({"version": 1, "dim": dim, "dtype": record_dtype(dim).descr, "metadata": metadata or {}})
+    size = len(MAGIC) + 4 + len(header.encode())
+    header += " " * (-size % ALIGN)
+    return MAGIC + struct.pack("<I", len(header.encode())) + header.encode()
+
+
+def read_header(path):
+    """
+    Read the header of a trajectory file.
+
+    Returns:
+        tuple: Header dict (dim, dtype, metadata) and the byte offset of the first record.
+    """
+    with open(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"Not a trajectory file: {path}")
+        (length,) = struct.unpack("<I", file.read(4))
+        header = json.loads(file.read(length).decode())
+    return header, len(MAGIC) + 4 + length
+
+
+class TrajectoryWriter:
+    def __init__(self, path, metadata=None, dim=3, append=False):
+        """
+        Stream trajectory samples into a binary file.
+
+        The file is a short JSON header (scenario metadata, record layout)
+        followed by fixed-size records of t, pos and vel, so it can be written
+        chunk by chunk during a run and read back with np.memmap without
+        loading it.
+
+        Parameters:
+            path (str): Output file.
+            metadata (dict, optional): JSON-serialisable scenario description.
+            dim (int): Number of position/velocity components.
+            append (bool): Continue an existing file instead of replacing it.
+        """
+        self.path = path
+        if append and os.path.exists(path):
+            header, offset = read_header(path)
+            self.dim = header["dim"]
+            self.metadata = header["metadata"]
+            self.file = open(path, "r+b")
+            size = os.path.getsize(path)
+            itemsize = record_dtype(self.dim).itemsize
+            self.samples = (size - offset) // itemsize
+            self._offset = offset
+            self.file.truncate(offset + self.samples * itemsize)  # drop a torn last record
+            self.file.seek(0, os.SEEK_END)
+        else:
+            self.dim = dim
+            self.metadata = metadata or {}
+            self.file = open(path, "wb")
+            self.file.write(_header_bytes(dim, self.metadata))
+            self.samples = 0
+            self._offset = self.file.tell()
+        self.dtype = record_dtype(self.dim)
+
+    def truncate(self, samples):
+        """Keep only the first samples records, e.g. to continue from a checkpoint written before the rest."""
+        self.samples = min(samples, self.samples)
+        self.file.truncate(self._offset + self.samples * self.dtype.itemsize)
+        self.file.seek(0, os.SEEK_END)
+
+    def write(self, positions, velocity, time):
+        """Append a chunk of samples."""
+        records = np.empty(len(time), dtype=self.dtype)
+        records["t"] = time
+        records["pos"] = positions
+        records["vel"] = velocity
+        self.file.write(records.tobytes())
+        self.samples += len(time)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Trajectory:
+    def __init__(self, path):
+        """
+        Memory-mapped, read-only view of a trajectory file.
+
+        positions, velocity and time behave like the arrays returned by sym(),
+        but samples are only read from disk when they are used.
+        """
+        self.path = path
+        header, offset = read_header(path)
+        self.metadata = header["metadata"]
+        self.dim = header["dim"]
+        dtype = record_dtype(self.dim)
+        n = (os.path.getsize(path) - offset) // dtype.itemsize
+        self.records = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(n,)) if n else np.empty(0, dtype)
+        self.time = self.records["t"]
+        self.positions = self.records["pos"]
+        self.velocity = self.records["vel"]
+
+    def __len__(self):
+        return len(self.records)
+
+    def arrays(self):
+        return self.positions, self.velocity, self.time
+
+
+def open_trajectory(path):
+    """Open a trajectory file written by TrajectoryWriter or sym(..., output=path)."""
+    return Trajectory(path)
+
+
+def save_trajectory(path, positions, velocity, time, metadata=None):
+    """Write complete in-memory arrays to a trajectory file."""
+    with TrajectoryWriter(path, metadata, dim=np.shape(positions)[1]) as writer:
+        writer.write(positions, velocity, time)
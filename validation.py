@@ -0,0 +1,321 @@
+import json
+import time
+
+import numpy as np
+
+import initial_conditions
+from atmosphere import run_atmosphere
+from geodesy import eci_to_geodetic
+from Heat_profile import Shape
+from initial_conditions import G, M_e, Vel, r_e
+from relative import resample
+from scenario import Scenario
+from symulation import sym
+
+MU = G * M_e
+INTEGRATORS = ("euler", "leapfrog", "rk4", "dopri54")
+STEPS = (1.0, 5.0, 10.0)  # s, fixed-step integrators
+TOLERANCES = (1e-6, 1e-9)  # rtol of the adaptive integrator
+ATMOSPHERES = ("table", "grid", "direct")
+REFERENCE = {"integrator": "dopri54", "rtol": 1e-11, "atol": 1e-6, "dt_max": 10.0, "atmosphere": "direct"}
+ERRORS = ("position_error_m", "energy_drift", "lifetime_error_s", "peak_heat_error")
+
+
+class Kepler:
+    """Drag-free 400 x 2000 km orbit at 30 deg inclination, starting at perigee; see kepler_state()."""
+    perigee = r_e + 400e3
+    apogee = r_e + 2000e3
+    mass = 1.0
+    A = 0.0
+    Cd = 0.0
+    inc = 30
+
+    a = (perigee + apogee) / 2
+    pos = np.array([perigee, 0.0, 0.0])
+    vel = Vel(np.sqrt(MU * (2 / perigee - 1 / a)), inc)
+    pos.flags.writeable = vel.flags.writeable = False
+
+
+def scenarios(duration=20000.0):
+    """Reference scenarios of the harness: Mothership, Pod (until it falls) and the analytic Kepler orbit."""
+    return {name: Scenario(satellite, duration=duration, name=name) for name, satellite in (
+        ("Mothership", initial_conditions.Mothership), ("Pod", initial_conditions.Pod), ("Kepler", Kepler))}
+
+
+def kepler_state(pos, vel, t):
+    """
+    Analytic two-body state of an elliptic orbit, t seconds after (pos, vel).
+
+    Solves Kepler's equation by Newton iteration and applies the Lagrange f
+    and g functions, vectorised over t.
+
+    Returns:
+        tuple: positions and velocity (len(t), 3).
+    """
+    pos, vel, t = np.asarray(pos, dtype=float), np.asarray(vel, dtype=float), np.asarray(t, dtype=float)[:, None]
+    r0 = np.linalg.norm(pos)
+    a = 1 / (2 / r0 - vel @ vel / MU)
+    n = np.sqrt(MU / a ** 3)
+    e_cos, e_sin = 1 - r0 / a, pos @ vel / np.sqrt(MU * a)  # e cos E0, e sin E0
+    e, E0 = np.hypot(e_cos, e_sin), np.arctan2(e_sin, e_cos)
+    M = E0 - e_sin + n * t
+    E = M.copy()
+    for _ in range(50):
+        correction = (E - e * np.sin(E) - M) / (1 - e * np.cos(E))
+        E -= correction
+        if np.max(np.abs(correction)) < 1e-14:
+            break
+    dE = E - E0
+    f = 1 - a / r0 * (1 - np.cos(dE))
+    g = t - (dE - np.sin(dE)) / n
+    positions = f * pos + g * vel
+    r = np.linalg.norm(positions, axis=1)[:, None]
+    velocity = -np.sqrt(MU * a) / (r * r0) * np.sin(dE) * pos + (1 - a / r * (1 - np.cos(dE))) * vel
+    return positions, velocity
+
+
+def specific_energy(positions, velocity):
+    """Two-body orbital energy per unit mass (J/kg)."""
+    positions, velocity = np.asarray(positions), np.asarray(velocity)
+    return 0.5 * np.einsum("ij,ij->i", velocity, velocity) - MU / np.linalg.norm(positions, axis=1)
+
+
+def peak_heat_flux(positions, velocity, time, atmosphere, shape, epoch=initial_conditions.EPOCH):
+    """Largest Sutton-Graves stagnation heat flux (W/m²) along a trajectory, densities from atmosphere."""
+    lat, lon, altitude = eci_to_geodetic(positions, time, epoch)
+    density = atmosphere.densities(time, np.maximum(altitude, 0), lat, lon)
+    return float(np.max(shape.calculate_heat_flux_coefficient(density, np.linalg.norm(velocity, axis=1))))
+
+
+def _fell(positions):
+    return bool(eci_to_geodetic(np.asarray(positions[-1]))[2] <= 0)
+
+
+def reference(scenario, shape=None, rotating_atmosphere=True, j2=False):
+    """
+    High-accuracy reference of a scenario.
+
+    Drag-free scenarios (A = 0) use the analytic Kepler solution; the others
+    are run with tight-tolerance Dormand-Prince, at most 10 s steps (so the
+    trajectory can be interpolated to any time) and NRLMSISE-00 evaluated on
+    every call.
+
+    Returns:
+        dict: 'state' (callable t -> positions, velocity), 'end' (last time),
+        'fell', 'energy0' and 'peak_heat' (None without drag).
+    """
+    pos0, vel0 = np.asarray(scenario.pos), np.asarray(scenario.vel)
+    if not scenario.A:
+        return {"state": lambda t: kepler_state(pos0, vel0, t), "end": scenario.duration, "fell": False,
+                "energy0": float(specific_energy(pos0[None], vel0[None])[0]), "peak_heat": None}
+    options = dict(REFERENCE)
+    atmosphere = run_atmosphere(options.pop("atmosphere"), scenario.epoch, [(scenario.pos, scenario.vel)],
+                                scenario.duration)
+    positions, velocity, time = sym(scenario, step=1.0, atmosphere=atmosphere, max_orbits=None,
+                                    rotating_atmosphere=rotating_atmosphere, j2=j2, **options)
+    dense = np.arange(0.0, time[-1], 1.0)
+    dense_pos, dense_vel = resample(time, positions, velocity, dense)
+    return {"state": lambda t: resample(time, positions, velocity, t), "end": float(time[-1]),
+            "fell": _fell(positions), "energy0": float(specific_energy(positions[:1], velocity[:1])[0]),
+            "peak_heat": peak_heat_flux(dense_pos, dense_vel, dense, atmosphere, shape, scenario.epoch) if shape else None}
+
+
+def configurations(integrators=INTEGRATORS, steps=STEPS, atmospheres=ATMOSPHERES, tolerances=TOLERANCES):
+    """
+    Every integrator x step (x rtol for adaptive ones) x atmosphere combination.
+
+    Returns:
+        list: sym() keyword dicts (integrator, step, atmosphere and rtol).
+    """
+    configs = []
+    for atmosphere in atmospheres:
+        for integrator in integrators:
+            if integrator == "dopri54":
+                configs += [{"integrator": integrator, "step": steps[0], "rtol": rtol, "atmosphere": atmosphere}
+                            for rtol in tolerances]
+            else:
+                configs += [{"integrator": integrator, "step": step, "atmosphere": atmosphere} for step in steps]
+    return configs
+
+
+def evaluate_config(scenario, config, ref, shape=None, rotating_atmosphere=True, j2=False):
+    """
+    Run one configuration of a scenario and measure it against the reference.
+
+    Returns:
+        dict: The configuration with seconds (wall time of sym(), atmosphere
+        setup excluded), steps, position_error_m (largest distance from the
+        reference), energy_drift (largest orbital energy difference from the
+        reference relative to the initial energy), lifetime_error_s (None
+        unless one of the two fell) and peak_heat_error (relative, None
+        without drag).
+    """
+    options = dict(config)
+    atmosphere = run_atmosphere(options.pop("atmosphere"), scenario.epoch, [(scenario.pos, scenario.vel)],
+                                scenario.duration)
+    start = time.perf_counter()
+    positions, velocity, t = sym(scenario, atmosphere=atmosphere, max_orbits=None,
+                                 rotating_atmosphere=rotating_atmosphere, j2=j2, **options)
+    seconds = time.perf_counter() - start
+    common = np.asarray(t) <= ref["end"]
+    ref_pos, ref_vel = ref["state"](np.asarray(t)[common])
+    position_error = np.linalg.norm(np.asarray(positions)[common] - ref_pos, axis=1)
+    energy = specific_energy(np.asarray(positions)[common], np.asarray(velocity)[common])
+    energy_drift = np.abs(energy - specific_energy(ref_pos, ref_vel)) / abs(ref["energy0"])
+    fell = _fell(positions)
+    row = dict(config, scenario=scenario.name, atmosphere=config["atmosphere"] if scenario.A else "none",
+               seconds=seconds, steps=len(t) - 1, position_error_m=float(np.max(position_error)),
+               energy_drift=float(np.max(energy_drift)),
+               lifetime_error_s=abs(float(t[-1]) - ref["end"]) if fell or ref["fell"] else None,
+               peak_heat_error=None)
+    if ref["peak_heat"]:
+        peak = peak_heat_flux(positions, velocity, t, atmosphere, shape, scenario.epoch)
+        row["peak_heat_error"] = abs(peak - ref["peak_heat"]) / ref["peak_heat"]
+    return row
+
+
+def validate(names=None, configs=None, duration=20000.0, shape=None, rotating_atmosphere=True, j2=False, log=None):
+    """
+    Run every configuration on every scenario and compare it with the reference.
+
+    The drag-free Kepler scenario does not depend on the atmosphere, so it
+    runs each integrator and step once.
+
+    Parameters:
+        names (sequence, optional): Scenario names, default all of scenarios().
+        configs (list, optional): sym() keyword dicts, default configurations().
+        duration (float): Simulated time of every scenario (s).
+        shape (Shape, optional): Body of the heat flux, default a 0.001 m³ double cone.
+        rotating_atmosphere, j2: Passed to sym() for the runs and the reference.
+        log (callable, optional): Called with every finished row, e.g. to print progress.
+
+    Returns:
+        list: One row (see evaluate_config) per scenario and configuration.
+    """
+    shape = shape or Shape("double_cone", 0.001)
+    available = scenarios(duration)
+    configs = configurations() if configs is None else configs
+    rows = []
+    for name in names or available:
+        scenario = available[name]
+        ref = reference(scenario, shape, rotating_atmosphere, j2)
+        seen = set()
+        for config in configs:
+            if not scenario.A:
+                key = tuple(sorted((k, v) for k, v in config.items() if k != "atmosphere"))
+                if key in seen:
+                    continue
+                seen.add(key)
+                config = dict(config, atmosphere="table")
+            row = evaluate_config(scenario, config, ref, shape, rotating_atmosphere, j2)
+            rows.append(row)
+            if log:
+                log(row)
+    return rows
+
+
+def pareto_front(rows, error="position_error_m"):
+    """
+    Mark the configurations no other one beats in both wall time and error, per scenario.
+
+    Sets row['pareto'] and returns the rows sorted by scenario and wall time.
+    """
+    rows = sorted(rows, key=lambda row: (row["scenario"], row["seconds"]))
+    best = {}
+    for row in rows:
+        value = row[error] if row[error] is not None else np.inf
+        row["pareto"] = value < best.get(row["scenario"], np.inf)
+        if row["pareto"]:
+            best[row["scenario"]] = value
+    return rows
+
+
+def fastest_within(rows, budget):
+    """
+    Fastest configuration of each scenario that meets an error budget.
+
+    Parameters:
+        rows (list): Output of validate().
+        budget (dict): Largest allowed value per error metric, e.g.
+            {'position_error_m': 1000, 'peak_heat_error': 0.05}. Metrics that
+            are None for a row (e.g. no drag) do not constrain it.
+
+    Returns:
+        dict: Scenario name -> row, or None when no configuration qualifies.
+    """
+    choice = {row["scenario"]: None for row in rows}
+    for row in sorted(rows, key=lambda row: row["seconds"]):
+        if choice[row["scenario"]] is None and all(row[metric] is None or row[metric] <= limit
+                                                   for metric, limit in budget.items()):
+            choice[row["scenario"]] = row
+    return choice
+
+
+def describe(row):
+    """Integrator, step or tolerance and atmosphere of a row, as a fixed-width label."""
+    setting = f"rtol={row['rtol']:g}" if "rtol" in row else f"dt={row['step']:g}"
+    return f"{row['integrator']:8s} {setting:10s} {row['atmosphere']:7s}"
+
+
+def _number(value):
+    return "-" if value is None else f"{value:.3g}"
+
+
+def format_table(rows, error="position_error_m"):
+    """Speed/accuracy table per scenario, fastest first; '*' marks the Pareto front in the given error."""
+    lines = [f"{'scenario':10s} {'configuration':27s} {'seconds':>8s} {'steps':>7s} {'pos err m':>10s} "
+             f"{'energy':>9s} {'life s':>8s} {'heat':>9s}"]
+    for row in pareto_front(rows, error):
+        lines.append(f"{row['scenario']:10s} {describe(row)} {row['seconds']:8.3f} {row['steps']:7d} "
+                     f"{_number(row['position_error_m']):>10s} {_number(row['energy_drift']):>9s} "
+                     f"{_number(row['lifetime_error_s']):>8s} {_number(row['peak_heat_error']):>9s}"
+                     f"{' *' if row['pareto'] else ''}")
+    return "\n".join(lines)
+
+
+def _key(row):
+    return row["scenario"], row["integrator"], row.get("step"), row.get("rtol"), row["atmosphere"]
+
+
+def compare(rows, baseline, tolerance=0.1):
+    """
+    Compare the errors of a validation run with a saved one.
+
+    Parameters:
+        rows, baseline (list): Outputs of validate() (or loaded JSON files).
+        tolerance (float): Relative growth of an error that still counts as unchanged.
+
+    Returns:
+        list: (configuration, metric, baseline value, new value, relative
+        change, status) rows, status being 'ok', 'better' or 'REGRESSION'.
+        The change is signed so that positive is always an improvement.
+    """
+    old_rows = {_key(row): row for row in baseline}
+    result = []
+    for row in rows:
+        old_row = old_rows.get(_key(row))
+        if old_row is None:
+            continue
+        for metric in ERRORS:
+            old, new = old_row.get(metric), row.get(metric)
+            if old is None or new is None:
+                continue
+            change = (old - new) / old if old else 0.0 if new == old else -np.inf
+            status = "REGRESSION" if change < -tolerance else "better" if change > tolerance else "ok"
+            result.append((f"{row['scenario']} {describe(row)}", metric, old, new, change, status))
+    return result
+
+
+def format_comparison(rows):
+    return "\n".join(f"{name:40s} {metric:18s} {old:10.3g} -> {new:10.3g} {change:+8.1%} {status}"
+                     for name, metric, old, new, change, status in rows)
+
+
+def save_results(rows, path):
+    with open(path, "w") as file:
+        json.dump(rows, file, indent=2)
+
+
+def load_results(path):
+    with open(path) as file:
+        return json.load(file)